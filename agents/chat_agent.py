@@ -1,40 +1,169 @@
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple
 from .base_agent import BaseAgent
 from models.openai_models import OpenAIChat
-from models.tts_models import TextToSpeechModel
+from models.tts_models import TextToSpeechModel, SentenceTTSPipeline
 from personality.personality_config import PersonalityConfig
 from graphs.chat_graph import ChatWorkflow
 from utils.error_handling import NodeExecutionError, WorkflowError
 from memory.knowledge_memory import KnowledgeMemory
 from memory.conversation_memory import ConversationMemory
+from memory.summary_memory import fit_recent_turns, get_summary_memory
+from utils.cache import BoundedCache
+from config.settings import get_settings
 from datetime import datetime
 import pytz
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
 class ChatAgent(BaseAgent):
-    def __init__(self, agent_id: str, personality: PersonalityConfig):
+    def __init__(self, agent_id: str, personality: PersonalityConfig, config_version: Optional[str] = None):
         super().__init__(agent_id)
         self.personality = personality
+        self.config_version = config_version
+        # When the agent config was last compared with the one in Redis
+        self.config_checked_at = time.monotonic()
+        # Requests using this agent, and whether the agent cache has evicted it
+        self.active = 0
+        self.retired = False
         self.openai_chat = OpenAIChat()
         self.tts_model = TextToSpeechModel()
         self.knowledge_memory = KnowledgeMemory(f"knowledge_base_{agent_id}")
-        self.conversation_memories: Dict[str, ConversationMemory] = {}
-        self.workflow = ChatWorkflow(self.openai_chat, self.personality, self.knowledge_memory)
+        settings = get_settings()
+        # Per agent, so at most AGENT_CACHE_SIZE * AGENT_SESSION_CACHE_SIZE memories in total
+        self.conversation_memories: BoundedCache[ConversationMemory] = BoundedCache(
+            "conversation_memories",
+            max_size=settings.AGENT_SESSION_CACHE_SIZE,
+            ttl=settings.SESSION_TIMEOUT
+        )
+        self.workflow = ChatWorkflow(self.openai_chat, self.personality, self.knowledge_memory, config_version)
         self.graph = self.workflow.create_graph()
 
+    def update_personality(self, personality: PersonalityConfig, config_version: Optional[str] = None) -> None:
+        """Apply a changed agent config to later turns"""
+        self.personality = personality
+        self.config_version = config_version
+        self.workflow.set_personality(personality, config_version)
+
     async def initialize(self) -> None:
         """Initialize agent resources"""
         await self.knowledge_memory.initialize()
     
     async def get_conversation_memory(self, user_id: str, session_id: str) -> ConversationMemory:
         memory_key = f"{user_id}_{session_id}"
-        if memory_key not in self.conversation_memories:
+        memory = await self.conversation_memories.get(memory_key)
+        if memory is None:
             memory = ConversationMemory(user_id, self.agent_id, session_id)
             await memory.initialize()
-            self.conversation_memories[memory_key] = memory
-        return self.conversation_memories[memory_key]
+            await self.conversation_memories.set(memory_key, memory)
+        return memory
+
+    async def _prepare_context(
+        self,
+        user_id: str,
+        message: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], List[float]]:
+        """Add relevant conversation history to the request context.
+
+        Returns the context and the message embedding, which is computed once
+        per turn and reused by every later retrieval step.
+        """
+        # Get conversation memory
+        conversation_memory = await self.get_conversation_memory(user_id, session_id)
+
+        # Embed the message once for all lookups in this turn
+        query_embedding = await conversation_memory.generate_embedding(message)
+
+        # Get relevant conversation history
+        if get_settings().CONVERSATION_HISTORY_MODE == "recency":
+            relevant_history = await conversation_memory.get_recent_relevant_history(
+                message,
+                query_embedding=query_embedding
+            )
+        else:
+            relevant_history = await conversation_memory.get_relevant_history(
+                message,
+                query_embedding=query_embedding
+            )
+
+        # Add relevant history to context
+        context = context or {}
+        if relevant_history:
+            context["relevant_history"] = relevant_history
+
+        # The session summary replaces the older raw turns sent by the client;
+        # turns it does not cover yet are always kept
+        settings = get_settings()
+        if settings.SESSION_SUMMARY_ENABLED:
+            try:
+                summary = await get_summary_memory().get(user_id, self.agent_id, session_id)
+            except Exception as e:
+                logger.error(f"Failed to load conversation summary: {str(e)}")
+                summary = None
+            if summary:
+                context["conversation_summary"] = summary["summary"]
+                if context.get("recent_conversations"):
+                    context["recent_conversations"] = fit_recent_turns(
+                        context["recent_conversations"],
+                        settings.SESSION_SUMMARY_RECENT_TOKENS,
+                        keep_last=summary["pending_turns"]
+                    )
+        return context, query_embedding
+
+    @staticmethod
+    def _tts_options(tts_settings: Optional[Any]) -> Optional[Dict[str, Any]]:
+        """Normalize TTS settings from a TTSSettings message or dict, None if TTS is disabled"""
+        if tts_settings is None:
+            return None
+
+        if isinstance(tts_settings, dict):
+            if not tts_settings.get("enable_tts"):
+                return None
+            voice_id = tts_settings.get("voice_id")
+            voice_settings = tts_settings.get("voice_settings")
+        else:
+            if not getattr(tts_settings, "enable_tts", False):
+                return None
+            voice_id = tts_settings.voice_id
+            voice_settings = tts_settings.voice_settings if tts_settings.HasField("voice_settings") else None
+
+        options = {}
+        if voice_id:
+            options["voice_id"] = voice_id
+        if voice_settings is not None:
+            options["voice_settings"] = voice_settings
+        return options
+
+    async def _record_summary_turn(self, user_id: str, session_id: str, message: str, result: Dict[str, Any]) -> None:
+        """Add a finished turn to the session summary, never failing the reply.
+
+        Turns are stored in the vector store by the client through the
+        StoreConversation RPC, not here.
+        """
+        if result.get("type") == "error" or not get_settings().SESSION_SUMMARY_ENABLED:
+            return
+        try:
+            await get_summary_memory().record_turn(user_id, self.agent_id, session_id, message, result["response"])
+        except Exception as e:
+            logger.error(f"Failed to record turn for the conversation summary: {str(e)}")
+
+    def _error_result(self, user_id: str, session_id: str) -> Dict[str, Any]:
+        """Build the generic error result returned to clients"""
+        current_time = datetime.now(pytz.UTC).isoformat()
+        return {
+            "response": "An unexpected error occurred. Please try again later.",
+            "session_id": session_id,
+            "user_id": user_id,
+            "type": "error",
+            "metadata": {
+                "error": "Internal server error",
+                "timestamp": current_time
+            },
+            "audio": None
+        }
 
     async def process_message(
         self,
@@ -44,17 +173,12 @@ class ChatAgent(BaseAgent):
         context: Optional[Dict[str, Any]] = None,
         tts_settings: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        try:
-            # Get conversation memory
-            conversation_memory = await self.get_conversation_memory(user_id, session_id)
+        # With TTS, run the streaming path so speech overlaps LLM generation
+        if self._tts_options(tts_settings) is not None:
+            return await self._collect_stream(user_id, message, session_id, context, tts_settings)
 
-            # Get relevant conversation history
-            relevant_history = await conversation_memory.get_relevant_history(message)
-            
-            # Add relevant history to context
-            if relevant_history:
-                context = context or {}
-                context["relevant_history"] = relevant_history
+        try:
+            context, query_embedding = await self._prepare_context(user_id, message, session_id, context)
 
             # Process through workflow graph
             result = await self.workflow.run({
@@ -64,7 +188,8 @@ class ChatAgent(BaseAgent):
                 }],
                 "user_id": user_id,
                 "session_id": session_id,
-                "context": context or {}
+                "context": context or {},
+                "query_embedding": query_embedding
             })
 
             if not result or "response" not in result:
@@ -78,20 +203,8 @@ class ChatAgent(BaseAgent):
                 logger.error(f"Unexpected response format: {response_obj}")
                 response_text = str(response_obj) if response_obj else "An error occurred"
                 response_type = "error"
-            print(f"Response text: {tts_settings}")
-            # Generate speech if TTS settings are provided
-            audio_data = None
-            if tts_settings and getattr(tts_settings, 'enable_tts', False):
-                try:
-                    audio_data = await self.tts_model.generate_speech(
-                        text=response_text,
-                        voice_id=tts_settings.get('voice_id'),
-                        voice_settings=tts_settings.get('voice_settings')
-                    )
-                except Exception as e:
-                    logger.error(f"Text-to-speech generation failed: {str(e)}")
 
-            return {
+            result = {
                 "response": response_text,
                 "session_id": session_id,
                 "user_id": user_id,
@@ -99,23 +212,118 @@ class ChatAgent(BaseAgent):
                 "metadata": {
                     "timestamp": datetime.now(pytz.UTC).isoformat()
                 },
-                "audio": audio_data if audio_data else None
+                "audio": None
             }
-            
+            await self._record_summary_turn(user_id, session_id, message, result)
+            return result
+
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}")
-            current_time = datetime.now(pytz.UTC).isoformat()
-            return {
-                "response": "An unexpected error occurred. Please try again later.",
-                "session_id": session_id,
+            return self._error_result(user_id, session_id)
+
+    async def _collect_stream(
+        self,
+        user_id: str,
+        message: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]] = None,
+        tts_settings: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Run stream_message to completion and join its audio segments"""
+        result = self._error_result(user_id, session_id)
+        audio_segments = []
+        async for frame in self.stream_message(user_id, message, session_id, context, tts_settings):
+            if frame["type"] == "audio":
+                audio_segments.append(frame["audio"])
+            elif frame["type"] != "partial":
+                result = frame
+
+        result["audio"] = b"".join(audio_segments) or None
+        return result
+
+    def _audio_frame(self, user_id: str, session_id: str, audio: bytes) -> Dict[str, Any]:
+        return {
+            "response": "",
+            "session_id": session_id,
+            "user_id": user_id,
+            "type": "audio",
+            "metadata": {
+                "timestamp": datetime.now(pytz.UTC).isoformat()
+            },
+            "audio": audio
+        }
+
+    async def stream_message(
+        self,
+        user_id: str,
+        message: str,
+        session_id: str,
+        context: Optional[Dict[str, Any]] = None,
+        tts_settings: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the reply as "partial" text frames and "audio" frames, then one final frame.
+
+        With TTS enabled, each sentence is synthesized as soon as the LLM has
+        finished it, and audio frames are emitted in sentence order.
+        """
+        tts_options = self._tts_options(tts_settings)
+        tts_pipeline = SentenceTTSPipeline(self.tts_model, **tts_options) if tts_options is not None else None
+        try:
+            context, query_embedding = await self._prepare_context(user_id, message, session_id, context)
+
+            async for event in self.workflow.stream_chat({
+                "messages": [{
+                    "role": "user",
+                    "content": message
+                }],
                 "user_id": user_id,
-                "type": "error",
-                "metadata": {
-                    "error": "Internal server error",
-                    "timestamp": current_time
-                },
-                "audio": None
-            }
+                "session_id": session_id,
+                "context": context,
+                "query_embedding": query_embedding
+            }):
+                if event["type"] == "delta":
+                    yield {
+                        "response": event["content"],
+                        "session_id": session_id,
+                        "user_id": user_id,
+                        "type": "partial",
+                        "metadata": {
+                            "timestamp": datetime.now(pytz.UTC).isoformat()
+                        },
+                        "audio": None
+                    }
+                    if tts_pipeline:
+                        tts_pipeline.feed(event["content"])
+                        for audio in tts_pipeline.ready_segments():
+                            yield self._audio_frame(user_id, session_id, audio)
+                    continue
+
+                if tts_pipeline:
+                    tts_pipeline.close()
+                    async for audio in tts_pipeline.remaining_segments():
+                        yield self._audio_frame(user_id, session_id, audio)
+
+                final = {
+                    "response": event["response"]["response"],
+                    "session_id": session_id,
+                    "user_id": user_id,
+                    "type": event["response"].get("type", "text"),
+                    "metadata": event["response"].get("metadata", {}),
+                    "audio": None
+                }
+                yield final
+                # Recorded only after the client has the final frame
+                await self._record_summary_turn(user_id, session_id, message, final)
+
+        except Exception as e:
+            logger.error(f"Unexpected error: {str(e)}")
+            yield self._error_result(user_id, session_id)
+        finally:
+            if tts_pipeline:
+                tts_pipeline.cancel()
     
     async def cleanup(self) -> None:
-        pass
+        """Release session memories and API clients held by this agent"""
+        await self.conversation_memories.clear()
+        await self.workflow.search_model.close()
+        await self.openai_chat.close()
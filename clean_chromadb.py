@@ -3,6 +3,7 @@ import argparse
 from typing import Optional
 import logging
 from config.settings import get_settings
+from memory.conversation_memory import SHARD_COLLECTION_PATTERN, shard_collection_name, shard_index
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +43,49 @@ class ChromaDBCleaner:
         for collection in collections:
             self.delete_collection(collection.name)
 
+    def conversation_layout(self) -> dict:
+        """Group conversation collections into per-agent shards and legacy per-session collections"""
+        layout = {"shards": {}, "per_session": [], "other": []}
+        for collection in self.list_collections():
+            match = SHARD_COLLECTION_PATTERN.match(collection.name)
+            if match:
+                layout["shards"].setdefault(match.group("agent_id"), []).append(collection.name)
+            elif collection.name.startswith("conversation_"):
+                layout["per_session"].append(collection.name)
+            else:
+                layout["other"].append(collection.name)
+        return layout
+
+    def delete_conversations(
+        self,
+        agent_id: str,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        shards: int = 16
+    ) -> None:
+        """Delete an agent's conversations, optionally only those of one user or session, in both layouts"""
+        if user_id is None and session_id is not None:
+            raise ValueError("--session requires --user")
+
+        layout = self.conversation_layout()
+        if user_id is None:
+            for name in layout["shards"].get(agent_id, []):
+                self.delete_collection(name)
+        else:
+            name = shard_collection_name(agent_id, shard_index(user_id, shards))
+            if name in layout["shards"].get(agent_id, []):
+                where = {"user_id": user_id} if session_id is None else {
+                    "$and": [{"user_id": user_id}, {"session_id": session_id}]
+                }
+                self.client.get_collection(name).delete(where=where)
+                logger.info(f"Deleted conversations matching {where} from {name}")
+
+        # Per-session collections are named conversation_{user}_{session}_{agent}
+        prefix = "conversation_" + (f"{user_id}_" if user_id else "") + (f"{session_id}_" if session_id else "")
+        for name in layout["per_session"]:
+            if name.startswith(prefix) and name.endswith(f"_{agent_id}"):
+                self.delete_collection(name)
+
     def reset_database(self) -> None:
         """Reset the entire ChromaDB database"""
         try:
@@ -55,6 +99,11 @@ def main():
     parser.add_argument('--host', type=str, help='ChromaDB host')
     parser.add_argument('--port', type=int, help='ChromaDB port')
     parser.add_argument('--reset', action='store_true', help='Reset entire database')
+    parser.add_argument('--list', action='store_true', help='Show the conversation collection layout')
+    parser.add_argument('--agent', type=str, help='Only delete conversations of this agent')
+    parser.add_argument('--user', type=str, help='With --agent, only delete conversations of this user')
+    parser.add_argument('--session', type=str, help='With --agent and --user, only delete this session')
+    parser.add_argument('--shards', type=int, help='Shards per agent, defaults to CONVERSATION_SHARDS')
     args = parser.parse_args()
 
     # Get settings from config
@@ -67,7 +116,16 @@ def main():
     try:
         cleaner = ChromaDBCleaner(host, port)
         
-        if args.reset:
+        if args.list:
+            layout = cleaner.conversation_layout()
+            for agent_id, names in sorted(layout["shards"].items()):
+                logger.info(f"Agent {agent_id}: {len(names)} conversation shards")
+            logger.info(f"{len(layout['per_session'])} per-session conversation collections")
+            logger.info(f"{len(layout['other'])} other collections")
+        elif args.agent:
+            logger.info(f"Deleting conversations of agent {args.agent}...")
+            cleaner.delete_conversations(args.agent, args.user, args.session, args.shards or settings.CONVERSATION_SHARDS)
+        elif args.reset:
             logger.warning("Resetting entire ChromaDB database...")
             cleaner.reset_database()
         else:
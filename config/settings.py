@@ -28,10 +28,96 @@ class Settings(BaseSettings):
     #ChromaDB Config
     CHROMADB_HOST: str = "localhost"
     CHROMADB_PORT: int = 8000
+    CHROMADB_MAX_CONNECTIONS: int = 50
+    CHROMADB_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    CHROMADB_KEEPALIVE_EXPIRY: float = 30.0
+    CHROMADB_COLLECTION_CACHE_SIZE: int = 1024
+    CHROMADB_MAX_WORKERS: int = 16
+
+    # Vector Store Config
+    VECTOR_STORE_BACKEND: str = "chroma"  # "chroma" or "local"
+    LOCAL_VECTOR_STORE_PATH: str = "data/vectors"
+    LOCAL_VECTOR_STORE_HNSW_THRESHOLD: int = 10000
+    LOCAL_VECTOR_STORE_SAVE_INTERVAL: float = 30.0
+    LOCAL_VECTOR_STORE_MAX_COLLECTIONS: int = 1024  # loaded at once, with a path
+    VECTOR_SNAPSHOT_PATH: str = ""  # empty disables snapshots of Chroma collections
+    VECTOR_SNAPSHOT_INTERVAL: float = 300.0
+    VECTOR_SNAPSHOT_MAX_COLLECTIONS: int = 256
+    VECTOR_SNAPSHOT_MAX_STALENESS: float = 60.0  # replicas not synced for this long are not read
+
+    # Embedding Cache Config
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_REDIS: bool = False
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_BATCH_MAX_TOKENS: int = 250000
+    EMBEDDING_BATCH_WAIT_MS: int = 10
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+
+    # Knowledge Ingest Config
+    KNOWLEDGE_INGEST_WORKERS: int = 4
+    KNOWLEDGE_INGEST_PAGE_SIZE: int = 500
+    KNOWLEDGE_INGEST_PAGE_TOKENS: int = 100000
+    KNOWLEDGE_INGEST_CONCURRENCY: int = 4
+
+    # Knowledge Retrieval Config
+    KNOWLEDGE_HYBRID_SEARCH: bool = True
+    KNOWLEDGE_FETCH_FACTOR: int = 4
+    KNOWLEDGE_RRF_K: int = 60
+    KNOWLEDGE_MAX_FETCH: int = 200
+    KNOWLEDGE_PASSAGE_MAX_TOKENS: int = 1200
+    KNOWLEDGE_LEXICAL_MATCH_THRESHOLD: float = 0.8
+    KNOWLEDGE_LEXICAL_CHECK_INTERVAL: float = 30.0  # seconds between lexical index freshness checks
+
+    # Conversation Storage Config
+    CONVERSATION_STORAGE_MODE: str = "per_session"  # "per_session" or "sharded"
+    CONVERSATION_SHARDS: int = 16
+
+    # Conversation History Config
+    CONVERSATION_HISTORY_MODE: str = "similarity"  # "similarity" or "recency"
+    CONVERSATION_HISTORY_TOKEN_BUDGET: int = 800
+    CONVERSATION_HISTORY_WINDOW: float = 30 * 24 * 3600  # 0 searches the whole session
+    CONVERSATION_HISTORY_HALF_LIFE: float = 24 * 3600
+    CONVERSATION_HISTORY_CANDIDATES: int = 20
+    CONVERSATION_HISTORY_MIN_RELEVANCE: float = 0.4
+
+    # Session Summary Config
+    SESSION_SUMMARY_ENABLED: bool = False
+    SESSION_SUMMARY_EVERY: int = 6
+    SESSION_SUMMARY_MAX_TOKENS: int = 300
+    SESSION_SUMMARY_RECENT_TOKENS: int = 600
+    SESSION_SUMMARY_TTL: int = 7 * 24 * 3600
+
+    # Prompt Budget Config
+    PROMPT_LAYOUT: str = "legacy"  # "legacy" or "prefix_stable"
+    PROMPT_TOKEN_BUDGET: int = 8000
+    PROMPT_SEARCH_MAX_TOKENS: int = 2000
+    PROMPT_RECENT_HISTORY_MAX_TOKENS: int = 1500
+    PROMPT_RELEVANT_HISTORY_MAX_TOKENS: int = 1000
+
+    # Conversation Write Config
+    CONVERSATION_WRITE_BATCH_SIZE: int = 256
+    CONVERSATION_WRITE_FLUSH_MS: int = 50
+    CONVERSATION_BATCH_MAX_IN_FLIGHT: int = 1024
+    WRITE_BEHIND_BACKEND: str = "spool"  # "spool" or "redis"
+    WRITE_BEHIND_SPOOL_PATH: str = "data/conversation_spool.jsonl"
+    WRITE_BEHIND_FSYNC: bool = False
+    WRITE_BEHIND_COMMIT_INTERVAL: float = 1.0  # seconds between spool offset writes
+    WRITE_BEHIND_STREAM: str = "conversation_writes"
+    WRITE_BEHIND_CONSUMER: str = ""  # empty uses hostname and pid
+    WRITE_BEHIND_CLAIM_IDLE: float = 60.0
+    WRITE_BEHIND_MAX_PENDING: int = 10000
+    WRITE_BEHIND_WORKERS: int = 32
+    WRITE_BEHIND_MAX_RETRIES: int = 3
     
     # Agent Config
     MAX_CONCURRENT_USERS: int = 1000
     SESSION_TIMEOUT: int = 3600
+    AGENT_CACHE_SIZE: int = 100
+    AGENT_SESSION_CACHE_SIZE: int = 100  # session memories per cached agent
+    AGENT_NOT_FOUND_TTL: int = 30
+    AGENT_CONFIG_REFRESH_INTERVAL: float = 30.0  # 0 keeps a cached agent's config until eviction
+    STATS_LOG_INTERVAL: float = 300.0  # seconds between cache and usage stats logs, 0 disables
     
     class Config:
         env_file = ".env"
@@ -1,4 +1,4 @@
-from typing import Dict, Any, List, Literal, TypedDict, Optional
+from typing import AsyncIterator, Dict, Any, List, Literal, TypedDict, Optional
 from langgraph.graph import Graph, START, END
 from .base_graph import BaseWorkflow
 from .workflow_nodes import WorkflowNode, WorkflowNodes, NodeType
@@ -7,6 +7,8 @@ from models.search_models import SearchModel
 from personality.personality_config import PersonalityConfig
 from utils.error_handling import WorkflowError, with_retry, RetryableError, NodeExecutionError
 from memory.knowledge_memory import KnowledgeMemory
+from .prompt_assembler import PromptAssembler, PromptSection, RenderedPrompt
+from config.settings import get_settings
 from datetime import datetime
 import pytz
 import logging
@@ -14,6 +16,12 @@ import json
 
 logger = logging.getLogger(__name__)
 
+# Replies that mean the model lacks the knowledge and a search should be tried
+FALLBACK_PHRASES = [
+    "i don't know", "i'm not sure", "i cannot", "i don't have",
+    "i cannot find", "i cannot answer", "i don't understand"
+]
+
 class ChatState(TypedDict):
     messages: List[Dict[str, str]]
     intent: str
@@ -21,16 +29,27 @@ class ChatState(TypedDict):
     response: Dict[str, Any]
     searched: bool
     search_results: Optional[Dict[str, Any]]
+    query_embedding: Optional[List[float]]
+    prompt_report: Optional[Dict[str, Any]]
     next: Literal["validate", "classify", "memory", "chat", "search", "end"]
 
 class ChatWorkflow(BaseWorkflow):
-    def __init__(self, openai_chat: OpenAIChat, personality: PersonalityConfig, knowledge_memory: KnowledgeMemory):
+    def __init__(
+        self,
+        openai_chat: OpenAIChat,
+        personality: PersonalityConfig,
+        knowledge_memory: KnowledgeMemory,
+        config_version: Optional[str] = None
+    ):
         super().__init__()
         self.openai_chat = openai_chat
         self.search_model = SearchModel()
         self.personality = personality
+        self.config_version = config_version
+        self.persona_prompt: Optional[RenderedPrompt] = None
         self.knowledge_memory = knowledge_memory
         self.nodes = WorkflowNodes()
+        self.prompt_assembler: Optional[PromptAssembler] = None
         self.graph = None
 
     def create_graph(self) -> Graph:
@@ -80,13 +99,9 @@ class ChatWorkflow(BaseWorkflow):
             "next": "end"
         }
 
-    async def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Run workflow with search capability"""
-        if not self.graph:
-            self.graph = self.create_graph()
-            
-        # Initialize state with context
-        workflow_state = {
+    def _initial_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the initial workflow state from the caller's input"""
+        return {
             "messages": state.get("messages", []),
             "intent": "",
             "context": state.get("context", {}),
@@ -97,8 +112,17 @@ class ChatWorkflow(BaseWorkflow):
             },
             "searched": False,
             "search_results": None,
+            "query_embedding": state.get("query_embedding"),
             "next": "validate"
         }
+
+    async def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Run workflow with search capability"""
+        if not self.graph:
+            self.graph = self.create_graph()
+            
+        # Initialize state with context
+        workflow_state = self._initial_state(state)
         
         try:
             result = await self.graph.ainvoke(workflow_state)
@@ -107,68 +131,151 @@ class ChatWorkflow(BaseWorkflow):
             logger.error(f"Workflow execution failed: {str(e)}")
             return self.format_error_response(workflow_state, str(e))
 
+    @staticmethod
+    def _needs_search(response: str) -> bool:
+        """Check if a reply is a fallback reply indicating lack of knowledge.
+
+        The persona is told to answer exactly "i don't know" when unsure, so a
+        fallback reply starts with one of the phrases. Both the streaming and
+        the non-streaming path decide on a search with this predicate.
+        """
+        text = response.strip().lower()
+        return any(text.startswith(phrase) for phrase in FALLBACK_PHRASES)
+
+    @classmethod
+    def _could_be_fallback(cls, partial: str) -> bool:
+        """Check if a partial streamed response may still turn into a fallback reply"""
+        text = partial.strip().lower()
+        return cls._needs_search(text) or any(phrase.startswith(text) for phrase in FALLBACK_PHRASES)
+
+    def _prompt_assembler(self) -> PromptAssembler:
+        if self.prompt_assembler is None:
+            self.prompt_assembler = PromptAssembler(get_settings().PROMPT_TOKEN_BUDGET)
+        return self.prompt_assembler
+
+    def set_personality(self, personality: PersonalityConfig, config_version: Optional[str] = None) -> None:
+        """Switch to a new agent config, dropping the prompt rendered for the old one"""
+        self.personality = personality
+        self.config_version = config_version
+        self.persona_prompt = None
+
+    def _persona_prompt(self) -> RenderedPrompt:
+        """The system prompt, rendered and encoded once per config version.
+
+        Reusing the same text also keeps the prompt prefix byte-identical
+        across turns, so provider-side prompt caching can match it.
+        """
+        if self.persona_prompt is None or self.persona_prompt.version != self.config_version:
+            text = self.personality.generate_prompt()
+            if get_settings().PROMPT_LAYOUT == "prefix_stable":
+                preamble = self.personality.generate_knowledge_preamble()
+                if preamble:
+                    text = f"{text}\n\n{preamble}"
+            self.persona_prompt = RenderedPrompt(
+                text, self._prompt_assembler().encoder.encode(text), self.config_version
+            )
+        return self.persona_prompt
+
+    def _build_messages(self, state: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Build the LLM message list from the conversation and its context.
+
+        Context sections share the PROMPT_TOKEN_BUDGET by priority: persona,
+        then search results, summary, recent history and relevant history.
+        What was kept is stored in ``state["prompt_report"]``.
+
+        With PROMPT_LAYOUT "prefix_stable" the persona and knowledge preamble
+        come first, then all context in one system message in a fixed order,
+        then the conversation. Only the tail changes between turns, so the
+        provider can serve the prefix from its prompt cache.
+        """
+        messages = list(state.get("messages", []))
+        context = state.get("context", {})
+        logger.debug(f"Chat context: {context}")
+        settings = get_settings()
+        sections = []
+
+        # Add system message if not present
+        if not any(msg.get("role") == "system" for msg in messages):
+            persona = self._persona_prompt()
+            sections.append(PromptSection(
+                "persona", persona.text, priority=0, required=True, tokens=persona.tokens
+            ))
+
+        # Add the rolling summary of the older part of the session
+        if context.get("conversation_summary"):
+            sections.append(PromptSection(
+                "summary", context["conversation_summary"], priority=2,
+                prefix="Summary of the conversation so far:\n"
+            ))
+
+        # Add recent last 3 conversations if available, newest whole turns kept first
+        if context.get("recent_conversations"):
+            turns = [f"User: {conv['message']}\nAssistant: {conv['response']}\n" for conv in context["recent_conversations"]]
+            sections.append(PromptSection(
+                "recent_history",
+                "".join(turns),
+                priority=3,
+                units=turns,
+                prefix="Recent conversation history:\n",
+                max_tokens=settings.PROMPT_RECENT_HISTORY_MAX_TOKENS,
+                keep="tail"
+            ))
+
+        # Add relevant conversation history if available
+        if "relevant_history" in context:
+            # Only include highly relevant history
+            relevant = "".join(
+                f"{history['conversation']}\n" for history in context["relevant_history"]
+                if history["relevance_score"] > 0.4
+            )
+            if relevant:
+                sections.append(PromptSection(
+                    "relevant_history", relevant, priority=4,
+                    prefix="Previous relevant conversations:\n",
+                    max_tokens=settings.PROMPT_RELEVANT_HISTORY_MAX_TOKENS
+                ))
+
+        # If we have search results, add them to context
+        if state.get("search_results"):
+            sections.append(PromptSection(
+                "search_results", str(state["search_results"]["content"]), priority=1,
+                prefix="Here is some additional information: ",
+                max_tokens=settings.PROMPT_SEARCH_MAX_TOKENS
+            ))
+
+        assembler = self._prompt_assembler()
+        reserved = sum(len(assembler.encoder.encode(str(msg.get("content", "")))) for msg in messages)
+        built, report = assembler.assemble(sections, reserved_tokens=reserved)
+        state["prompt_report"] = report
+        logger.debug(f"Prompt sections: {report}")
+
+        # The persona leads, the caller's messages follow it, then the context
+        head = 1 if sections and sections[0].name == "persona" else 0
+        if settings.PROMPT_LAYOUT == "prefix_stable":
+            context_messages = built[head:]
+            if context_messages:
+                context_messages = [{
+                    "role": "system",
+                    "content": "\n\n".join(message["content"] for message in context_messages)
+                }]
+            return built[:head] + context_messages + messages
+        return built[:head] + messages + built[head:]
+
     @with_retry(max_retries=2, delay=1.0)
     async def process_chat(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Process chat with recent conversation history"""
         try:
-            messages = state.get("messages", [])
-            context = state.get("context", {})
-            print("check context data", context)
-            
-            # Add system message if not present
-            if not any(msg.get("role") == "system" for msg in messages):
-                messages.insert(0, {
-                    "role": "system",
-                    "content": self.personality.generate_prompt()
-                })
-
-            # Add recent last 3 conversations if available
-            if "recent_conversations" in context:
-                recent_convs = context["recent_conversations"]
-                print(f"Recent conversations1111111: {recent_convs}")
-                if recent_convs:
-                    recent_history_prompt = "Recent conversation history:\n"
-                    for conv in recent_convs:
-                        recent_history_prompt += f"User: {conv['message']}\nAssistant: {conv['response']}\n"
-                    messages.append({
-                        "role": "system",
-                        "content": recent_history_prompt
-                    })
-
-            # Add relevant conversation history if available
-            if "relevant_history" in context:
-                history_prompt = "Previous relevant conversations:\n"
-                for history in context["relevant_history"]:
-                    if history["relevance_score"] > 0.4:  # Only include highly relevant history
-                        history_prompt += f"{history['conversation']}\n"
-
-                if history_prompt !="Previous relevant conversations:\n":
-                    messages.append({
-                        "role": "system",
-                        "content": history_prompt
-                    })
-
-            # If we have search results, add them to context
-            if state.get("search_results"):
-                messages.append({
-                    "role": "system",
-                    "content": f"Here is some additional information: {state['search_results']['content']}"
-                })
+            messages = self._build_messages(state)
 
             # Generate response
-            print(f"Processing messages: {messages}")
+            logger.debug(f"Processing messages: {messages}")
             response = await self.openai_chat.generate_response(
                 messages=messages,
                 temperature=0.7
             )
 
             # Check if response indicates lack of knowledge
-            needs_search = any(phrase in response.lower() for phrase in [
-                "i don't know", "i'm not sure", "i cannot", "i don't have",
-                "i cannot find", "i cannot answer", "i don't understand"
-            ])
-
-            if needs_search and not state.get("searched"):
+            if self._needs_search(response) and not state.get("searched"):
                 # Set state for search
                 state["next"] = "search"
                 state["searched"] = True
@@ -194,6 +301,7 @@ class ChatWorkflow(BaseWorkflow):
                 },
                 "searched": state.get("searched", False),
                 "search_results": state.get("search_results"),
+                "prompt_report": state.get("prompt_report"),
                 "next": "end"
             }
 
@@ -213,15 +321,23 @@ class ChatWorkflow(BaseWorkflow):
 
             if last_message:
                 # First, query knowledge base
-                knowledge_results = await self.knowledge_memory.query_knowledge(last_message)
-                print(f"Knowledge base results: {knowledge_results}")
+                knowledge_results = await self.knowledge_memory.query_knowledge(
+                    last_message,
+                    query_embedding=state.get("query_embedding")
+                )
+                logger.debug(f"Knowledge base results: {knowledge_results}")
                 
-                if knowledge_results and knowledge_results[0]["relevance_score"] > 0.8:
-                    # Use knowledge base results if highly relevant
+                # Use the best knowledge base result that is highly relevant or an exact term match
+                confident = next((
+                    result for result in knowledge_results
+                    if result["relevance_score"] > 0.8
+                    or result.get("lexical_score", 0.0) >= get_settings().KNOWLEDGE_LEXICAL_MATCH_THRESHOLD
+                ), None)
+                if confident:
                     state["search_results"] = {
-                        "content": knowledge_results[0]["content"],
+                        "content": confident["content"],
                         "source": "knowledge_base",
-                        "metadata": knowledge_results[0]["metadata"]
+                        "metadata": confident["metadata"]
                     }
                 else:
                     # Fall back to external search
@@ -238,3 +354,53 @@ class ChatWorkflow(BaseWorkflow):
             logger.error(f"Search processing failed: {str(e)}")
             raise NodeExecutionError(f"Search processing failed: {str(e)}")
 
+    async def stream_chat(self, state: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the chat reply as partial deltas, falling back to search when needed.
+
+        Yields ``{"type": "delta", "content": ...}`` events while the model is
+        generating and a final ``{"type": "done", "response": ...}`` event. Output
+        is held back only while it could still be a fallback reply such as
+        "i don't know", so a search can replace it before the client sees it.
+        """
+        workflow_state = self._initial_state(state)
+        workflow_state = await self.nodes.validate_input(workflow_state)
+        workflow_state = await self.nodes.classify_intent(workflow_state)
+
+        while True:
+            messages = self._build_messages(workflow_state)
+            logger.debug(f"Streaming messages: {messages}")
+
+            response = ""
+            streaming = False
+            async for delta in self.openai_chat.generate_response_stream(
+                messages=messages,
+                temperature=0.7
+            ):
+                response += delta
+                if streaming:
+                    yield {"type": "delta", "content": delta}
+                elif workflow_state["searched"] or not self._could_be_fallback(response):
+                    streaming = True
+                    yield {"type": "delta", "content": response}
+
+            if not streaming and self._needs_search(response) and not workflow_state["searched"]:
+                workflow_state["searched"] = True
+                workflow_state = await self.process_search(workflow_state)
+                continue
+
+            if not streaming and response:
+                yield {"type": "delta", "content": response}
+            break
+
+        yield {
+            "type": "done",
+            "response": {
+                "response": response,
+                "type": "text",
+                "metadata": {
+                    "timestamp": datetime.now(pytz.UTC).isoformat(),
+                }
+            },
+            "searched": workflow_state["searched"],
+            "search_results": workflow_state.get("search_results")
+        }
@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from utils.text_utils import get_encoder
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """A rendered system prompt with its tokens, for one config version"""
+    text: str
+    tokens: List[int] = field(repr=False)
+    version: Optional[str] = None
+
+    @property
+    def token_count(self) -> int:
+        return len(self.tokens)
+
+@dataclass
+class PromptSection:
+    """One block of the prompt.
+
+    ``required`` sections, such as the persona, are always kept whole; the
+    other sections share what is left of the budget. Among those, sections
+    with a lower ``priority`` get their tokens first. A section that does not
+    fit is truncated, keeping its ``keep`` end ("head" or "tail"), unless
+    fewer than ``min_tokens`` would be left or it is not ``truncatable``, in
+    which case it is dropped. A section with ``units``, such as the turns of
+    a conversation, is truncated to whole units and its content is their
+    concatenation. Sections created with ``tokens`` already set are not
+    encoded again.
+    """
+    name: str
+    content: str
+    priority: int
+    role: str = "system"
+    prefix: str = ""
+    max_tokens: Optional[int] = None
+    min_tokens: int = 0
+    keep: str = "head"
+    truncatable: bool = True
+    required: bool = False
+    units: Optional[List[str]] = None
+    tokens: List[int] = field(default_factory=list, repr=False)
+    unit_tokens: List[int] = field(default_factory=list, repr=False)
+
+class PromptAssembler:
+    """Fit prompt sections into a token budget by priority.
+
+    Every section is encoded once; truncation slices the encoded tokens, or
+    drops whole units, so the cost stays linear in the input however large
+    it is. Messages keep the order of the sections, only their allocation
+    follows priority.
+    """
+
+    def __init__(self, token_budget: int, encoder: Optional[Any] = None):
+        self.token_budget = token_budget
+        self.encoder = encoder or get_encoder()
+
+    def _encode(self, section: PromptSection) -> None:
+        if section.units is not None:
+            encoded = [self.encoder.encode(unit) for unit in section.units]
+            section.unit_tokens = [len(tokens) for tokens in encoded]
+            section.tokens = [token for tokens in encoded for token in tokens]
+        else:
+            section.tokens = self.encoder.encode(section.content)
+
+    @staticmethod
+    def _kept_units(section: PromptSection, limit: int) -> Tuple[int, int]:
+        """Number of whole units from the kept end that fit in limit tokens, and their tokens"""
+        counts = section.unit_tokens if section.keep == "head" else section.unit_tokens[::-1]
+        kept = used = 0
+        for count in counts:
+            if used + count > limit:
+                break
+            kept += 1
+            used += count
+        return kept, used
+
+    def assemble(
+        self,
+        sections: List[PromptSection],
+        reserved_tokens: int = 0
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """Return the messages for the sections that fit and a report of what was kept.
+
+        ``reserved_tokens`` are taken off the budget first, for messages that
+        are sent as they are, such as the user's message. Required sections
+        are kept even when that goes over the budget.
+        """
+        remaining = self.token_budget - reserved_tokens
+        allocation: Dict[int, int] = {}
+        used = 0
+        order = sorted(range(len(sections)), key=lambda i: (not sections[i].required, sections[i].priority))
+        for index in order:
+            section = sections[index]
+            if not section.tokens:
+                self._encode(section)
+            prefix_tokens = len(self.encoder.encode(section.prefix)) if section.prefix else 0
+            if section.required:
+                granted = len(section.tokens)
+            else:
+                wanted = len(section.tokens)
+                if section.max_tokens is not None and section.truncatable:
+                    wanted = min(wanted, section.max_tokens)
+                granted = min(wanted, max(remaining - prefix_tokens, 0))
+                if granted < len(section.tokens) and section.unit_tokens:
+                    granted = self._kept_units(section, granted)[1]
+                if granted < len(section.tokens) and (not section.truncatable or granted < max(section.min_tokens, 1)):
+                    granted = 0
+            allocation[index] = granted
+            if granted:
+                remaining -= granted + prefix_tokens
+                used += granted + prefix_tokens
+
+        messages = []
+        report = {"budget": self.token_budget, "reserved_tokens": reserved_tokens, "sections": []}
+        for index, section in enumerate(sections):
+            granted = allocation[index]
+            if granted == len(section.tokens):
+                content = section.content
+            elif granted and section.unit_tokens:
+                kept = self._kept_units(section, granted)[0]
+                content = "".join(section.units[:kept] if section.keep == "head" else section.units[-kept:])
+            elif granted:
+                # A cut through a multi-byte character decodes to U+FFFD
+                if section.keep == "head":
+                    content = self.encoder.decode(section.tokens[:granted]).rstrip("\ufffd")
+                else:
+                    content = self.encoder.decode(section.tokens[-granted:]).lstrip("\ufffd")
+            else:
+                content = None
+            if content:
+                messages.append({"role": section.role, "content": section.prefix + content})
+            report["sections"].append({
+                "name": section.name,
+                "tokens": granted,
+                "original_tokens": len(section.tokens),
+                "status": "kept" if granted == len(section.tokens) else "truncated" if granted else "dropped"
+            })
+        report["total_tokens"] = reserved_tokens + used
+        return messages, report
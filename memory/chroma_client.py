@@ -0,0 +1,153 @@
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from cachetools import LRUCache
+import chromadb
+import httpx
+import asyncio
+import threading
+import logging
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+class AsyncCollection:
+    """Async view of a Chroma collection.
+
+    The blocking HTTP calls of the wrapped collection run on the manager's
+    bounded thread pool, so they never stall the asyncio event loop.
+    """
+
+    def __init__(self, collection: Any, manager: "ChromaClientManager"):
+        self._collection = collection
+        self._manager = manager
+
+    @property
+    def name(self) -> str:
+        return self._collection.name
+
+    async def add(self, **kwargs: Any) -> None:
+        return await self._manager.run(self._collection.add, **kwargs)
+
+    async def upsert(self, **kwargs: Any) -> None:
+        return await self._manager.run(self._collection.upsert, **kwargs)
+
+    async def query(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self._manager.run(self._collection.query, **kwargs)
+
+    async def get(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self._manager.run(self._collection.get, **kwargs)
+
+    async def delete(self, **kwargs: Any) -> None:
+        return await self._manager.run(self._collection.delete, **kwargs)
+
+    async def count(self) -> int:
+        return await self._manager.run(self._collection.count)
+
+class ChromaClientManager:
+    """Process-wide ChromaDB HTTP client with a bounded connection pool.
+
+    Every memory object goes through this manager instead of building its own
+    ``chromadb.HttpClient``, so a new session reuses warm keep-alive
+    connections and an already resolved collection handle.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        collection_cache_size: int = 1024,
+        max_workers: int = 16
+    ):
+        self.host = host
+        self.port = port
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client = None
+        self._collections: LRUCache = LRUCache(maxsize=collection_cache_size)
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chromadb")
+
+    def _configure_http_pool(self, client: Any) -> None:
+        """Swap the client's HTTP session for one with our pool limits"""
+        server = getattr(client, "_server", None)
+        session = getattr(server, "_session", None)
+        if not isinstance(session, httpx.Client):
+            logger.warning("ChromaDB client has no httpx session, keeping default pool limits")
+            return
+
+        server._session = httpx.Client(
+            timeout=session.timeout,
+            limits=self.limits,
+            headers=session.headers
+        )
+        session.close()
+
+    def get_client(self) -> Any:
+        """Return the shared client, connecting on first use"""
+        with self._lock:
+            if self._client is None:
+                client = chromadb.HttpClient(host=self.host, port=self.port)
+                self._configure_http_pool(client)
+                self._client = client
+                logger.info(f"ChromaDB client initialized for {self.host}:{self.port}")
+            return self._client
+
+    def get_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> Any:
+        """Return a cached collection handle, creating the collection if needed"""
+        collection = self._cached_collection(name)
+        if collection is not None:
+            return collection
+
+        # Created outside the lock, so lookups from the event loop never wait on the network
+        collection = self.get_client().get_or_create_collection(
+            name=name,
+            metadata=metadata
+        )
+        with self._lock:
+            return self._collections.setdefault(name, collection)
+
+    def _cached_collection(self, name: str) -> Optional[Any]:
+        # LRUCache.get reorders the cache, so every access holds the lock
+        with self._lock:
+            return self._collections.get(name)
+
+    def forget_collection(self, name: str) -> None:
+        """Drop a cached handle, e.g. after the collection was deleted"""
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def close(self) -> None:
+        """Wait for in-flight vector store calls and release the thread pool"""
+        self._executor.shutdown(wait=True)
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking ChromaDB call on the vector store thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> AsyncCollection:
+        """Return an async collection handle without blocking the event loop"""
+        collection = self._cached_collection(name)
+        if collection is None:
+            collection = await self.run(self.get_collection, name, metadata)
+        return AsyncCollection(collection, self)
+
+@lru_cache()
+def get_chroma_manager() -> ChromaClientManager:
+    settings = get_settings()
+    return ChromaClientManager(
+        host=settings.CHROMADB_HOST,
+        port=settings.CHROMADB_PORT,
+        max_connections=settings.CHROMADB_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.CHROMADB_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.CHROMADB_KEEPALIVE_EXPIRY,
+        collection_cache_size=settings.CHROMADB_COLLECTION_CACHE_SIZE,
+        max_workers=settings.CHROMADB_MAX_WORKERS
+    )
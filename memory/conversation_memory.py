@@ -1,82 +1,146 @@
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
-import chromadb
+from typing import List, Dict, Any, Optional, Tuple
 from config.settings import get_settings
+from memory.vector_store import get_vector_store
+from models.embedding_models import get_embedding_batcher
+from utils.text_utils import count_tokens
 from datetime import datetime
+import hashlib
+import time
 import pytz
+import re
 
 settings = get_settings()
 
+SHARDED = "sharded"
+PER_SESSION = "per_session"
+
+def legacy_collection_name(user_id: str, session_id: str, agent_id: str) -> str:
+    """Collection holding a single session in the per_session layout"""
+    return f"conversation_{user_id}_{session_id}_{agent_id}"
+
+def shard_index(user_id: str, shards: int) -> int:
+    """Stable shard of a user, so all of a user's sessions share one collection"""
+    digest = hashlib.sha1(user_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+def shard_collection_name(agent_id: str, shard: int) -> str:
+    return f"conversation_{agent_id}_shard_{shard:03d}"
+
+SHARD_COLLECTION_PATTERN = re.compile(r"^conversation_(?P<agent_id>.+)_shard_(?P<shard>\d{3})$")
+
+def turn_created_at(metadata: Dict[str, Any]) -> float:
+    """Epoch seconds a turn was stored, from created_at or else its ISO timestamp; 0.0 if unknown"""
+    if isinstance(metadata.get("created_at"), (int, float)):
+        return float(metadata["created_at"])
+    try:
+        return datetime.fromisoformat(metadata["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
 class ConversationMemory:
-    def __init__(self, user_id: str, agent_id: str, session_id: str):
+    def __init__(self, user_id: str, agent_id: str, session_id: str, storage_mode: Optional[str] = None):
         self.user_id = user_id
         self.agent_id = agent_id
         self.session_id = session_id
-        self.collection_name = f"conversation_{user_id}_{session_id}_{agent_id}"
-        self.client = None
+        self.storage_mode = storage_mode or settings.CONVERSATION_STORAGE_MODE
+        if self.storage_mode == SHARDED:
+            # Sessions share a per-agent shard and are told apart by metadata
+            self.collection_name = shard_collection_name(agent_id, shard_index(user_id, settings.CONVERSATION_SHARDS))
+            self.where: Optional[Dict[str, Any]] = {
+                "$and": [{"user_id": user_id}, {"session_id": session_id}]
+            }
+        else:
+            self.collection_name = legacy_collection_name(user_id, session_id, agent_id)
+            self.where = None
         self.collection = None
-        self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
     async def initialize(self):
         """Initialize ChromaDB collection"""
-        if not self.client:
-            self.client = chromadb.HttpClient(
-                host=settings.CHROMADB_HOST,
-                port=settings.CHROMADB_PORT
-            )
-            self.collection = self.client.get_or_create_collection(
+        if not self.collection:
+            self.collection = await get_vector_store().collection(
                 name=self.collection_name,
                 metadata={"hnsw:space": "cosine"}
             )
 
     async def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding using OpenAI API"""
+        """Generate embedding through the shared, cached embedding batcher"""
         try:
-            response = await self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            return response.data[0].embedding
+            return (await get_embedding_batcher().embed([text]))[0]
         except Exception as e:
             raise Exception(f"Failed to generate embedding: {str(e)}")
 
-    async def store_conversation(self, message: str, response: str, metadata: Dict[str, Any]):
-        """Store conversation in ChromaDB"""
-        if not self.collection:
-            await self.initialize()
-
+    def build_turn(self, message: str, response: str, metadata: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+        """Return the (id, document, metadata) stored for one conversation turn"""
         # Add timestamp if not present
         if not metadata.get("timestamp"):
             metadata["timestamp"] = datetime.now(pytz.UTC).isoformat()
 
+        # Numeric time lets history queries filter on a window in the index
+        created_at = turn_created_at(metadata)
+        if created_at:
+            metadata["created_at"] = created_at
+
         # Combine message and response for context
         conversation_text = f"User: {message}\nAssistant: {response}"
-        
-        # Generate embedding
-        embedding = await self.generate_embedding(conversation_text)
+        if self.storage_mode == SHARDED:
+            metadata.update({
+                "user_id": self.user_id,
+                "session_id": self.session_id,
+                "agent_id": self.agent_id
+            })
+            return f"{self.user_id}_{self.session_id}_{metadata['timestamp']}", conversation_text, metadata
+        return f"{self.session_id}_{metadata['timestamp']}", conversation_text, metadata
+
+    async def store_turns(self, turns: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """Embed and store many built turns with one embedding call and one upsert"""
+        if not self.collection:
+            await self.initialize()
+
+        # A replayed turn keeps its id, so the last copy wins instead of failing the batch
+        unique = {turn_id: (document, metadata) for turn_id, document, metadata in turns}
+        ids = list(unique)
+        documents = [unique[turn_id][0] for turn_id in ids]
+
+        try:
+            embeddings = await get_embedding_batcher().embed(documents)
+        except Exception as e:
+            raise Exception(f"Failed to generate embedding: {str(e)}")
 
         # Store in ChromaDB
-        self.collection.add(
-            embeddings=[embedding],
-            documents=[conversation_text],
-            metadatas=[metadata],
-            ids=[f"{self.session_id}_{metadata['timestamp']}"]
+        await self.collection.upsert(
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=[unique[turn_id][1] for turn_id in ids],
+            ids=ids
         )
 
-    async def get_relevant_history(self, current_message: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Retrieve relevant conversation history"""
+    async def store_conversation(self, message: str, response: str, metadata: Dict[str, Any]):
+        """Store conversation in ChromaDB"""
+        await self.store_turns([self.build_turn(message, response, metadata)])
+
+    async def get_relevant_history(
+        self,
+        current_message: str,
+        limit: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve relevant conversation history, reusing query_embedding when given"""
         if not self.collection:
             await self.initialize()
 
         # Generate embedding for current message
-        query_embedding = await self.generate_embedding(current_message)
+        if query_embedding is None:
+            query_embedding = await self.generate_embedding(current_message)
 
         # Query ChromaDB for similar conversations
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=limit,
-            include=["documents", "metadatas", "distances"]
-        )
+        query = {
+            "query_embeddings": [query_embedding],
+            "n_results": limit,
+            "include": ["documents", "metadatas", "distances"]
+        }
+        if self.where is not None:
+            query["where"] = self.where
+        results = await self.collection.query(**query)
 
         relevant_history = []
         for i in range(len(results["documents"][0])):      
@@ -87,3 +151,85 @@ class ConversationMemory:
             })
 
         return relevant_history
+
+    async def get_recent_relevant_history(
+        self,
+        current_message: str,
+        token_budget: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None,
+        window: Optional[float] = None,
+        half_life: Optional[float] = None,
+        candidates: Optional[int] = None,
+        min_relevance: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve the history that best fits a token budget, favouring recent turns.
+
+        Only turns stored in the last ``window`` seconds are searched, or
+        every turn when none of them is that recent, as for turns stored
+        before ``created_at`` was recorded. Each
+        candidate more similar than ``min_relevance`` is scored by its
+        similarity halved every ``half_life`` seconds of age, and turns are
+        taken best first while their tokens fit ``token_budget``. The result
+        is in chronological order and each turn also carries its
+        ``recency_score`` and ``token_count``.
+        """
+        if not self.collection:
+            await self.initialize()
+
+        token_budget = settings.CONVERSATION_HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+        window = settings.CONVERSATION_HISTORY_WINDOW if window is None else window
+        half_life = settings.CONVERSATION_HISTORY_HALF_LIFE if half_life is None else half_life
+        candidates = candidates or settings.CONVERSATION_HISTORY_CANDIDATES
+        min_relevance = settings.CONVERSATION_HISTORY_MIN_RELEVANCE if min_relevance is None else min_relevance
+
+        if query_embedding is None:
+            query_embedding = await self.generate_embedding(current_message)
+
+        now = time.time()
+        results = await self._query_window(query_embedding, candidates, now - window if window else None)
+        if window and not results["documents"][0]:
+            results = await self._query_window(query_embedding, candidates, None)
+
+        scored = []
+        for document, metadata, distance in zip(
+            results["documents"][0], results["metadatas"][0], results["distances"][0]
+        ):
+            relevance = 1 - distance
+            if relevance <= min_relevance:
+                continue
+            age = max(0.0, now - turn_created_at(metadata))
+            decay = 0.5 ** (age / half_life) if half_life else 1.0
+            scored.append({
+                "conversation": document,
+                "metadata": metadata,
+                "relevance_score": relevance,
+                "recency_score": relevance * decay
+            })
+        scored.sort(key=lambda turn: turn["recency_score"], reverse=True)
+
+        selected = []
+        used = 0
+        for turn in scored:
+            turn["token_count"] = count_tokens(turn["conversation"])
+            if used + turn["token_count"] > token_budget:
+                continue
+            selected.append(turn)
+            used += turn["token_count"]
+
+        selected.sort(key=lambda turn: turn_created_at(turn["metadata"]))
+        return selected
+
+    async def _query_window(self, query_embedding: List[float], candidates: int, since: Optional[float]) -> Dict[str, Any]:
+        clauses = [] if self.where is None else list(self.where["$and"])
+        if since is not None:
+            clauses.append({"created_at": {"$gte": since}})
+        query = {
+            "query_embeddings": [query_embedding],
+            "n_results": candidates,
+            "include": ["documents", "metadatas", "distances"]
+        }
+        if len(clauses) == 1:
+            query["where"] = clauses[0]
+        elif clauses:
+            query["where"] = {"$and": clauses}
+        return await self.collection.query(**query)
@@ -0,0 +1,100 @@
+from typing import Any, Dict, List, Tuple
+from memory.conversation_memory import ConversationMemory
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ConversationWriteBuffer:
+    """Group conversation turns per collection into batched writes.
+
+    Turns queued with ``submit`` are kept per collection and written with one
+    embedding call and one upsert once a collection has ``max_batch_size``
+    turns, ``max_wait`` seconds after its first queued turn, or on ``close``.
+    Each caller gets a future that resolves when its turn is stored.
+    """
+
+    def __init__(self, max_batch_size: int = 256, max_wait: float = 0.05):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: Dict[str, Tuple[ConversationMemory, List[Tuple[Tuple[str, str, Dict[str, Any]], asyncio.Future]]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self.batches = 0
+        self.turns_stored = 0
+        self.turns_failed = 0
+
+    def submit(
+        self,
+        memory: ConversationMemory,
+        message: str,
+        response: str,
+        metadata: Dict[str, Any],
+        immediate: bool = False
+    ) -> asyncio.Future:
+        """Queue one turn and return a future resolved once it is stored.
+
+        With ``immediate`` the collection is written right away, together
+        with whatever is already queued for it, instead of after ``max_wait``.
+        """
+        future = asyncio.get_running_loop().create_future()
+        name = memory.collection_name
+        _, turns = self._pending.setdefault(name, (memory, []))
+        turns.append((memory.build_turn(message, response, metadata), future))
+
+        if immediate or len(turns) >= self.max_batch_size:
+            self._flush(name)
+        elif name not in self._timers:
+            self._timers[name] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, name)
+        return future
+
+    async def store(self, memory: ConversationMemory, message: str, response: str, metadata: Dict[str, Any]) -> None:
+        await self.submit(memory, message, response, metadata)
+
+    def _flush(self, name: str) -> None:
+        """Write everything queued for one collection in the background"""
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(name, None)
+        if pending is None:
+            return
+
+        task = asyncio.ensure_future(self._write(*pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, memory: ConversationMemory, turns: List[Tuple[Tuple[str, str, Dict[str, Any]], asyncio.Future]]) -> None:
+        try:
+            await memory.store_turns([turn for turn, _ in turns])
+            self.batches += 1
+            self.turns_stored += len(turns)
+            for _, future in turns:
+                if not future.done():
+                    future.set_result(None)
+        except Exception as e:
+            logger.error(f"Failed to store {len(turns)} turns in {memory.collection_name}: {str(e)}")
+            self.turns_failed += len(turns)
+            for _, future in turns:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def flush(self) -> None:
+        """Write every queued turn and wait for all writes in flight"""
+        for name in list(self._pending):
+            self._flush(name)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.flush()
+        logger.info(f"Conversation write buffer stats: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "turns_stored": self.turns_stored,
+            "turns_failed": self.turns_failed,
+            "avg_batch_size": self.turns_stored / self.batches if self.batches else 0.0,
+            "queued": sum(len(turns) for _, turns in self._pending.values())
+        }
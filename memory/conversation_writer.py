@@ -0,0 +1,583 @@
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from config.settings import get_settings
+from memory.conversation_memory import ConversationMemory
+from memory.conversation_write_buffer import ConversationWriteBuffer
+from memory.redis_store import RedisStore
+from utils.cache import BoundedCache
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import pytz
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+class SpoolJournal:
+    """Append-only local spool of turns waiting to be persisted.
+
+    Each record gets a sequence number. File I/O runs on one dedicated
+    thread, off the event loop. Appends that arrive while a write is on disk
+    are committed together by the next write, with one flush and fsync. The
+    highest sequence below which every record is acknowledged is kept in
+    ``<path>.offset``, written at most every ``commit_interval`` seconds, and
+    the spool is truncated whenever everything written to it has been
+    acknowledged. A crash can replay turns acknowledged since the last
+    offset write; storing a turn is an idempotent upsert, so that is
+    harmless. Records that could not be persisted go to ``<path>.dead``
+    before they are acknowledged, so one bad record never holds the
+    watermark back.
+    """
+
+    reclaim_interval: Optional[float] = None
+
+    def __init__(self, path: str, fsync: bool = False, commit_interval: float = 1.0):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.dead_letter_path = f"{path}.dead"
+        self.fsync = fsync
+        self.commit_interval = commit_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation_spool")
+        self._file = None
+        self._next_seq = 1
+        self._committed = 0
+        self._written_offset = 0
+        self._acked: set = set()
+        self._lines: List[Tuple[str, List[int], asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._commit_timer: Optional[asyncio.TimerHandle] = None
+        self._commit_task: Optional[asyncio.Task] = None
+
+    async def _run(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def recover(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Open the spool and return the records that were never acknowledged"""
+        return await self._run(self._recover)
+
+    def _recover(self) -> List[Tuple[int, Dict[str, Any]]]:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path, encoding="utf-8") as f:
+                self._committed = int(f.read().strip() or 0)
+        self._written_offset = self._committed
+
+        pending = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write
+                        logger.warning(f"Skipping unreadable line in spool {self.path}")
+                        continue
+                    if entry["seq"] > self._committed:
+                        pending.append((entry["seq"], entry["record"]))
+
+        self._next_seq = max([seq for seq, _ in pending], default=self._committed) + 1
+        self._file = open(self.path, "a", encoding="utf-8")
+        return pending
+
+    async def append_many(self, records: List[Dict[str, Any]]) -> List[int]:
+        """Write records to the spool and return their sequence numbers once on disk"""
+        seqs = list(range(self._next_seq, self._next_seq + len(records)))
+        self._next_seq += len(records)
+        text = "".join(json.dumps({"seq": seq, "record": record}) + "\n" for seq, record in zip(seqs, records))
+        future = asyncio.get_running_loop().create_future()
+        self._lines.append((text, seqs, future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._write_lines())
+        await future
+        return seqs
+
+    async def _write_lines(self) -> None:
+        while self._lines:
+            lines, self._lines = self._lines, []
+            try:
+                await self._run(self._write, "".join(text for text, _, _ in lines))
+            except Exception as e:
+                # Never written, so nothing is left to hold the watermark back
+                for _, seqs, future in lines:
+                    self._acked.update(seqs)
+                    if not future.done():
+                        future.set_exception(e)
+                self._advance()
+            else:
+                for _, _, future in lines:
+                    if not future.done():
+                        future.set_result(None)
+
+    def _write(self, text: str) -> None:
+        self._file.write(text)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    async def ack_many(self, seqs: List[int]) -> None:
+        self._acked.update(seqs)
+        self._advance()
+
+    def _advance(self) -> None:
+        committed = self._committed
+        while committed + 1 in self._acked:
+            committed += 1
+            self._acked.discard(committed)
+        if committed == self._committed:
+            return
+
+        self._committed = committed
+        if self._commit_timer is None:
+            self._commit_timer = asyncio.get_running_loop().call_later(self.commit_interval, self._start_commit)
+
+    def _start_commit(self) -> None:
+        self._commit_timer = None
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.ensure_future(self._commit())
+        else:
+            # A commit is still on disk, try again after the next interval
+            self._commit_timer = asyncio.get_running_loop().call_later(self.commit_interval, self._start_commit)
+
+    async def _commit(self) -> None:
+        committed = self._committed
+        if committed == self._written_offset:
+            return
+        # Appends given a later sequence are queued on the same thread after
+        # this, so the spool only holds acknowledged records when truncated
+        truncate = committed == self._next_seq - 1
+        try:
+            await self._run(self._write_offset, committed, truncate)
+            self._written_offset = committed
+        except Exception as e:
+            logger.error(f"Failed to commit spool offset {committed}: {str(e)}")
+
+    def _write_offset(self, committed: int, truncate: bool) -> None:
+        tmp_path = f"{self.offset_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(committed))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+        if truncate:
+            # Everything written so far is stored, start the spool over
+            self._file.truncate(0)
+
+    async def dead_letter(self, record: Dict[str, Any], error: str) -> None:
+        await self._run(self._write_dead_letter, json.dumps({"record": record, "error": error}) + "\n")
+
+    def _write_dead_letter(self, line: str) -> None:
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        if self._commit_task is not None:
+            await asyncio.gather(self._commit_task, return_exceptions=True)
+        if self._file is not None:
+            await self._commit()
+            await self._run(self._file.close)
+            self._file = None
+        self._executor.shutdown(wait=False)
+
+class RedisStreamJournal:
+    """Turns waiting to be persisted, kept in a Redis stream shared by all pods.
+
+    Every pod is a consumer in one consumer group. ``append`` adds a turn and
+    delivers it to the appending pod in one atomic script, so the turn sits
+    in that pod's pending list and no other consumer reads it. ``recover``
+    claims only entries idle for ``claim_idle`` seconds, which are turns of
+    pods that died or stalled, instead of everything in the stream. Storing a
+    turn is an idempotent upsert, so a stalled pod and the claiming pod may
+    both store a turn without harm.
+    """
+
+    # Atomic with XADD, so this read always delivers the entries just added
+    APPEND_SCRIPT = """
+        local ids = {}
+        for i = 3, #ARGV do
+            ids[#ids + 1] = redis.call('XADD', KEYS[1], '*', 'record', ARGV[i])
+        end
+        redis.call('XREADGROUP', 'GROUP', ARGV[1], ARGV[2], 'COUNT', #ids, 'STREAMS', KEYS[1], '>')
+        return ids
+    """
+
+    def __init__(
+        self,
+        redis_client: Any,
+        stream: str,
+        consumer: str,
+        group: str = "conversation_writers",
+        claim_idle: float = 60.0,
+        page_size: int = 1000
+    ):
+        self.redis = redis_client
+        self.stream = stream
+        self.dead_letter_stream = f"{stream}:dead"
+        self.consumer = consumer
+        self.group = group
+        self.claim_idle = claim_idle
+        self.reclaim_interval = claim_idle
+        self.page_size = page_size
+        self._append = redis_client.register_script(self.APPEND_SCRIPT)
+        self._group_ready = False
+
+    async def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def recover(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Claim the turns other consumers left unacknowledged for claim_idle seconds"""
+        await self._ensure_group()
+        pending = []
+        start = "0-0"
+        while True:
+            start, entries, _ = await self.redis.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer,
+                min_idle_time=int(self.claim_idle * 1000),
+                start_id=start,
+                count=self.page_size
+            )
+            pending.extend(
+                (entry_id, json.loads(fields["record"])) for entry_id, fields in entries if fields
+            )
+            if start in ("0-0", b"0-0"):
+                return pending
+
+    async def append_many(self, records: List[Dict[str, Any]]) -> List[str]:
+        await self._ensure_group()
+        return await self._append(
+            keys=[self.stream],
+            args=[self.group, self.consumer, *(json.dumps(record) for record in records)]
+        )
+
+    async def ack_many(self, entry_ids: List[str]) -> None:
+        await self.redis.xack(self.stream, self.group, *entry_ids)
+        await self.redis.xdel(self.stream, *entry_ids)
+
+    async def dead_letter(self, record: Dict[str, Any], error: str) -> None:
+        await self.redis.xadd(self.dead_letter_stream, {"record": json.dumps(record), "error": error})
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+class ConversationWriteBehind:
+    """Persist finished turns in the background, off the request path.
+
+    ``submit`` records a turn in a durable journal and queues it. Workers
+    take every queued turn at once, up to the buffer's batch size, write
+    them through a ``ConversationWriteBuffer`` so each collection gets one
+    batch, and acknowledge the stored turns in the journal together.
+    ``submit_many`` journals a group of turns with one write and hands them
+    to the buffer directly, for bulk loads. The queue holds at most
+    ``max_pending`` turns, and ``submit`` waits when it is full. A failed
+    turn is queued again after an exponential backoff; one that fails every
+    retry is moved to the journal's dead letters and acknowledged. Turns
+    left in the journal by a crash are queued again by ``start``, and
+    periodically as well for journals shared between pods. ``close`` drains
+    the queue.
+    """
+
+    def __init__(
+        self,
+        journal: Any,
+        buffer: Optional[ConversationWriteBuffer] = None,
+        max_pending: int = 10000,
+        workers: int = 32,
+        max_retries: int = 3,
+        retry_delay: float = 0.5
+    ):
+        settings = get_settings()
+        self.journal = journal
+        self.buffer = buffer or ConversationWriteBuffer()
+        self.max_pending = max_pending
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.memories: BoundedCache[ConversationMemory] = BoundedCache(
+            "write_behind_memories",
+            max_size=settings.MAX_CONCURRENT_USERS,
+            ttl=settings.SESSION_TIMEOUT
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._tasks: set = set()
+        self._reclaim_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self.submitted = 0
+        self.persisted = 0
+        self.failed = 0
+        self.retries = 0
+        self.replayed = 0
+        self.dead_lettered = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    async def start(self) -> None:
+        """Start the workers and queue every turn left in the journal"""
+        async with self._start_lock:
+            if self._queue is not None:
+                return
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            pending = await self.journal.recover()
+            self._worker_tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+            if self.journal.reclaim_interval:
+                self._reclaim_task = asyncio.ensure_future(self._reclaim_periodically())
+
+        await self._replay(pending)
+
+    async def _replay(self, pending: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        if pending:
+            logger.info(f"Replaying {len(pending)} unpersisted conversation turns")
+        for token, record in pending:
+            self.replayed += 1
+            await self._put(token, record)
+
+    async def _reclaim_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.journal.reclaim_interval)
+            try:
+                await self._replay(await self.journal.recover())
+            except Exception as e:
+                logger.error(f"Failed to reclaim conversation turns: {str(e)}")
+
+    def _record(
+        self,
+        user_id: str,
+        agent_id: str,
+        session_id: str,
+        message: str,
+        response: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        metadata = dict(metadata or {})
+        # Fix the timestamp now so a replayed turn keeps its id
+        if not metadata.get("timestamp"):
+            metadata["timestamp"] = datetime.now(pytz.UTC).isoformat()
+
+        return {
+            "user_id": user_id,
+            "agent_id": agent_id,
+            "session_id": session_id,
+            "message": message,
+            "response": response,
+            "metadata": metadata
+        }
+
+    async def submit(
+        self,
+        user_id: str,
+        agent_id: str,
+        session_id: str,
+        message: str,
+        response: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Journal one turn and queue it for persistence"""
+        if self._queue is None:
+            await self.start()
+
+        record = self._record(user_id, agent_id, session_id, message, response, metadata)
+        [token] = await self.journal.append_many([record])
+        self.submitted += 1
+        await self._put(token, record)
+
+    async def submit_many(self, turns: List[Tuple[str, str, str, str, str, Optional[Dict[str, Any]]]]) -> asyncio.Task:
+        """Journal a group of turns with one write and start storing them.
+
+        Each turn is a ``(user_id, agent_id, session_id, message, response,
+        metadata)`` tuple. Returns once the group is journaled, with a task
+        that finishes when every turn is stored or queued for a retry.
+        """
+        if self._queue is None:
+            await self.start()
+
+        records = [self._record(*turn) for turn in turns]
+        tokens = await self.journal.append_many(records)
+        self.submitted += len(records)
+        queued_at = time.monotonic()
+        return self._track(self._persist_batch([(token, record, queued_at, 0) for token, record in zip(tokens, records)]))
+
+    def _track(self, coroutine: Any) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _put(self, token: Any, record: Dict[str, Any], queued_at: Optional[float] = None, attempt: int = 0) -> None:
+        item = (token, record, queued_at or time.monotonic(), attempt)
+        if self._queue.full():
+            self.backpressure_waits += 1
+            started = time.monotonic()
+            await self._queue.put(item)
+            self.backpressure_seconds += time.monotonic() - started
+        else:
+            self._queue.put_nowait(item)
+
+    async def _memory(self, record: Dict[str, Any]) -> ConversationMemory:
+        memory_key = f"{record['user_id']}_{record['session_id']}_{record['agent_id']}"
+        memory = await self.memories.get(memory_key)
+        if memory is None:
+            memory = ConversationMemory(record["user_id"], record["agent_id"], record["session_id"])
+            await self.memories.set(memory_key, memory)
+        return memory
+
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # Take every turn already queued, so each collection gets one batch
+            while len(batch) < self.buffer.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._persist_batch(batch)
+            except Exception as e:
+                logger.error(f"Unexpected write-behind error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _persist_batch(self, items: List[Tuple[Any, Dict[str, Any], float, int]]) -> None:
+        groups: Dict[Tuple[str, str, str], List[Tuple[Any, Dict[str, Any], float, int]]] = {}
+        for item in items:
+            record = item[1]
+            groups.setdefault((record["user_id"], record["session_id"], record["agent_id"]), []).append(item)
+        await asyncio.gather(*(self._persist_group(group) for group in groups.values()))
+
+    async def _persist_group(self, items: List[Tuple[Any, Dict[str, Any], float, int]]) -> None:
+        """Store the turns of one collection together and acknowledge them at once"""
+        try:
+            memory = await self._memory(items[0][1])
+            # Every turn of the group is in hand, so write them without waiting
+            futures = [
+                self.buffer.submit(
+                    memory, record["message"], record["response"], dict(record["metadata"]),
+                    immediate=index == len(items) - 1
+                )
+                for index, (_, record, _, _) in enumerate(items)
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(items)
+
+        stored = [item for item, result in zip(items, results) if not isinstance(result, BaseException)]
+        if stored:
+            try:
+                await self.journal.ack_many([token for token, _, _, _ in stored])
+            except Exception as e:
+                # Left in the journal, so a later start stores them again
+                logger.error(f"Failed to acknowledge {len(stored)} stored turns: {str(e)}")
+            self.persisted += len(stored)
+            self.max_lag_seconds = max(self.max_lag_seconds, time.monotonic() - min(item[2] for item in stored))
+
+        for item, result in zip(items, results):
+            if isinstance(result, BaseException):
+                await self._retry(item, str(result))
+
+    async def _retry(self, item: Tuple[Any, Dict[str, Any], float, int], error: str) -> None:
+        token, record, queued_at, attempt = item
+        if attempt >= self.max_retries:
+            logger.error(f"Failed to persist turn for session {record['session_id']}: {error}")
+            self.failed += 1
+            await self._dead_letter(token, record, error)
+            return
+        self.retries += 1
+        self._track(self._requeue(token, record, queued_at, attempt + 1))
+
+    async def _requeue(self, token: Any, record: Dict[str, Any], queued_at: float, attempt: int) -> None:
+        await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+        await self._put(token, record, queued_at, attempt)
+
+    async def _dead_letter(self, token: Any, record: Dict[str, Any], error: str) -> None:
+        """Set a failed turn aside and acknowledge it, so the journal keeps moving"""
+        try:
+            await self.journal.dead_letter(record, error)
+            await self.journal.ack_many([token])
+            self.dead_lettered += 1
+        except Exception as e:
+            # Left in the journal, so a later start retries it
+            logger.error(f"Failed to dead-letter turn for session {record['session_id']}: {str(e)}")
+
+    async def close(self) -> None:
+        """Persist every queued turn, then stop the workers"""
+        if self._queue is None:
+            return
+        if self._reclaim_task is not None:
+            self._reclaim_task.cancel()
+        # Bulk writes and retries waiting on their backoff add to the queue
+        while True:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._queue.join()
+            if not self._tasks:
+                break
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        await self.buffer.close()
+        await self.journal.close()
+        await self.memories.clear()
+        logger.info(f"Conversation write-behind stats: {self.stats()}")
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_tasks": len(self._tasks),
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "persisted": self.persisted,
+            "failed": self.failed,
+            "retries": self.retries,
+            "replayed": self.replayed,
+            "dead_lettered": self.dead_lettered,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 3)
+        }
+
+@lru_cache()
+def get_conversation_writer() -> ConversationWriteBehind:
+    settings = get_settings()
+    if settings.WRITE_BEHIND_BACKEND == "redis":
+        journal = RedisStreamJournal(
+            RedisStore().redis,
+            settings.WRITE_BEHIND_STREAM,
+            consumer=settings.WRITE_BEHIND_CONSUMER or f"{socket.gethostname()}-{os.getpid()}",
+            claim_idle=settings.WRITE_BEHIND_CLAIM_IDLE
+        )
+    else:
+        journal = SpoolJournal(
+            settings.WRITE_BEHIND_SPOOL_PATH,
+            fsync=settings.WRITE_BEHIND_FSYNC,
+            commit_interval=settings.WRITE_BEHIND_COMMIT_INTERVAL
+        )
+    return ConversationWriteBehind(
+        journal,
+        buffer=ConversationWriteBuffer(
+            max_batch_size=settings.CONVERSATION_WRITE_BATCH_SIZE,
+            max_wait=settings.CONVERSATION_WRITE_FLUSH_MS / 1000
+        ),
+        max_pending=settings.WRITE_BEHIND_MAX_PENDING,
+        workers=settings.WRITE_BEHIND_WORKERS,
+        max_retries=settings.WRITE_BEHIND_MAX_RETRIES
+    )
@@ -0,0 +1,128 @@
+from typing import Any, Dict, List, Optional, Sequence
+from functools import lru_cache
+from cachetools import LRUCache
+import redis.asyncio as redis
+import numpy as np
+import hashlib
+import unicodedata
+import logging
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share one cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by model and normalized-text hash.
+
+    The first tier is an in-process LRU of float32 vectors. The optional
+    second tier is Redis, storing each vector as raw float32 bytes so it can
+    be shared across pods and survive restarts.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        redis_client: Optional[Any] = None,
+        redis_ttl: Optional[int] = None
+    ):
+        self._local: LRUCache = LRUCache(maxsize=max_size)
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"embedding:{model}:{digest}"
+
+    async def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings, returning None for every text that is not cached"""
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        remote = []
+        for i, key in enumerate(keys):
+            vector = self._local.get(key)
+            if vector is not None:
+                self.memory_hits += 1
+                results[i] = vector.tolist()
+            else:
+                remote.append(i)
+
+        if remote and self.redis is not None:
+            try:
+                values = await self.redis.mget([keys[i] for i in remote])
+                for i, value in zip(remote, values):
+                    if value is not None:
+                        vector = np.frombuffer(value, dtype=np.float32)
+                        self._local[keys[i]] = vector
+                        self.redis_hits += 1
+                        results[i] = vector.tolist()
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis lookup failed: {str(e)}")
+
+        self.misses += sum(1 for result in results if result is None)
+        return results
+
+    async def set_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        """Store embeddings in both tiers"""
+        items = {}
+        for text, embedding in zip(texts, embeddings):
+            key = self.make_key(model, text)
+            vector = np.asarray(embedding, dtype=np.float32)
+            self._local[key] = vector
+            items[key] = vector.tobytes()
+
+        if items and self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, value in items.items():
+                        pipe.set(key, value, ex=self.redis_ttl)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis write failed: {str(e)}")
+
+    async def get(self, model: str, text: str) -> Optional[List[float]]:
+        return (await self.get_many(model, [text]))[0]
+
+    async def set(self, model: str, text: str, embedding: Sequence[float]) -> None:
+        await self.set_many(model, [text], [embedding])
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counters per tier and the overall hit rate"""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._local),
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0
+        }
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    settings = get_settings()
+    redis_client = None
+    if settings.EMBEDDING_CACHE_REDIS:
+        # Binary values, so this client must not decode responses
+        redis_kwargs = {
+            "host": settings.REDIS_HOST,
+            "port": settings.REDIS_PORT,
+            "db": settings.REDIS_DB
+        }
+        if settings.REDIS_PASSWORD:
+            redis_kwargs["password"] = settings.REDIS_PASSWORD
+        redis_client = redis.Redis(**redis_kwargs)
+
+    return EmbeddingCache(
+        max_size=settings.EMBEDDING_CACHE_SIZE,
+        redis_client=redis_client,
+        redis_ttl=settings.EMBEDDING_CACHE_TTL
+    )
@@ -0,0 +1,252 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Chunker living in each worker process of the ingest pool
+_worker_memory = None
+
+def _init_chunk_worker(max_tokens: int, overlap_tokens: int) -> None:
+    global _worker_memory
+    from memory.knowledge_memory import KnowledgeMemory
+    _worker_memory = KnowledgeMemory("ingest_worker", max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+def _chunk_entries(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    return [_worker_memory.build_chunk_records(entry) for entry in entries]
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Lazily read knowledge entries from a JSONL file"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+@dataclass
+class IngestStats:
+    entries: int = 0
+    skipped_entries: int = 0
+    chunks: int = 0
+    tokens: int = 0
+    pages: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed
+        return {
+            "entries": self.entries,
+            "skipped_entries": self.skipped_entries,
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "pages": self.pages,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks / elapsed, 1) if elapsed else 0.0,
+            "tokens_per_second": round(self.tokens / elapsed, 1) if elapsed else 0.0
+        }
+
+class KnowledgeIngestPipeline:
+    """Streaming bulk loader for a KnowledgeMemory collection.
+
+    Entries are read lazily and chunked in a process pool. The chunks are
+    embedded in token-bounded pages, at most ``max_concurrency`` at a time,
+    and each page is upserted with one call. After each page, the number of
+    fully stored entries is written to ``checkpoint_path``, so a killed
+    ingest resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        knowledge_memory: Any,
+        page_size: int = 500,
+        page_tokens: int = 100000,
+        max_concurrency: int = 4,
+        chunk_workers: int = 4,
+        entries_per_task: int = 64,
+        checkpoint_path: Optional[str] = None,
+        on_entry: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ):
+        self.memory = knowledge_memory
+        self.page_size = page_size
+        self.page_tokens = page_tokens
+        self.max_concurrency = max_concurrency
+        self.chunk_workers = chunk_workers
+        self.entries_per_task = entries_per_task
+        self.checkpoint_path = checkpoint_path
+        self.on_entry = on_entry
+        self.stats = IngestStats()
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._page_tasks: set = set()
+        self._page: List[Dict[str, Any]] = []
+        self._page_token_count = 0
+        # Chunks still to be stored per entry index, used to advance the checkpoint
+        self._remaining: Dict[int, int] = {}
+        self._next_entry = 0
+        self._watermark = 0
+        self._skipped = 0
+        self._completed_entries = 0
+        self._error: Optional[BaseException] = None
+
+    def _load_checkpoint(self) -> int:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("collection") != self.memory.collection_name:
+            logger.warning(f"Ignoring checkpoint for collection {checkpoint.get('collection')}")
+            return 0
+        return checkpoint.get("entries_done", 0)
+
+    def _save_checkpoint(self) -> None:
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "collection": self.memory.collection_name,
+                "entries_done": self._completed_entries,
+                "stats": self.stats.as_dict()
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _entry_blocks(self, entries: Iterable[Dict[str, Any]], skip: int) -> Iterator[List[Dict[str, Any]]]:
+        block = []
+        for index, entry in enumerate(entries):
+            if index < skip:
+                continue
+            block.append(entry)
+            if len(block) >= self.entries_per_task:
+                yield block
+                block = []
+        if block:
+            yield block
+
+    async def _chunk_blocks(self, blocks: Iterator[List[Dict[str, Any]]]):
+        """Yield chunk records per entry, keeping a bounded number of blocks in flight"""
+        if self.chunk_workers <= 0:
+            for block in blocks:
+                yield [self.memory.build_chunk_records(entry) for entry in block]
+            return
+
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(
+            max_workers=self.chunk_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_chunk_worker,
+            initargs=(self.memory.max_tokens, self.memory.overlap_tokens)
+        ) as pool:
+            in_flight: List[asyncio.Future] = []
+            for block in blocks:
+                in_flight.append(loop.run_in_executor(pool, _chunk_entries, block))
+                if len(in_flight) >= self.chunk_workers * 2:
+                    yield await in_flight.pop(0)
+            for future in in_flight:
+                yield await future
+
+    def _add_entry(self, records: List[Dict[str, Any]]) -> None:
+        index = self._next_entry
+        self._next_entry += 1
+        self._remaining[index] = len(records)
+        self.stats.entries += 1
+        if self.on_entry:
+            self.on_entry(records)
+        for record in records:
+            record["entry_index"] = index
+            self._page.append(record)
+            self._page_token_count += record["metadata"]["token_count"]
+            if len(self._page) >= self.page_size or self._page_token_count >= self.page_tokens:
+                self._dispatch_page()
+        self._advance_checkpoint()
+
+    def _dispatch_page(self) -> None:
+        if not self._page:
+            return
+        page, self._page, self._page_token_count = self._page, [], 0
+        task = asyncio.ensure_future(self._store_page(page))
+        self._page_tasks.add(task)
+        task.add_done_callback(self._page_done)
+
+    def _page_done(self, task: asyncio.Task) -> None:
+        self._page_tasks.discard(task)
+        if not task.cancelled() and task.exception() and self._error is None:
+            self._error = task.exception()
+
+    async def _store_page(self, page: List[Dict[str, Any]]) -> None:
+        async with self._semaphore:
+            documents = [record["document"] for record in page]
+            embeddings = await self.memory.generate_embeddings(documents)
+            ids = [record["id"] for record in page]
+            metadatas = [record["metadata"] for record in page]
+            await self.memory.collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+            self.memory.index_chunks(ids, documents)
+
+        self.stats.pages += 1
+        self.stats.chunks += len(page)
+        self.stats.tokens += sum(record["metadata"]["token_count"] for record in page)
+        for record in page:
+            self._remaining[record["entry_index"]] -= 1
+        self._advance_checkpoint()
+        self._save_checkpoint()
+        logger.info(f"Ingest progress for '{self.memory.collection_name}': {self.stats.as_dict()}")
+
+    def _advance_checkpoint(self) -> None:
+        """Move the checkpoint past every leading entry whose chunks are all stored"""
+        while self._remaining.get(self._watermark) == 0:
+            del self._remaining[self._watermark]
+            self._watermark += 1
+        self._completed_entries = self._skipped + self._watermark
+
+    async def run(self, entries: Union[Iterable[Dict[str, Any]], str]) -> Dict[str, Any]:
+        """Ingest entries from an iterable or a JSONL file path and return throughput stats"""
+        if not self.memory.collection:
+            await self.memory.initialize()
+
+        if isinstance(entries, str):
+            entries = read_jsonl(entries)
+
+        self._skipped = self._load_checkpoint()
+        self._completed_entries = self._skipped
+        self.stats = IngestStats(skipped_entries=self._skipped)
+        if self._skipped:
+            logger.info(f"Resuming ingest of '{self.memory.collection_name}' after {self._skipped} entries")
+
+        chunked = self._chunk_blocks(self._entry_blocks(entries, self._skipped))
+        try:
+            async for block_records in chunked:
+                for records in block_records:
+                    self._add_entry(records)
+                if self._error:
+                    break
+                # Backpressure: do not chunk further ahead than the pages being stored
+                while len(self._page_tasks) >= self.max_concurrency * 2 and not self._error:
+                    await asyncio.wait(self._page_tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            await chunked.aclose()
+
+        if not self._error:
+            self._dispatch_page()
+        if self._page_tasks:
+            await asyncio.wait(self._page_tasks)
+        if self._error:
+            raise self._error
+
+        self._save_checkpoint()
+        stats = self.stats.as_dict()
+        logger.info(f"Ingest of '{self.memory.collection_name}' finished: {stats}")
+        return stats
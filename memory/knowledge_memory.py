@@ -1,21 +1,36 @@
-import chromadb
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional, Tuple, Union
 from config.settings import get_settings
+from memory.vector_store import get_vector_store
+from memory.knowledge_ingest import KnowledgeIngestPipeline, read_jsonl
+from memory.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from memory.redis_store import get_redis_store
+from models.embedding_models import get_embedding_batcher
+import numpy as np
 import tiktoken
+import asyncio
+import hashlib
+import json
+import logging
+import time
 import uuid
-from openai import AsyncOpenAI
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Decoded tokens that end a sentence and make a good chunk boundary
+BREAK_CHARS = {'.', '?', '!', '\n'}
+
 class KnowledgeMemory:
     def __init__(self, collection_name, max_tokens: int = 500, overlap_tokens: int = 50):
-        self.client = None
         self.collection_name = collection_name
         self.collection = None
         self.max_tokens = max_tokens
         self.overlap_tokens = overlap_tokens
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
-        self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self._break_tokens: Dict[int, bool] = {}
+        self.lexical_index = LexicalIndex()
+        self._lexical_task: Optional[asyncio.Task] = None
+        self._lexical_checked_at = float("-inf")
 
     def _validate_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and convert metadata to acceptable format for ChromaDB"""
@@ -29,56 +44,68 @@ class KnowledgeMemory:
                 valid_metadata[key] = str(value)
         return valid_metadata
 
+    def _is_break_token(self, token: int) -> bool:
+        """Check if a token decodes to a sentence ending, decoding each token id once"""
+        is_break = self._break_tokens.get(token)
+        if is_break is None:
+            is_break = self.tokenizer.decode([token]).strip() in BREAK_CHARS
+            self._break_tokens[token] = is_break
+        return is_break
+
+    def _break_positions(self, tokens: np.ndarray) -> np.ndarray:
+        """Return the sorted token positions that end a sentence"""
+        unique, inverse = np.unique(tokens, return_inverse=True)
+        unique_mask = np.fromiter(
+            (self._is_break_token(int(token)) for token in unique),
+            dtype=bool,
+            count=len(unique)
+        )
+        return np.flatnonzero(unique_mask[inverse])
+
     def _chunk_text(self, text: str) -> List[Dict[str, Any]]:
         """Split text into overlapping chunks based on token count with smart splitting"""
         tokens = self.tokenizer.encode(text)
         chunks = []
-        
+        if not tokens:
+            return chunks
+
+        # Sentence endings are located once per document instead of once per token and chunk
+        break_positions = self._break_positions(np.asarray(tokens))
+
         i = 0
         while i < len(tokens):
             # Get chunk tokens
             chunk_end = min(i + self.max_tokens, len(tokens))
-            chunk_tokens = tokens[i:chunk_end]
+            chunk_length = chunk_end - i
             
-            # Find better break point if possible
-            if chunk_end < len(tokens) and len(chunk_tokens) > self.overlap_tokens:
-                # Look for sentence endings within the last portion of the chunk
-                break_chars = {'.', '?', '!', '\n'}
-                search_range = range(len(chunk_tokens)-self.overlap_tokens, len(chunk_tokens))
-                
-                for j in reversed(search_range):
-                    if self.tokenizer.decode([chunk_tokens[j]]).strip() in break_chars:
-                        chunk_tokens = chunk_tokens[:j + 1]
-                        break
+            # Find better break point if possible: the last sentence ending
+            # within the final overlap_tokens of the chunk
+            if chunk_end < len(tokens) and chunk_length > self.overlap_tokens:
+                k = np.searchsorted(break_positions, chunk_end) - 1
+                if k >= 0 and break_positions[k] >= chunk_end - self.overlap_tokens:
+                    chunk_length = int(break_positions[k]) + 1 - i
             
             # Decode chunk tokens back to text and clean it
-            chunk_text = self.tokenizer.decode(chunk_tokens).strip()
+            chunk_text = self.tokenizer.decode(tokens[i:i + chunk_length]).strip()
             
             if chunk_text:  # Only add non-empty chunks
                 chunk_info = {
                     "text": chunk_text,
-                    "token_count": len(chunk_tokens),
+                    "token_count": chunk_length,
                     "start_pos": i,
-                    "end_pos": i + len(chunk_tokens)
+                    "end_pos": i + chunk_length
                 }
                 chunks.append(chunk_info)
             
             # Move forward, accounting for overlap
-            i += max(1, len(chunk_tokens) - self.overlap_tokens)
+            i += max(1, chunk_length - self.overlap_tokens)
             
         return chunks
 
     async def initialize(self):
         """Initialize or get the collection"""
         try:
-            if not self.client:
-                self.client = chromadb.HttpClient(
-                    host=settings.CHROMADB_HOST,
-                    port=settings.CHROMADB_PORT,
-                )
-
-                print("ChromaDB client initialized")
-            self.collection = self.client.get_or_create_collection(
+            self.collection = await get_vector_store().collection(
                 name=self.collection_name,
                 metadata={"hnsw:space": "cosine"}
             )
@@ -86,93 +113,414 @@ class KnowledgeMemory:
             raise Exception(f"Failed to initialize collection: {str(e)}")
 
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using OpenAI API"""
+        """Generate embeddings through the shared, cached embedding batcher"""
         try:
-            response = await self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts
-            )
-            return [item.embedding for item in response.data]
+            return await get_embedding_batcher().embed(texts)
         except Exception as e:
             raise Exception(f"Failed to generate embeddings: {str(e)}")
 
-    async def load_knowledge_base(self, knowledge_data: List[Dict[str, Any]]):
-        """Load knowledge from JSON data into ChromaDB with text chunking"""
+    def content_hash(self, entry: Dict[str, Any]) -> str:
+        """Hash everything that determines an entry's chunks: text, metadata and chunker settings"""
+        payload = json.dumps({
+            "text": entry["text"],
+            "metadata": self._validate_metadata(entry.get("metadata", {})),
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def build_chunk_records(self, entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Split one knowledge entry into chunk records ready for the collection"""
+        text_chunks = self._chunk_text(entry["text"])
+        entry_hash = self.content_hash(entry)
+        records = []
+        for chunk_idx, chunk_info in enumerate(text_chunks):
+            # Validate and update metadata
+            chunk_metadata = self._validate_metadata(entry.get("metadata", {}).copy())
+            chunk_metadata.update({
+                "content_hash": entry_hash,
+                "chunk_index": chunk_idx,
+                "total_chunks": len(text_chunks),
+                "original_id": entry["id"],
+                "token_count": chunk_info["token_count"],
+                "start_pos": chunk_info["start_pos"],
+                "end_pos": chunk_info["end_pos"]
+            })
+            records.append({
+                "id": f"{entry['id']}_chunk_{chunk_idx}",
+                "document": chunk_info["text"],
+                "metadata": chunk_metadata
+            })
+        return records
+
+    async def load_knowledge_base(
+        self,
+        knowledge_data: Union[Iterable[Dict[str, Any]], str],
+        checkpoint_path: Optional[str] = None,
+        chunk_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Stream knowledge entries (an iterable or a JSONL path) into ChromaDB.
+
+        Returns the ingest throughput stats.
+        """
         try:
             if not self.collection:
                 await self.initialize()
+            await self._start_lexical_index()
 
-            documents = []
-            metadatas = []
-            ids = []
-            
-            for entry in knowledge_data:
-                # Split text into chunks with metadata
-                text_chunks = self._chunk_text(entry["text"])
-                
-                # Create document entries for each chunk
-                for chunk_idx, chunk_info in enumerate(text_chunks):
-                    chunk_id = f"{entry['id']}_chunk_{chunk_idx}"
-                    documents.append(chunk_info["text"])
-                    
-                    # Validate and update metadata
-                    chunk_metadata = self._validate_metadata(entry["metadata"].copy())
-                    chunk_metadata.update({
-                        "chunk_index": chunk_idx,
-                        "total_chunks": len(text_chunks),
-                        "original_id": entry["id"],
-                        "token_count": chunk_info["token_count"],
-                        "start_pos": chunk_info["start_pos"],
-                        "end_pos": chunk_info["end_pos"]
-                    })
-                    metadatas.append(chunk_metadata)
-                    ids.append(chunk_id)
-
-            # Add to ChromaDB if there are documents
-            print(f"Adding {len(documents)} chunks to collection '{self.collection_name}'")
-            if documents:
-                print(f"Generating embeddings for {len(documents)} chunks...")
-                embeddings = await self.generate_embeddings(documents)
-                print(f"Adding documents with embeddings to collection '{self.collection_name}'")
-                self.collection.add(
-                    embeddings=embeddings,
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+            pipeline = KnowledgeIngestPipeline(
+                self,
+                page_size=settings.KNOWLEDGE_INGEST_PAGE_SIZE,
+                page_tokens=settings.KNOWLEDGE_INGEST_PAGE_TOKENS,
+                max_concurrency=settings.KNOWLEDGE_INGEST_CONCURRENCY,
+                chunk_workers=settings.KNOWLEDGE_INGEST_WORKERS if chunk_workers is None else chunk_workers,
+                checkpoint_path=checkpoint_path
+            )
+            stats = await pipeline.run(knowledge_data)
+            await self._content_changed()
+            return stats
         except Exception as e:
-            print("Failed to add to collection:", e)
+            logger.error(f"Failed to load knowledge base into '{self.collection_name}': {str(e)}")
+            raise Exception(f"Failed to load knowledge base: {str(e)}")
 
-    async def query_knowledge(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Query the knowledge base using semantic search"""
-        if not self.collection:
-            await self.initialize()
+    async def _stored_entries(self, page_size: int) -> Dict[str, Dict[str, Any]]:
+        """Map each stored original_id to its content hash and chunk ids by chunk index"""
+        stored: Dict[str, Dict[str, Any]] = {}
+        offset = 0
+        while True:
+            page = await self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                original_id = (metadata or {}).get("original_id")
+                if original_id is None:
+                    continue
+                state = stored.setdefault(original_id, {
+                    "hash": metadata.get("content_hash"),
+                    "total_chunks": metadata.get("total_chunks"),
+                    "chunks": {}
+                })
+                # Chunks from different versions of the entry mean a half-finished write
+                if state["hash"] != metadata.get("content_hash"):
+                    state["hash"] = None
+                state["chunks"][chunk_id] = metadata.get("chunk_index", 0)
+            if len(page["ids"]) < page_size:
+                return stored
+            offset += page_size
 
-        # Generate embedding for query
-        query_embedding = await self.generate_embeddings([query])
+    async def sync_knowledge_base(
+        self,
+        knowledge_data: Union[Iterable[Dict[str, Any]], str],
+        chunk_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Incrementally sync the collection with knowledge entries (an iterable or a JSONL path).
+
+        Entries whose content hash matches the stored chunks are skipped, changed
+        entries are re-chunked and re-embedded, and chunks of entries that shrank
+        or disappeared are deleted. Returns the ingest stats plus sync counts.
+        """
+        try:
+            if not self.collection:
+                await self.initialize()
+
+            await self._start_lexical_index()
+            page_size = settings.KNOWLEDGE_INGEST_PAGE_SIZE
+            stored = await self._stored_entries(page_size)
+            seen = set()
+            changed = set()
+            unchanged = 0
+
+            def changed_entries():
+                nonlocal unchanged
+                source = read_jsonl(knowledge_data) if isinstance(knowledge_data, str) else knowledge_data
+                for entry in source:
+                    seen.add(entry["id"])
+                    state = stored.get(entry["id"])
+                    if (
+                        state is not None
+                        and state["hash"] == self.content_hash(entry)
+                        and sorted(state["chunks"].values()) == list(range(state["total_chunks"] or 0))
+                    ):
+                        unchanged += 1
+                        continue
+                    changed.add(entry["id"])
+                    yield entry
+
+            new_totals: Dict[str, int] = {}
+
+            def track_totals(records: List[Dict[str, Any]]) -> None:
+                if records:
+                    new_totals[records[0]["metadata"]["original_id"]] = len(records)
+
+            pipeline = KnowledgeIngestPipeline(
+                self,
+                page_size=page_size,
+                page_tokens=settings.KNOWLEDGE_INGEST_PAGE_TOKENS,
+                max_concurrency=settings.KNOWLEDGE_INGEST_CONCURRENCY,
+                chunk_workers=settings.KNOWLEDGE_INGEST_WORKERS if chunk_workers is None else chunk_workers,
+                on_entry=track_totals
+            )
+            stats = await pipeline.run(changed_entries())
+
+            # Chunks past the new end of a changed entry, and all chunks of removed entries
+            orphans = []
+            for original_id, state in stored.items():
+                if original_id not in seen:
+                    orphans.extend(state["chunks"])
+                elif original_id in changed:
+                    total = new_totals.get(original_id, 0)
+                    orphans.extend(chunk_id for chunk_id, index in state["chunks"].items() if index >= total)
+            for i in range(0, len(orphans), page_size):
+                await self.collection.delete(ids=orphans[i:i + page_size])
+            self.unindex_chunks(orphans)
+            await self._content_changed()
+
+            stats.update({
+                "unchanged_entries": unchanged,
+                "changed_entries": len(changed),
+                "removed_entries": len(set(stored) - seen),
+                "deleted_chunks": len(orphans)
+            })
+            logger.info(f"Synced knowledge base '{self.collection_name}': {stats}")
+            return stats
+        except Exception as e:
+            logger.error(f"Failed to sync knowledge base '{self.collection_name}': {str(e)}")
+            raise Exception(f"Failed to sync knowledge base: {str(e)}")
+
+    def _version_key(self) -> str:
+        return f"knowledge_version:{self.collection_name}"
+
+    async def _content_version(self) -> Tuple[int, Optional[int]]:
+        """Chunk count and the shared knowledge version, bumped by every load or sync"""
+        count = await self.collection.count()
+        try:
+            version = await get_redis_store().get(self._version_key())
+        except Exception as e:
+            logger.error(f"Failed to read knowledge version of '{self.collection_name}': {str(e)}")
+            version = None
+        return count, version
+
+    async def _content_changed(self) -> None:
+        """Tell every process that this collection's chunks changed"""
+        try:
+            await get_redis_store().redis.incr(self._version_key())
+        except Exception as e:
+            logger.error(f"Failed to bump knowledge version of '{self.collection_name}': {str(e)}")
+        # This process indexed its own writes already
+        if self.lexical_index.ready:
+            self.lexical_index.version = await self._content_version()
+            self._lexical_checked_at = time.monotonic()
+
+    def _check_lexical_index(self) -> bool:
+        """Build or check the BM25 side index in the background; True once it can be searched.
+
+        Loads and syncs may run in other processes, so every
+        KNOWLEDGE_LEXICAL_CHECK_INTERVAL seconds a background task compares
+        the chunk count and knowledge version with those the index was built
+        from, and rebuilds it if they differ. Searches keep using the old
+        index meanwhile, and use dense hits alone until the first one is built.
+        """
+        if time.monotonic() - self._lexical_checked_at >= settings.KNOWLEDGE_LEXICAL_CHECK_INTERVAL:
+            if self._lexical_task is None or self._lexical_task.done():
+                self._lexical_checked_at = time.monotonic()
+                self._lexical_task = asyncio.ensure_future(self._refresh_lexical_index())
+                self._lexical_task.add_done_callback(self._lexical_refreshed)
+        return self.lexical_index.ready
+
+    def _lexical_refreshed(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to build lexical index for '{self.collection_name}': {str(task.exception())}")
+
+    async def _refresh_lexical_index(self) -> None:
+        """Build the lexical index, or rebuild it if the collection has changed"""
+        version = await self._content_version()
+        if self.lexical_index.ready and version == self.lexical_index.version:
+            return
 
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=n_results,
+        index = LexicalIndex()
+        page_size = settings.KNOWLEDGE_INGEST_PAGE_SIZE
+        offset = 0
+        while True:
+            page = await self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            index.add_many(page["ids"], page["documents"])
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        index.ready = True
+        index.version = version
+        self.lexical_index = index
+        logger.info(f"Built lexical index for '{self.collection_name}' with {len(index)} chunks")
+
+    async def _start_lexical_index(self) -> None:
+        """Let an empty collection's lexical index be built as chunks are loaded"""
+        if not self.lexical_index.ready and await self.collection.count() == 0:
+            self.lexical_index.ready = True
+
+    def index_chunks(self, ids: List[str], documents: List[str]) -> None:
+        """Keep a built lexical index in step with stored chunks"""
+        if self.lexical_index.ready:
+            self.lexical_index.add_many(ids, documents)
+
+    def unindex_chunks(self, ids: List[str]) -> None:
+        if self.lexical_index.ready:
+            for chunk_id in ids:
+                self.lexical_index.remove(chunk_id)
+
+    async def _stored_hits(self, ids: List[str], query_embedding: List[float]) -> Dict[str, Dict[str, Any]]:
+        """Read hits found only lexically from the collection, with their cosine similarity.
+
+        Chunks deleted since the lexical index was built are left out.
+        """
+        if not ids:
+            return {}
+        stored = await self.collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        if not len(stored["ids"]):
+            return {}
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+        norms = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+        scores = (vectors @ query / norms).tolist()
+        return {
+            chunk_id: {"content": document, "metadata": metadata, "relevance_score": score, "lexical_score": 0.0}
+            for chunk_id, document, metadata, score in zip(stored["ids"], stored["documents"], stored["metadatas"], scores)
+        }
+
+    async def _retrieve(
+        self,
+        query: str,
+        query_embedding: List[float],
+        fetch: int
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, float]], bool]:
+        """Fetch dense and lexical hits and fuse them.
+
+        Returns the hits by chunk id, the fused (chunk id, score) ranking and
+        whether the collection has no further dense hits to offer.
+        """
+        results = await self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=fetch,
             include=["documents", "metadatas", "distances"]
         )
 
-        # Format and merge results
-        formatted_results = []
-        seen_original_ids = set()
-        
-        for i in range(len(results["documents"][0])):
-            original_id = results["metadatas"][0][i]["original_id"]
-            
-            if original_id not in seen_original_ids:
-                seen_original_ids.add(original_id)
-                formatted_results.append({
-                    "content": results["documents"][0][i],
-                    "metadata": {
-                        k: v for k, v in results["metadatas"][0][i].items() 
-                        if k not in ["chunk_index", "total_chunks", "original_id"]
-                    },
-                    "relevance_score": 1 - results["distances"][0][i]
-                })
+        hits: Dict[str, Dict[str, Any]] = {}
+        for chunk_id, document, metadata, distance in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+        ):
+            hits[chunk_id] = {
+                "content": document,
+                "metadata": metadata,
+                "relevance_score": 1 - distance,
+                "lexical_score": 0.0
+            }
+        dense_ranking = list(hits)
+
+        lexical_ranking = []
+        if settings.KNOWLEDGE_HYBRID_SEARCH and self._check_lexical_index():
+            lexical_hits = self.lexical_index.search(query, fetch)
+            stored = await self._stored_hits(
+                [chunk_id for chunk_id, _, _ in lexical_hits if chunk_id not in hits],
+                query_embedding
+            )
+            for chunk_id, _, coverage in lexical_hits:
+                if chunk_id not in hits:
+                    if chunk_id not in stored:
+                        # Deleted by another process since the index was built
+                        self.lexical_index.remove(chunk_id)
+                        continue
+                    hits[chunk_id] = stored[chunk_id]
+                lexical_ranking.append(chunk_id)
+                hits[chunk_id]["lexical_score"] = coverage
+
+        fused = reciprocal_rank_fusion([dense_ranking, lexical_ranking], k=settings.KNOWLEDGE_RRF_K)
+        return hits, fused, len(dense_ranking) < fetch
+
+    @staticmethod
+    def _join_overlapping(left: str, right: str, max_overlap: int) -> str:
+        """Append right to left, dropping the text the two chunks share"""
+        for size in range(min(len(left), len(right), max_overlap), 0, -1):
+            if left.endswith(right[:size]):
+                return left + right[size:]
+        return f"{left} {right}"
+
+    def _merge_passage(self, chunks: List[Dict[str, Any]], max_tokens: int) -> Dict[str, Any]:
+        """Grow a passage around the best chunk with touching chunks of the same entry.
+
+        ``chunks`` are hits of one entry in rank order. Neighbours whose token
+        span touches the passage are added, best ranked first, while the whole
+        span stays within ``max_tokens``.
+        """
+        passage = [chunks[0]]
+        start, end = chunks[0]["metadata"]["start_pos"], chunks[0]["metadata"]["end_pos"]
+        remaining = chunks[1:]
+        grown = True
+        while grown:
+            grown = False
+            for chunk in remaining:
+                chunk_start, chunk_end = chunk["metadata"]["start_pos"], chunk["metadata"]["end_pos"]
+                touches = chunk_start <= end and chunk_end >= start
+                if touches and max(end, chunk_end) - min(start, chunk_start) <= max_tokens:
+                    passage.append(chunk)
+                    remaining.remove(chunk)
+                    start, end = min(start, chunk_start), max(end, chunk_end)
+                    grown = True
+                    break
+
+        passage.sort(key=lambda chunk: chunk["metadata"]["start_pos"])
+        content = passage[0]["content"]
+        # Overlapping text is found by string match; a few characters per token is plenty
+        max_overlap = self.overlap_tokens * 16
+        for chunk in passage[1:]:
+            content = self._join_overlapping(content, chunk["content"], max_overlap)
+
+        best = chunks[0]
+        metadata = {
+            k: v for k, v in best["metadata"].items()
+            if k not in ["chunk_index", "total_chunks", "original_id", "content_hash"]
+        }
+        metadata.update({"start_pos": start, "end_pos": end, "token_count": end - start})
+        return {
+            "content": content,
+            "metadata": metadata,
+            "relevance_score": max(chunk["relevance_score"] for chunk in passage),
+            "lexical_score": max(chunk["lexical_score"] for chunk in passage),
+            "fusion_score": best["fusion_score"]
+        }
+
+    async def query_knowledge(
+        self,
+        query: str,
+        n_results: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return up to n_results passages from distinct entries, reusing query_embedding when given.
+
+        Dense hits and BM25 hits are fused with reciprocal rank fusion, and
+        fetching widens until n_results distinct entries are found. Touching
+        chunks of one entry are merged into a passage of at most
+        KNOWLEDGE_PASSAGE_MAX_TOKENS tokens. Each result has the cosine
+        ``relevance_score``, the ``lexical_score`` (the IDF-weighted share of
+        query terms found) and the ``fusion_score`` it was ranked by.
+        """
+        if not self.collection:
+            await self.initialize()
+
+        # Generate embedding for query
+        if query_embedding is None:
+            query_embedding = (await self.generate_embeddings([query]))[0]
+
+        fetch = n_results * settings.KNOWLEDGE_FETCH_FACTOR
+        while True:
+            hits, fused, exhausted = await self._retrieve(query, query_embedding, fetch)
+            # Hits grouped by entry, entries and hits in fused order
+            entries: Dict[str, List[Dict[str, Any]]] = {}
+            for chunk_id, fusion_score in fused:
+                hit = hits[chunk_id]
+                hit.update({"id": chunk_id, "fusion_score": fusion_score})
+                entries.setdefault(hit["metadata"]["original_id"], []).append(hit)
+            if len(entries) >= n_results or exhausted or fetch >= settings.KNOWLEDGE_MAX_FETCH:
+                break
+            fetch = min(fetch * 2, settings.KNOWLEDGE_MAX_FETCH)
 
-        return formatted_results
+        return [
+            self._merge_passage(chunks, settings.KNOWLEDGE_PASSAGE_MAX_TOKENS)
+            for chunks in list(entries.values())[:n_results]
+        ]
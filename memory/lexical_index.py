@@ -0,0 +1,138 @@
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from collections import Counter, defaultdict
+import math
+import re
+import unicodedata
+
+# Words, plus codes such as "SKU-12.5" kept whole next to their parts
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_./]\w+)*")
+
+# Question words left out of queries; they rarely occur in the knowledge base,
+# so their high IDF would otherwise swamp the coverage of the real terms
+STOP_WORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "how", "i", "in", "is", "it", "me",
+    "of", "on", "or", "tell", "the", "to", "was", "what", "when", "where", "which", "who",
+    "why", "with", "you", "about",
+    "bạn", "các", "cho", "có", "của", "gì", "không", "là", "mà", "một", "này", "những",
+    "thì", "tôi", "trong", "và", "với", "được", "ở", "nào", "sao"
+}
+
+def _fold_accents(token: str) -> str:
+    """Strip diacritics so "phở" also matches "pho" (and "đ" matches "d")"""
+    decomposed = unicodedata.normalize("NFD", token.replace("đ", "d"))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def token_groups(text: str) -> List[Set[str]]:
+    """Lower-cased tokens of a text, each with its accent-folded and split variants"""
+    groups = []
+    for match in TOKEN_PATTERN.finditer(unicodedata.normalize("NFC", text).casefold()):
+        token = match.group()
+        variants = {token}
+        if not token.isalnum():
+            variants.update(re.findall(r"\w+", token))
+        variants.update([_fold_accents(variant) for variant in variants])
+        groups.append(variants)
+    return groups
+
+def tokenize(text: str) -> List[str]:
+    return [term for group in token_groups(text) for term in group]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by summing 1 / (k + rank) per list, best first"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    # Ties go to the smaller id, so equal scores rank the same in every process
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over knowledge chunks.
+
+    The index holds terms only; hits are read back from the collection, so a
+    chunk is never served from a stale copy.
+
+    Besides the BM25 score, ``search`` reports coverage: the IDF-weighted share
+    of the query's terms found in the chunk. A coverage near 1 means every
+    distinctive term, such as a product code or a name, matched exactly.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ready = False
+        # What the index was built from, see KnowledgeMemory._content_version
+        self.version: Optional[Tuple[int, Optional[int]]] = None
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self._lengths:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, count in counts.items():
+            self._postings[term][doc_id] = count
+        length = sum(counts.values())
+        self._lengths[doc_id] = length
+        self._terms[doc_id] = list(counts)
+        self._total_length += length
+
+    def add_many(self, ids: Sequence[str], texts: Sequence[str]) -> None:
+        for doc_id, text in zip(ids, texts):
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str) -> None:
+        if doc_id not in self._lengths:
+            return
+        for term in self._terms.pop(doc_id):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._lengths) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float, float]]:
+        """Return (doc_id, bm25 score, coverage) for the best matching chunks"""
+        if not self._lengths:
+            return []
+        # A query token is weighted by its rarest variant; a chunk earns the
+        # weight of the rarest variant it contains
+        groups = {frozenset(group) for group in token_groups(query)}
+        groups = {group for group in groups if not group & STOP_WORDS} or groups
+        # Sorted, so scores are summed in the same order in every process
+        groups = sorted(groups, key=sorted)
+        terms = sorted(set().union(*groups)) if groups else []
+        idfs = {term: self._idf(term) for term in terms}
+        group_idfs = {group: max(idfs[term] for term in group) for group in groups}
+        total_idf = sum(group_idfs.values())
+        avg_length = self._total_length / len(self._lengths)
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in terms:
+            for doc_id, tf in self._postings.get(term, {}).items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                scores[doc_id] += idfs[term] * tf * (self.k1 + 1) / (tf + norm)
+
+        matched_idf: Dict[str, float] = defaultdict(float)
+        for group in groups:
+            best_variant: Dict[str, float] = {}
+            for term in group:
+                for doc_id in self._postings.get(term, {}):
+                    best_variant[doc_id] = max(best_variant.get(doc_id, 0.0), idfs[term])
+            for doc_id, idf in best_variant.items():
+                matched_idf[doc_id] += idf
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            (doc_id, score, matched_idf[doc_id] / total_idf if total_idf else 0.0)
+            for doc_id, score in best
+        ]
@@ -0,0 +1,473 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from memory.vector_snapshot import read_snapshot, snapshot_exists, write_snapshot
+from utils.cache import BoundedCache
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import weakref
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # without it, large collections fall back to the flat index
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+def matches_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma ``where`` filter against one metadata dict"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > operand:
+                        return False
+                    if op == "$gte" and not value >= operand:
+                        return False
+                    if op == "$lt" and not value < operand:
+                        return False
+                    if op == "$lte" and not value <= operand:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class LocalCollection:
+    """In-process vector collection with the async API of ``AsyncCollection``.
+
+    Vectors live in one float32 matrix searched exactly with NumPy. Once a
+    collection holds ``hnsw_threshold`` vectors and hnswlib is installed,
+    unfiltered queries go through an HNSW index built on first use. Filtered
+    queries always scan the matching rows exactly. With a ``path`` the
+    collection is saved as a float32 matrix file plus a JSON sidecar, and it
+    is memory-mapped on load (see ``memory.vector_snapshot``). Saves during
+    writes copy the rows on the event loop and write the copy in the default
+    executor.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        path: Optional[str] = None,
+        hnsw_threshold: int = 10000,
+        save_interval: Optional[float] = 30.0
+    ):
+        self.name = name
+        self.metadata = metadata or {}
+        self.space = self.metadata.get("hnsw:space", "l2")
+        self.path = path
+        self.hnsw_threshold = hnsw_threshold
+        self.save_interval = save_interval
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._generation = 0
+        self._hnsw = None
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._save_task: Optional[asyncio.Future] = None
+        # Snapshot files are written by one thread at a time, newest copy last
+        self._file_lock = threading.Lock()
+        self._copies = 0
+        self._copy_written = 0
+        if path and snapshot_exists(path):
+            self._load()
+
+    # Storage
+
+    def _load(self) -> None:
+        snapshot = read_snapshot(self.path)
+        self.metadata = snapshot["metadata"] or self.metadata
+        self.space = snapshot["space"]
+        self._generation = snapshot["generation"]
+        self._ids = snapshot["ids"]
+        self._documents = snapshot["documents"]
+        self._metadatas = snapshot["metadatas"]
+        self._size = len(self._ids)
+        self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+        self._alive = np.ones(self._size, dtype=bool)
+        # Memory-mapped; the matrix is only copied into memory on the first write
+        self._vectors = snapshot["vectors"]
+
+    def _ensure_capacity(self, dim: int, extra: int) -> None:
+        if self._vectors is not None and self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match collection dimensionality {self._vectors.shape[1]}")
+
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        needed = self._size + extra
+        if needed <= capacity and not isinstance(self._vectors, np.memmap):
+            return
+
+        new_capacity = max(needed, capacity * 2, 64)
+        vectors = np.zeros((new_capacity, dim), dtype=np.float32)
+        alive = np.zeros(new_capacity, dtype=bool)
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._vectors = vectors
+        self._alive = alive
+
+    def _prepare(self, embeddings: Any) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    def _compact(self) -> None:
+        """Drop deleted rows so row numbers are dense again"""
+        if self._size == 0 or self._alive[:self._size].all():
+            return
+        rows = np.flatnonzero(self._alive[:self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[rows])
+        self._ids = [self._ids[row] for row in rows]
+        self._documents = [self._documents[row] for row in rows]
+        self._metadatas = [self._metadatas[row] for row in rows]
+        self._size = len(rows)
+        self._alive = np.ones(self._size, dtype=bool)
+        self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+        self._hnsw = None
+
+    def _copy(self) -> Optional[Tuple[int, Tuple[Any, ...]]]:
+        """Copy the rows to save, or None if nothing changed since the last save"""
+        if not self.path or not self._dirty:
+            return None
+        self._compact()
+        vectors = np.array(self._vectors[:self._size]) if self._vectors is not None else None
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._copies += 1
+        return self._copies, (
+            vectors,
+            list(self._ids),
+            list(self._documents),
+            list(self._metadatas),
+            self.space,
+            dict(self.metadata)
+        )
+
+    def _write_copy(self, number: int, rows: Tuple[Any, ...]) -> None:
+        with self._file_lock:
+            if number <= self._copy_written:
+                return
+            self._generation = write_snapshot(self.path, self._generation, *rows)
+            self._copy_written = number
+
+    def save(self) -> None:
+        """Write the collection to ``path`` if it changed since the last save.
+
+        Blocks the caller; on the event loop use ``persist`` instead.
+        """
+        copy = self._copy()
+        if copy is not None:
+            self._write_copy(*copy)
+
+    async def persist(self) -> None:
+        """Like ``save``, but the copied rows are written in the default executor"""
+        copy = self._copy()
+        if copy is not None:
+            await self._write_in_executor(*copy)
+
+    async def _write_in_executor(self, number: int, rows: Tuple[Any, ...]) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_copy, number, rows)
+        except Exception:
+            self._dirty = True
+            raise
+
+    def _written(self) -> None:
+        self._dirty = True
+        if not self.path or self.save_interval is None or time.monotonic() - self._last_save <= self.save_interval:
+            return
+        if self._save_task is None or self._save_task.done():
+            # Copied now, so the snapshot holds exactly the writes made so far
+            self._save_task = asyncio.ensure_future(self._write_in_executor(*self._copy()))
+            self._save_task.add_done_callback(self._saved)
+
+    def _saved(self, task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to save local collection '{self.name}': {str(task.exception())}")
+
+    # Writes
+
+    def _write(
+        self,
+        ids: Sequence[str],
+        embeddings: Any,
+        documents: Optional[Sequence[Optional[str]]],
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]],
+        replace: bool
+    ) -> None:
+        if embeddings is None:
+            raise ValueError("Local collections need precomputed embeddings")
+        vectors = self._prepare(embeddings)
+        if len(vectors) != len(ids):
+            raise ValueError("Number of embeddings does not match number of ids")
+        self._ensure_capacity(vectors.shape[1], len(ids))
+
+        new_rows = []
+        for i, id_ in enumerate(ids):
+            row = self._rows.get(id_)
+            if row is not None and not replace:
+                # Chroma ignores adds of existing ids
+                continue
+            if row is None:
+                row = self._size
+                self._size += 1
+                self._ids.append(id_)
+                self._documents.append(None)
+                self._metadatas.append(None)
+                self._rows[id_] = row
+                self._alive[row] = True
+            self._vectors[row] = vectors[i]
+            self._documents[row] = documents[i] if documents is not None else self._documents[row]
+            self._metadatas[row] = metadatas[i] if metadatas is not None else self._metadatas[row]
+            new_rows.append(row)
+
+        if self._hnsw is not None and new_rows:
+            self._fit_hnsw()
+            self._hnsw.add_items(self._vectors[new_rows], new_rows)
+        self._written()
+
+    async def add(self, ids, embeddings=None, documents=None, metadatas=None, **kwargs: Any) -> None:
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    async def upsert(self, ids, embeddings=None, documents=None, metadatas=None, **kwargs: Any) -> None:
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    async def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        rows = self._select(ids, where)
+        for row in rows:
+            del self._rows[self._ids[row]]
+            self._alive[row] = False
+            if self._hnsw is not None:
+                self._hnsw.mark_deleted(int(row))
+        if rows:
+            if len(self._rows) < self._size // 2:
+                self._compact()
+            self._written()
+
+    # Reads
+
+    def _select(self, ids: Optional[Sequence[str]], where: Optional[Dict[str, Any]]) -> List[int]:
+        """Live rows in insertion order, restricted to ids and the where filter"""
+        if ids is not None:
+            rows = sorted(self._rows[id_] for id_ in ids if id_ in self._rows)
+        else:
+            rows = np.flatnonzero(self._alive[:self._size]).tolist()
+        if where:
+            rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+        return rows
+
+    def _distances(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        vectors = self._vectors[rows]
+        if self.space == "l2":
+            diff = vectors - query
+            return np.einsum("ij,ij->i", diff, diff)
+        return 1.0 - vectors @ query
+
+    def _use_hnsw(self) -> bool:
+        if hnswlib is None or len(self._rows) < self.hnsw_threshold:
+            return False
+        if self._hnsw is None:
+            self._compact()
+            index = hnswlib.Index(space=self.space, dim=self._vectors.shape[1])
+            index.init_index(max_elements=self._vectors.shape[0], ef_construction=200, M=16, allow_replace_deleted=False)
+            index.add_items(self._vectors[:self._size], np.arange(self._size))
+            self._hnsw = index
+            logger.info(f"Built HNSW index for local collection '{self.name}' with {self._size} vectors")
+        self._fit_hnsw()
+        return True
+
+    def _fit_hnsw(self) -> None:
+        if self._hnsw.get_max_elements() < self._vectors.shape[0]:
+            self._hnsw.resize_index(self._vectors.shape[0])
+
+    def _result(self, rows: Sequence[int], include: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "ids": [self._ids[row] for row in rows],
+            "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+            "embeddings": (
+                np.asarray(self._vectors[list(rows)]) if rows else np.zeros((0, 0), dtype=np.float32)
+            ) if "embeddings" in include else None
+        }
+
+    async def query(
+        self,
+        query_embeddings: Any,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("metadatas", "documents", "distances"),
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        queries = self._prepare(query_embeddings)
+        results: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "embeddings": [], "distances": []}
+
+        candidates = None if not where else np.asarray(self._select(None, where), dtype=np.int64)
+        for query in queries:
+            if self._size == 0:
+                rows, distances = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            elif candidates is None and self._use_hnsw():
+                k = min(n_results, len(self._rows))
+                self._hnsw.set_ef(max(50, 2 * k))
+                labels, distances = self._hnsw.knn_query(query, k=k)
+                rows, distances = labels[0].astype(np.int64), distances[0]
+            else:
+                pool = candidates if candidates is not None else np.flatnonzero(self._alive[:self._size])
+                all_distances = self._distances(pool, query)
+                k = min(n_results, len(pool))
+                if k == 0:
+                    rows, distances = pool[:0], all_distances[:0]
+                else:
+                    top = np.argpartition(all_distances, k - 1)[:k]
+                    top = top[np.argsort(all_distances[top], kind="stable")]
+                    rows, distances = pool[top], all_distances[top]
+
+            result = self._result(rows.tolist(), include)
+            for key in ("ids", "documents", "metadatas", "embeddings"):
+                results[key].append(result[key])
+            results["distances"].append(distances.tolist())
+
+        for key in ("documents", "metadatas", "embeddings", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    async def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = ("metadatas", "documents"),
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        rows = self._select(ids, where)
+        start = offset or 0
+        rows = rows[start:start + limit] if limit is not None else rows[start:]
+        return self._result(rows, include)
+
+    async def count(self) -> int:
+        return len(self._rows)
+
+class LocalVectorStore:
+    """Process-local replacement for ``ChromaClientManager``.
+
+    Collections are kept in memory and, with a ``path``, saved under
+    ``path/<collection name>`` every ``save_interval`` seconds of writes, in
+    the background, and on ``close``, which blocks until they are written.
+    With a ``path`` at most ``max_collections`` collections stay loaded;
+    the least recently used one is saved and dropped, and loaded again from
+    its snapshot in the executor when next asked for. A dropped collection
+    still held by a caller stays the one object for its name.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        hnsw_threshold: int = 10000,
+        save_interval: Optional[float] = 30.0,
+        max_collections: int = 1024
+    ):
+        self.path = path
+        self.hnsw_threshold = hnsw_threshold
+        self.save_interval = save_interval
+        # Without a path a dropped collection would be lost, so none are dropped
+        self._collections: BoundedCache[LocalCollection] = BoundedCache(
+            "local_collections",
+            max_size=max_collections if path else sys.maxsize,
+            on_evict=self._evicted
+        )
+        self._open: "weakref.WeakValueDictionary[str, LocalCollection]" = weakref.WeakValueDictionary()
+
+    def _collection_path(self, name: str) -> Optional[str]:
+        return os.path.join(self.path, name) if self.path else None
+
+    def _new_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> LocalCollection:
+        return LocalCollection(
+            name,
+            metadata=metadata,
+            path=self._collection_path(name),
+            hnsw_threshold=self.hnsw_threshold,
+            save_interval=self.save_interval
+        )
+
+    async def collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> LocalCollection:
+        collection = await self._collections.get(name)
+        if collection is None:
+            collection = self._open.get(name)
+            if collection is None:
+                # Loading parses the snapshot sidecar, so it runs in the executor
+                collection = await asyncio.get_running_loop().run_in_executor(None, self._new_collection, name, metadata)
+                # Another caller may have loaded it meanwhile
+                collection = self._open.setdefault(name, collection)
+            await self._collections.set(name, collection)
+        return collection
+
+    async def _evicted(self, name: str, collection: LocalCollection) -> None:
+        await collection.persist()
+
+    def list_collections(self) -> List[str]:
+        names = set(self._open.keys())
+        if self.path and os.path.isdir(self.path):
+            names.update(
+                entry for entry in os.listdir(self.path)
+                if snapshot_exists(os.path.join(self.path, entry))
+            )
+        return sorted(names)
+
+    def forget_collection(self, name: str) -> None:
+        """Save and drop a loaded collection, releasing its memory map"""
+        self._collections.discard(name)
+        collection = self._open.pop(name, None)
+        if collection is not None:
+            collection.save()
+
+    def delete_collection(self, name: str) -> None:
+        self._collections.discard(name)
+        self._open.pop(name, None)
+        path = self._collection_path(name)
+        if path and os.path.isdir(path):
+            shutil.rmtree(path)
+
+    def persist(self) -> None:
+        for collection in list(self._open.values()):
+            try:
+                collection.save()
+            except Exception as e:
+                logger.error(f"Failed to save local collection '{collection.name}': {str(e)}")
+
+    def close(self) -> None:
+        self.persist()
@@ -1,4 +1,5 @@
 from typing import Any, Optional
+from functools import lru_cache
 import json
 import redis.asyncio as redis
 from config.settings import get_settings
@@ -51,3 +52,8 @@ class RedisStore:
             return bool(await self.redis.delete(key))
         except Exception as e:
             raise Exception(f"Redis delete error: {str(e)}")
+
+@lru_cache()
+def get_redis_store() -> RedisStore:
+    """Redis connection shared by components that only need a few keys"""
+    return RedisStore()
@@ -0,0 +1,364 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from memory.local_vector_store import LocalCollection
+from memory.vector_snapshot import snapshot_exists
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE = "synced_version.json"
+
+def read_synced_version(path: str) -> Optional[Tuple[int, Optional[int]]]:
+    try:
+        with open(os.path.join(path, VERSION_FILE), encoding="utf-8") as f:
+            count, version = json.load(f)
+        return count, version
+    except (OSError, ValueError, TypeError):
+        return None
+
+def write_synced_version(path: str, version: Tuple[int, Optional[int]]) -> None:
+    os.makedirs(path, exist_ok=True)
+    tmp_path = os.path.join(path, f"{VERSION_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(list(version), f)
+    os.replace(tmp_path, os.path.join(path, VERSION_FILE))
+
+class SnapshotCollection:
+    """Remote collection with a memory-mapped local replica for reads.
+
+    Writes go to the remote collection, then to the replica, and bump the
+    collection's shared version. Reads are served by the replica only while
+    it was checked against the remote collection within
+    ``store.max_staleness`` seconds, and by the remote collection otherwise.
+    A check compares the remote count and version with those the replica
+    was synced at, and only a change starts the full sync that catches the
+    replica up with writes made by other processes. While a sync runs,
+    writes are recorded and replayed onto the replica afterwards.
+    """
+
+    def __init__(
+        self,
+        remote: Any,
+        store: "SnapshotStore",
+        replica: Optional[LocalCollection] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.remote = remote
+        self.store = store
+        self.replica = replica
+        self.metadata = metadata
+        self.synced_at: Optional[float] = None
+        # Remote (count, version) the replica matches
+        self.synced_version: Optional[Tuple[int, Optional[int]]] = None
+        self._recording: Optional[List[Tuple[str, Dict[str, Any]]]] = None
+
+    @property
+    def name(self) -> str:
+        return self.remote.name
+
+    def _reader(self) -> Any:
+        if (
+            self.replica is not None
+            and self.synced_at is not None
+            and time.monotonic() - self.synced_at <= self.store.max_staleness
+        ):
+            return self.replica
+        return self.remote
+
+    def needs_sync(self) -> bool:
+        # Checked again halfway, so a hot replica never goes stale
+        return self.synced_at is None or time.monotonic() - self.synced_at > self.store.max_staleness / 2
+
+    async def _write(self, op: str, kwargs: Dict[str, Any]) -> None:
+        await getattr(self.remote, op)(**kwargs)
+        if self._recording is not None:
+            self._recording.append((op, kwargs))
+        if self.replica is None:
+            await self.store.bump_version(self.name)
+            return
+
+        await getattr(self.replica, op)(**kwargs)
+        version = await self.store.bump_version(self.name)
+        # Nothing else was written since the replica matched, so it still does
+        if (
+            version is not None
+            and self._recording is None
+            and self.synced_version is not None
+            and (self.synced_version[1] or 0) + 1 == version
+        ):
+            self.synced_version = (await self.replica.count(), version)
+
+    async def add(self, **kwargs: Any) -> None:
+        await self._write("add", kwargs)
+
+    async def upsert(self, **kwargs: Any) -> None:
+        await self._write("upsert", kwargs)
+
+    async def delete(self, **kwargs: Any) -> None:
+        await self._write("delete", kwargs)
+
+    async def query(self, **kwargs: Any) -> Dict[str, Any]:
+        self.store.touch(self)
+        return await self._reader().query(**kwargs)
+
+    async def get(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self._reader().get(**kwargs)
+
+    async def count(self) -> int:
+        return await self._reader().count()
+
+    async def refresh(self, page_size: int = 1000) -> None:
+        """Sync the replica only if the remote collection changed since the last sync"""
+        started = time.monotonic()
+        version = await self.store.remote_version(self)
+        # Without shared versions, an upsert in place leaves no trace, so always sync
+        if self.replica is not None and self.store.versions is not None and version == self.synced_version:
+            self.synced_at = started
+            return
+        await self.sync(page_size, version)
+
+    async def sync(self, page_size: int = 1000, version: Optional[Tuple[int, Optional[int]]] = None) -> None:
+        """Create the replica from the remote collection, or catch it up.
+
+        Rows are compared by id and metadata. Rows the replica lacks or
+        whose metadata changed are copied with their embeddings, and rows
+        the remote collection no longer has are deleted.
+        """
+        started = time.monotonic()
+        self._recording = []
+        try:
+            # Read first, so a write during the sync shows up at the next check
+            version = version or await self.store.remote_version(self)
+            replica = self.replica or await self.store.new_replica(self.name, self.metadata)
+            remote_rows: Dict[str, Any] = {}
+            offset = 0
+            while True:
+                page = await self.remote.get(limit=page_size, offset=offset, include=["metadatas"])
+                if not len(page["ids"]):
+                    break
+                remote_rows.update(zip(page["ids"], page["metadatas"]))
+                offset += page_size
+
+            local = await replica.get(include=["metadatas"])
+            local_rows = dict(zip(local["ids"], local["metadatas"]))
+            changed = [
+                id_ for id_, metadata in remote_rows.items()
+                if id_ not in local_rows or local_rows[id_] != metadata
+            ]
+            removed = [id_ for id_ in local_rows if id_ not in remote_rows]
+
+            for start in range(0, len(changed), page_size):
+                page = await self.remote.get(
+                    ids=changed[start:start + page_size],
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                if len(page["ids"]):
+                    await replica.upsert(
+                        ids=page["ids"],
+                        embeddings=page["embeddings"],
+                        documents=page["documents"],
+                        metadatas=page["metadatas"]
+                    )
+            if removed:
+                await replica.delete(ids=removed)
+
+            for op, kwargs in self._recording:
+                await getattr(replica, op)(**kwargs)
+            self.replica = replica
+            self.synced_at = started
+            self.synced_version = version
+            if changed or removed:
+                logger.info(
+                    f"Synced snapshot of '{self.name}': {len(changed)} rows copied, "
+                    f"{len(removed)} removed, {await replica.count()} vectors"
+                )
+            await self.store.save(self.name, replica, version)
+        finally:
+            self._recording = None
+
+class SnapshotStore:
+    """Vector store that keeps snapshots of hot collections of a remote store.
+
+    Collections that are queried become hot. Up to ``max_collections`` hot
+    collections get a local replica, checked against the remote store in
+    the background at least every ``max_staleness`` seconds and saved every
+    ``interval`` seconds as a float32 snapshot (see
+    ``memory.vector_snapshot``) along with the remote count and version it
+    matches. Versions are counters in ``versions``, a ``RedisStore`` shared
+    by all processes; without it every check is a full sync. After a
+    restart, a collection with a snapshot on disk is memory-mapped and
+    served right away if the remote count and version still match, and
+    once it has caught up otherwise. Each name maps to one
+    ``SnapshotCollection`` for the life of the store; going cold only drops
+    its replica.
+    """
+
+    def __init__(
+        self,
+        remote: Any,
+        path: str,
+        interval: float = 300.0,
+        max_collections: int = 256,
+        max_staleness: float = 60.0,
+        versions: Optional[Any] = None
+    ):
+        self.remote = remote
+        self.versions = versions
+        self.path = path
+        self.interval = interval
+        self.max_collections = max_collections
+        self.max_staleness = max_staleness
+        self._collections: Dict[str, SnapshotCollection] = {}
+        self._hot: "OrderedDict[str, SnapshotCollection]" = OrderedDict()
+        self._sync_tasks: Dict[str, asyncio.Task] = {}
+        self._save_tasks: set = set()
+        self._saver: Optional[asyncio.Task] = None
+
+    def _collection_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    async def new_replica(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> LocalCollection:
+        # Saved only by this store, never from the write path. Loading reads
+        # the snapshot sidecar, so it runs in the executor.
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: LocalCollection(name, metadata=metadata, path=self._collection_path(name), save_interval=None)
+        )
+
+    def version_key(self, name: str) -> str:
+        return f"vector_version:{name}"
+
+    async def remote_version(self, collection: SnapshotCollection) -> Tuple[int, Optional[int]]:
+        """Remote row count and shared version of a collection"""
+        count = await collection.remote.count()
+        version = None
+        if self.versions is not None:
+            try:
+                version = await self.versions.get(self.version_key(collection.name))
+            except Exception as e:
+                logger.error(f"Failed to read vector version of '{collection.name}': {str(e)}")
+        return count, version
+
+    async def bump_version(self, name: str) -> Optional[int]:
+        """Tell every process that a collection changed, returning the new version"""
+        if self.versions is None:
+            return None
+        try:
+            return await self.versions.redis.incr(self.version_key(name))
+        except Exception as e:
+            logger.error(f"Failed to bump vector version of '{name}': {str(e)}")
+            return None
+
+    async def collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> SnapshotCollection:
+        if self._saver is None:
+            self._saver = asyncio.ensure_future(self._save_periodically())
+
+        collection = self._collections.get(name)
+        if collection is None:
+            remote = await self.remote.collection(name, metadata)
+            path = self._collection_path(name)
+            replica = await self.new_replica(name, metadata) if snapshot_exists(path) else None
+            collection = self._collections.setdefault(name, SnapshotCollection(remote, self, replica, metadata))
+            if replica is not None and collection.replica is replica:
+                synced_version = await asyncio.get_running_loop().run_in_executor(None, read_synced_version, path)
+                # Unchanged since it was saved, so serve it without waiting for a sync
+                if (
+                    synced_version is not None
+                    and self.versions is not None
+                    and await self.remote_version(collection) == synced_version
+                ):
+                    collection.synced_version = synced_version
+                    collection.synced_at = time.monotonic()
+                self.touch(collection)
+        return collection
+
+    def touch(self, collection: SnapshotCollection) -> None:
+        """Mark a collection hot, syncing its replica and evicting the coldest one"""
+        name = collection.name
+        if name in self._hot:
+            self._hot.move_to_end(name)
+        else:
+            self._hot[name] = collection
+            while len(self._hot) > self.max_collections:
+                _, cold = self._hot.popitem(last=False)
+                self._release(cold)
+
+        if collection.needs_sync() and name not in self._sync_tasks:
+            task = asyncio.ensure_future(collection.refresh())
+            self._sync_tasks[name] = task
+            task.add_done_callback(lambda t, name=name: self._synced(name, t))
+
+    def _synced(self, name: str, task: asyncio.Task) -> None:
+        if self._sync_tasks.get(name) is task:
+            del self._sync_tasks[name]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to sync snapshot of '{name}': {str(task.exception())}")
+            self._hot.pop(name, None)
+
+    def _release(self, collection: SnapshotCollection) -> None:
+        """Stop serving a cold replica and save it in the background"""
+        task = self._sync_tasks.pop(collection.name, None)
+        if task is not None:
+            task.cancel()
+        replica, collection.replica = collection.replica, None
+        version, collection.synced_version = collection.synced_version, None
+        collection.synced_at = None
+        if replica is not None:
+            save = asyncio.ensure_future(self.save(collection.name, replica, version))
+            self._save_tasks.add(save)
+            save.add_done_callback(lambda t, name=collection.name: self._saved(name, t))
+
+    def _saved(self, name: str, task: asyncio.Task) -> None:
+        self._save_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to save snapshot of '{name}': {str(task.exception())}")
+
+    async def save(self, name: str, replica: LocalCollection, version: Optional[Tuple[int, Optional[int]]]) -> None:
+        """Save a replica and the remote version it matched, in the executor"""
+        await replica.persist()
+        if version is not None:
+            await asyncio.get_running_loop().run_in_executor(None, write_synced_version, self._collection_path(name), version)
+
+    async def persist(self) -> None:
+        for collection in list(self._hot.values()):
+            if collection.replica is not None:
+                try:
+                    await self.save(collection.name, collection.replica, collection.synced_version)
+                except Exception as e:
+                    logger.error(f"Failed to save snapshot of '{collection.name}': {str(e)}")
+
+    async def _save_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.persist()
+
+    def forget_collection(self, name: str) -> None:
+        task = self._sync_tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        collection = self._collections.pop(name, None)
+        self._hot.pop(name, None)
+        if collection is not None:
+            collection.replica = None
+            collection.synced_version = None
+        self.remote.forget_collection(name)
+
+    def close(self) -> None:
+        """Save every hot replica, blocking until written, and close the remote store"""
+        if self._saver is not None:
+            self._saver.cancel()
+        for task in self._sync_tasks.values():
+            task.cancel()
+        for collection in list(self._hot.values()):
+            if collection.replica is not None:
+                try:
+                    collection.replica.save()
+                    if collection.synced_version is not None:
+                        write_synced_version(self._collection_path(collection.name), collection.synced_version)
+                except Exception as e:
+                    logger.error(f"Failed to save snapshot of '{collection.name}': {str(e)}")
+        self.remote.close()
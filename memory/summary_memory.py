@@ -0,0 +1,218 @@
+from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from config.settings import get_settings
+from memory.redis_store import RedisStore
+from models.openai_models import OpenAIChat
+from utils.text_utils import count_tokens
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the new turns into the existing summary. Keep names, facts, preferences, "
+    "decisions and open questions; drop small talk. Write in the language of the "
+    "conversation, in at most {max_tokens} tokens."
+)
+
+def summary_key(user_id: str, agent_id: str, session_id: str) -> str:
+    return f"summary:{agent_id}:{user_id}:{session_id}"
+
+def fit_recent_turns(turns: List[Dict[str, Any]], token_budget: int, keep_last: int = 0) -> List[Dict[str, Any]]:
+    """Keep the newest turns whose text fits token_budget, in their original order.
+
+    The last ``keep_last`` turns are kept whatever their size; they are the
+    turns the summary does not cover yet.
+    """
+    kept = []
+    used = 0
+    for index, turn in enumerate(reversed(turns)):
+        tokens = count_tokens(f"User: {turn.get('message', '')}\nAssistant: {turn.get('response', '')}\n")
+        if index >= keep_last and used + tokens > token_budget:
+            break
+        kept.append(turn)
+        used += tokens
+    kept.reverse()
+    return kept
+
+class RedisSummaryStore:
+    """Summary state of each session in Redis.
+
+    The summary is a JSON string under the session key and the turns not
+    yet summarized are a list under ``<key>:pending``. Every change is a
+    single atomic command or script, so processes never overwrite each
+    other's turns.
+    """
+
+    # Folds summarized turns into the summary unless another process folded
+    # first. The head of the list may have lost turns to trimming meanwhile.
+    FOLD_SCRIPT = """
+        local state = redis.call('GET', KEYS[1])
+        local summarized = 0
+        if state then
+            summarized = cjson.decode(state)['summarized_turns'] or 0
+        end
+        if summarized ~= tonumber(ARGV[1]) then
+            return -1
+        end
+        local folded = #ARGV - 3
+        local head = redis.call('LRANGE', KEYS[2], 0, folded - 1)
+        local drop = 0
+        for skip = 0, folded do
+            local match = true
+            for i = 1, folded - skip do
+                if head[i] ~= ARGV[3 + skip + i] then
+                    match = false
+                    break
+                end
+            end
+            if match then
+                drop = folded - skip
+                break
+            end
+        end
+        if drop > 0 then
+            redis.call('LTRIM', KEYS[2], drop, -1)
+        end
+        redis.call('SET', KEYS[1], ARGV[2])
+        if tonumber(ARGV[3]) > 0 then
+            redis.call('EXPIRE', KEYS[1], ARGV[3])
+        end
+        return drop
+    """
+
+    def __init__(self, redis_client: Any, ttl: Optional[int] = None):
+        self.redis = redis_client
+        self.ttl = ttl
+        self._fold = redis_client.register_script(self.FOLD_SCRIPT)
+
+    async def load(self, key: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Return the summary state, or None, and the pending turns"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(key)
+            pipe.lrange(f"{key}:pending", 0, -1)
+            state, pending = await pipe.execute()
+        return (json.loads(state) if state else None), [json.loads(turn) for turn in pending]
+
+    async def append(self, key: str, turn: Dict[str, Any], max_pending: int) -> int:
+        """Add a pending turn, dropping the oldest past max_pending, and return how many are pending"""
+        pending_key = f"{key}:pending"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(pending_key, json.dumps(turn))
+            pipe.ltrim(pending_key, -max_pending, -1)
+            if self.ttl:
+                pipe.expire(pending_key, self.ttl)
+            length = (await pipe.execute())[0]
+        return min(length, max_pending)
+
+    async def fold(self, key: str, summarized_turns: int, turns: List[Dict[str, Any]], state: Dict[str, Any]) -> bool:
+        """Store a new summary of turns, built on the summary of summarized_turns turns.
+
+        Returns False, changing nothing, if another process folded first.
+        """
+        result = await self._fold(
+            keys=[key, f"{key}:pending"],
+            args=[summarized_turns, json.dumps(state), self.ttl or 0] + [json.dumps(turn) for turn in turns]
+        )
+        return int(result) >= 0
+
+class SessionSummaryMemory:
+    """Rolling summary of each (user, session, agent) conversation, kept in Redis.
+
+    Finished turns are appended to the session's pending list. Once
+    ``summarize_every`` turns are pending, a background task folds them into
+    the summary with one LLM call, so summarizing never delays a reply. The
+    summary then stands in for the older raw turns in the prompt. ``store``
+    makes each update atomic (see ``RedisSummaryStore``), so any number of
+    processes can record turns for the same session.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        chat: Optional[OpenAIChat] = None,
+        summarize_every: int = 6,
+        max_tokens: int = 300
+    ):
+        self.store = store
+        self.chat = chat or OpenAIChat()
+        self.summarize_every = summarize_every
+        self.max_tokens = max_tokens
+        # Turns kept while summarizing keeps failing, oldest dropped first
+        self.max_pending = summarize_every * 4
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.summaries = 0
+        self.failures = 0
+
+    async def get(self, user_id: str, agent_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return {"summary", "token_count", "summarized_turns", "pending_turns"} or None if there is no summary yet"""
+        state, pending = await self.store.load(summary_key(user_id, agent_id, session_id))
+        if not state or not state.get("summary"):
+            return None
+        return {
+            "summary": state["summary"],
+            "token_count": state.get("token_count", 0),
+            "summarized_turns": state.get("summarized_turns", 0),
+            "pending_turns": len(pending)
+        }
+
+    async def record_turn(self, user_id: str, agent_id: str, session_id: str, message: str, response: str) -> None:
+        """Add a finished turn, starting a background summary once enough are pending"""
+        key = summary_key(user_id, agent_id, session_id)
+        pending = await self.store.append(key, {"message": message, "response": response}, self.max_pending)
+
+        if pending >= self.summarize_every and key not in self._tasks:
+            task = asyncio.ensure_future(self._summarize(key))
+            self._tasks[key] = task
+            task.add_done_callback(lambda t, key=key: self._tasks.pop(key, None))
+
+    async def _summarize(self, key: str) -> None:
+        try:
+            state, turns = await self.store.load(key)
+            if not turns:
+                return
+            previous = state["summary"] if state else ""
+            summarized_turns = state.get("summarized_turns", 0) if state else 0
+            transcript = "\n".join(f"User: {turn['message']}\nAssistant: {turn['response']}" for turn in turns)
+            summary = await self.chat.generate_response(
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=self.max_tokens)},
+                    {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"}
+                ],
+                temperature=0.2,
+                max_tokens=self.max_tokens
+            )
+
+            summary = summary.strip()
+            # Turns recorded while the summary was generated stay pending
+            folded = await self.store.fold(key, summarized_turns, turns, {
+                "summary": summary,
+                "token_count": count_tokens(summary),
+                "summarized_turns": summarized_turns + len(turns)
+            })
+            if not folded:
+                logger.info(f"Conversation summary {key} was updated by another process first")
+                return
+            self.summaries += 1
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to update conversation summary {key}: {str(e)}")
+
+    async def close(self) -> None:
+        """Wait for summaries that are being generated"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_progress": len(self._tasks), "summaries": self.summaries, "failures": self.failures}
+
+@lru_cache()
+def get_summary_memory() -> SessionSummaryMemory:
+    settings = get_settings()
+    return SessionSummaryMemory(
+        RedisSummaryStore(RedisStore().redis, ttl=settings.SESSION_SUMMARY_TTL),
+        summarize_every=settings.SESSION_SUMMARY_EVERY,
+        max_tokens=settings.SESSION_SUMMARY_MAX_TOKENS
+    )
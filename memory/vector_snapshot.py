@@ -0,0 +1,71 @@
+"""On-disk snapshot format for vector collections.
+
+A snapshot directory holds ``vectors-<generation>.f32``, a raw row-major
+float32 matrix, and ``meta.json``, a sidecar with the generation, matrix file
+name, dimensionality, distance space and the ids, documents and metadatas of
+the rows in matrix order. The sidecar is replaced atomically after its
+matrix file is complete, so readers never see a half-written generation.
+Loading memory-maps the matrix read-only, so no vectors are read into the
+Python heap until they are searched.
+"""
+from typing import Any, Dict, List, Optional
+import json
+import os
+import numpy as np
+
+META_FILE = "meta.json"
+
+def snapshot_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, META_FILE))
+
+def write_snapshot(
+    path: str,
+    generation: int,
+    vectors: Optional[np.ndarray],
+    ids: List[str],
+    documents: List[Optional[str]],
+    metadatas: List[Optional[Dict[str, Any]]],
+    space: str,
+    metadata: Optional[Dict[str, Any]] = None
+) -> int:
+    """Write the next generation of a snapshot and return its number"""
+    os.makedirs(path, exist_ok=True)
+    previous = generation
+    generation += 1
+    vectors_name = f"vectors-{generation}.f32"
+    dim = vectors.shape[1] if vectors is not None and vectors.ndim == 2 else 0
+    if ids:
+        np.ascontiguousarray(vectors[:len(ids)], dtype=np.float32).tofile(os.path.join(path, vectors_name))
+
+    meta = {
+        "generation": generation,
+        "vectors": vectors_name,
+        "dim": dim,
+        "space": space,
+        "metadata": metadata or {},
+        "ids": ids,
+        "documents": documents,
+        "metadatas": metadatas
+    }
+    tmp_path = os.path.join(path, f"{META_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+    old_vectors = os.path.join(path, f"vectors-{previous}.f32")
+    if os.path.exists(old_vectors):
+        os.remove(old_vectors)
+    return generation
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """Load a snapshot's sidecar with its matrix memory-mapped under ``"vectors"``"""
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    rows = len(meta["ids"])
+    meta["vectors"] = np.memmap(
+        os.path.join(path, meta["vectors"]),
+        dtype=np.float32,
+        mode="r",
+        shape=(rows, meta["dim"])
+    ) if rows else None
+    return meta
@@ -0,0 +1,37 @@
+from typing import Any
+from functools import lru_cache
+from config.settings import get_settings
+from memory.chroma_client import get_chroma_manager
+from memory.local_vector_store import LocalVectorStore
+from memory.redis_store import get_redis_store
+from memory.snapshot_store import SnapshotStore
+
+@lru_cache()
+def get_vector_store() -> Any:
+    """Vector store behind the memory classes, chosen by VECTOR_STORE_BACKEND.
+
+    Both backends hand out collections with the same async API through
+    ``await store.collection(name, metadata)``, and are released with
+    ``store.close()``. With VECTOR_SNAPSHOT_PATH set, hot Chroma collections
+    are also served from local memory-mapped snapshots.
+    """
+    settings = get_settings()
+    if settings.VECTOR_STORE_BACKEND == "local":
+        return LocalVectorStore(
+            path=settings.LOCAL_VECTOR_STORE_PATH or None,
+            hnsw_threshold=settings.LOCAL_VECTOR_STORE_HNSW_THRESHOLD,
+            save_interval=settings.LOCAL_VECTOR_STORE_SAVE_INTERVAL,
+            max_collections=settings.LOCAL_VECTOR_STORE_MAX_COLLECTIONS
+        )
+    if settings.VECTOR_STORE_BACKEND != "chroma":
+        raise ValueError(f"Unknown vector store backend: {settings.VECTOR_STORE_BACKEND}")
+    if settings.VECTOR_SNAPSHOT_PATH:
+        return SnapshotStore(
+            get_chroma_manager(),
+            path=settings.VECTOR_SNAPSHOT_PATH,
+            interval=settings.VECTOR_SNAPSHOT_INTERVAL,
+            max_collections=settings.VECTOR_SNAPSHOT_MAX_COLLECTIONS,
+            max_staleness=settings.VECTOR_SNAPSHOT_MAX_STALENESS,
+            versions=get_redis_store()
+        )
+    return get_chroma_manager()
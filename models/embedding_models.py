@@ -0,0 +1,168 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from functools import lru_cache
+from openai import AsyncOpenAI, BadRequestError
+from config.settings import get_settings
+from memory.embedding_cache import EMBEDDING_MODEL, EmbeddingCache, get_embedding_cache
+import asyncio
+import tiktoken
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Hard limits of the embeddings endpoint on inputs per request and tokens per input
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_INPUT_TOKENS = 8191
+
+class EmbeddingBatcher:
+    """Coalesce embedding requests from all sessions into batched API calls.
+
+    Callers await ``embed``; their texts are queued and flushed together once
+    the queue reaches ``max_batch_size`` texts or ``max_batch_tokens`` tokens,
+    or ``max_wait`` seconds after the first queued text. Cached texts never
+    reach the queue, and duplicate texts within a flush are sent once.
+
+    Texts over the endpoint's token limit are cut to it and empty texts are
+    rejected before batching. If the endpoint still rejects a batch, it is
+    retried in halves, so only the caller of the bad input gets the error.
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        cache: Optional[EmbeddingCache] = None,
+        model: str = EMBEDDING_MODEL,
+        max_batch_size: int = 256,
+        max_batch_tokens: int = 250000,
+        max_wait: float = 0.01,
+        max_concurrency: int = 4
+    ):
+        self.client = client or AsyncOpenAI(api_key=get_settings().OPENAI_API_KEY)
+        self.cache = cache
+        self.model = model
+        self.max_batch_size = min(max_batch_size, MAX_INPUTS_PER_REQUEST)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait
+        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # (text, text sent to the endpoint, tokens, future)
+        self._queue: List[Tuple[str, str, int, asyncio.Future]] = []
+        self._queued_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.requests = 0
+        self.texts_embedded = 0
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Return one embedding per text, in order"""
+        texts = list(texts)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if self.cache is not None:
+            embeddings = await self.cache.get_many(self.model, texts)
+
+        loop = asyncio.get_running_loop()
+        pending = []
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                future = loop.create_future()
+                self._enqueue(texts[i], future)
+                pending.append((i, future))
+
+        if pending:
+            results = await asyncio.gather(*(future for _, future in pending))
+            for (i, _), embedding in zip(pending, results):
+                embeddings[i] = embedding
+        return embeddings
+
+    def _enqueue(self, text: str, future: asyncio.Future) -> None:
+        if not text.strip():
+            future.set_exception(Exception("Failed to generate embeddings: cannot embed empty text"))
+            return
+        encoded = self.tokenizer.encode(text)
+        tokens = len(encoded)
+        input_text = text
+        if tokens > MAX_INPUT_TOKENS:
+            input_text = self.tokenizer.decode(encoded[:MAX_INPUT_TOKENS])
+            tokens = MAX_INPUT_TOKENS
+        if self._queue and self._queued_tokens + tokens > self.max_batch_tokens:
+            self._flush()
+
+        self._queue.append((text, input_text, tokens, future))
+        self._queued_tokens += tokens
+
+        if len(self._queue) >= self.max_batch_size or self._queued_tokens >= self.max_batch_tokens:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    def _flush(self) -> None:
+        """Send everything queued as one request in the background"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._queue:
+            return
+
+        batch, self._queue, self._queued_tokens = self._queue, [], 0
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, str, int, asyncio.Future]]) -> None:
+        # Duplicate texts inside one batch are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _, _, _ in batch))
+        inputs = {text: input_text for text, input_text, _, _ in batch}
+        try:
+            async with self._semaphore:
+                response = await self.client.embeddings.create(
+                    model=self.model,
+                    input=[inputs[text] for text in unique_texts]
+                )
+            self.requests += 1
+            self.texts_embedded += len(unique_texts)
+
+            by_text = {text: item.embedding for text, item in zip(unique_texts, response.data)}
+            if self.cache is not None:
+                await self.cache.set_many(self.model, unique_texts, [by_text[text] for text in unique_texts])
+            for text, _, _, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+        except BadRequestError as e:
+            if len(unique_texts) == 1:
+                self._fail(batch, e)
+                return
+            # An input the endpoint rejects is isolated by retrying in halves
+            first = set(unique_texts[:len(unique_texts) // 2])
+            await asyncio.gather(
+                self._send([item for item in batch if item[0] in first]),
+                self._send([item for item in batch if item[0] not in first])
+            )
+        except Exception as e:
+            self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, str, int, asyncio.Future]], e: Exception) -> None:
+        logger.error(f"Embedding batch of {len(batch)} texts failed: {str(e)}")
+        error = Exception(f"Failed to generate embeddings: {str(e)}")
+        for _, _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counters showing how well concurrent calls are coalesced"""
+        return {
+            "requests": self.requests,
+            "texts_embedded": self.texts_embedded,
+            "avg_batch_size": self.texts_embedded / self.requests if self.requests else 0.0,
+            "queued": len(self._queue)
+        }
+
+@lru_cache()
+def get_embedding_batcher() -> EmbeddingBatcher:
+    settings = get_settings()
+    return EmbeddingBatcher(
+        cache=get_embedding_cache(),
+        max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+        max_batch_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+        max_wait=settings.EMBEDDING_BATCH_WAIT_MS / 1000,
+        max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY
+    )
@@ -1,5 +1,5 @@
 from openai import AsyncOpenAI
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 from config.settings import get_settings
 
 settings = get_settings()
@@ -8,6 +8,32 @@ class OpenAIChat:
     def __init__(self):
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.OPENAI_MODEL
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def _record_usage(self, usage: Any) -> None:
+        """Add a response's token usage, including prompt tokens served from the provider's cache"""
+        if usage is None:
+            return
+        self.requests += 1
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def usage_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0
+        }
+
+    async def close(self) -> None:
+        await self.client.close()
 
     async def generate_response(
         self,
@@ -23,6 +49,33 @@ class OpenAIChat:
                 max_tokens=max_tokens or 1000
             )
 
+            self._record_usage(response.usage)
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
+
+    async def generate_response_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Yield response text deltas as soon as the model produces them"""
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens or 1000,
+                stream=True,
+                # The last chunk then carries the usage of the whole request
+                stream_options={"include_usage": True}
+            )
+
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    self._record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
@@ -9,6 +9,9 @@ class SearchModel:
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.OPENAI_MODEL_SEARCH
 
+    async def close(self) -> None:
+        await self.client.close()
+
     async def search(self, query: str) -> Dict[str, Any]:
         try:
             response = await self.client.chat.completions.create(
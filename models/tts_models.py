@@ -1,8 +1,10 @@
 from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
+from elevenlabs.client import AsyncElevenLabs
 from config.settings import get_settings
-from typing import Optional, Dict, Any
+from utils.text_utils import SentenceSplitter
+from typing import AsyncIterator, Optional, Dict, Any, List
 from enum import Enum
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,40 +64,131 @@ class TextToSpeechModel:
         self.api_key = self.settings.ELEVENLABS_API_KEY
         if not self.api_key:
             raise ValueError("ELEVENLABS_API_KEY not found in environment variables")
-        self.client = ElevenLabs(api_key=self.api_key)
+        self.client = AsyncElevenLabs(api_key=self.api_key)
 
-    async def generate_speech(
-        self, 
+    @staticmethod
+    def _build_voice_settings(voice_settings: Optional[Any]) -> Optional[VoiceSettings]:
+        """Create VoiceSettings from a dict or a gRPC VoiceSettings message"""
+        if voice_settings is None:
+            return None
+
+        def value(key: str, default: Any) -> Any:
+            if isinstance(voice_settings, dict):
+                return voice_settings.get(key, default)
+            # Unset proto3 fields read as zero, so fall back to the default
+            return getattr(voice_settings, key, None) or default
+
+        return VoiceSettings(
+            stability=value("stability", 0.7),
+            similarity_boost=value("similarity_boost", 0.7),
+            style=value("style", 0.0),
+            use_speaker_boost=value("use_speaker_boost", False),
+            speed=value("speed", 1.0)
+        )
+
+    async def stream_speech(
+        self,
         text: str,
         voice_id: str = "21m00Tcm4TlvDq8ikWAM",
         model: ElevenLabsModels = ElevenLabsModels.FLASH_V2_5,
         voice_settings: Optional[Dict[str, Any]] = None
-    ) -> bytes:
-        """Generate speech from text using ElevenLabs v2.1.0 SDK"""
+    ) -> AsyncIterator[bytes]:
+        """Yield audio chunks as ElevenLabs synthesizes them, without blocking the event loop"""
         try:
-            # Create VoiceSettings object if voice_settings dict is provided
-            settings = None
-            if voice_settings:
-                settings = VoiceSettings(
-                    stability=voice_settings.get("stability", 0.7),
-                    similarity_boost=voice_settings.get("similarity_boost", 0.7),
-                    style=voice_settings.get("style", 0.0),
-                    use_speaker_boost=getattr(voice_settings, 'use_speaker_boost', False),
-                    speed=voice_settings.get("speed", 1.0)
-                )
-
-            # Generate speech using the synchronous method
-            response = self.client.text_to_speech.convert(
+            async for chunk in self.client.text_to_speech.stream(
                 voice_id=voice_id,
                 model_id=model.value,
                 text=text,
-                voice_settings=settings
-            )
-
-            # Convert response to bytes
-            audio_bytes = b"".join(response)
-            return audio_bytes
+                voice_settings=self._build_voice_settings(voice_settings)
+            ):
+                if chunk:
+                    yield chunk
 
         except Exception as e:
             logger.error(f"Text-to-speech generation failed: {str(e)}")
             raise
+
+    async def generate_speech(
+        self, 
+        text: str,
+        voice_id: str = "21m00Tcm4TlvDq8ikWAM",
+        model: ElevenLabsModels = ElevenLabsModels.FLASH_V2_5,
+        voice_settings: Optional[Dict[str, Any]] = None
+    ) -> bytes:
+        """Generate speech from text using ElevenLabs v2.1.0 SDK"""
+        chunks = []
+        async for chunk in self.stream_speech(
+            text=text,
+            voice_id=voice_id,
+            model=model,
+            voice_settings=voice_settings
+        ):
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+class SentenceTTSPipeline:
+    """Synthesize speech sentence by sentence while the LLM reply is still streaming.
+
+    Text deltas are fed as they arrive; every completed sentence starts its own
+    TTS request right away (bounded by ``max_concurrency``). Audio segments are
+    handed back strictly in sentence order.
+    """
+
+    def __init__(
+        self,
+        tts_model: TextToSpeechModel,
+        max_concurrency: int = 3,
+        **tts_options: Any
+    ):
+        self.tts_model = tts_model
+        self.tts_options = tts_options
+        self.splitter = SentenceSplitter()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._segments: List[asyncio.Task] = []
+        self._next_segment = 0
+
+    def feed(self, delta: str) -> None:
+        """Add a text delta, scheduling TTS for every sentence it completes"""
+        for sentence in self.splitter.feed(delta):
+            self._schedule(sentence)
+
+    def close(self) -> None:
+        """Schedule TTS for the trailing text once the LLM stream has ended"""
+        remainder = self.splitter.flush()
+        if remainder:
+            self._schedule(remainder)
+
+    def _schedule(self, sentence: str) -> None:
+        self._segments.append(asyncio.create_task(self._synthesize(sentence)))
+
+    async def _synthesize(self, sentence: str) -> bytes:
+        async with self._semaphore:
+            try:
+                return await self.tts_model.generate_speech(text=sentence, **self.tts_options)
+            except Exception as e:
+                logger.error(f"Text-to-speech generation failed for segment: {str(e)}")
+                return b""
+
+    def ready_segments(self) -> List[bytes]:
+        """Return finished audio segments that are next in order, without waiting"""
+        ready = []
+        while self._next_segment < len(self._segments) and self._segments[self._next_segment].done():
+            audio = self._segments[self._next_segment].result()
+            self._next_segment += 1
+            if audio:
+                ready.append(audio)
+        return ready
+
+    async def remaining_segments(self) -> AsyncIterator[bytes]:
+        """Wait for and yield the remaining audio segments in order"""
+        while self._next_segment < len(self._segments):
+            audio = await self._segments[self._next_segment]
+            self._next_segment += 1
+            if audio:
+                yield audio
+
+    def cancel(self) -> None:
+        """Cancel TTS requests whose audio is no longer needed"""
+        for task in self._segments[self._next_segment:]:
+            task.cancel()
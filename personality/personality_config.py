@@ -1,5 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
+import hashlib
+import json
+
+def config_version(config_data: Dict[str, Any]) -> str:
+    """Short digest of an agent config, changing whenever any field does"""
+    serialized = json.dumps(config_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
 
 class SpeechPatterns(BaseModel):
     tone: str = "neutral"
@@ -60,6 +67,15 @@ class PersonalityConfig(BaseModel):
     world_context: WorldContext
     knowledge_base: Dict[str, List[str]] = {}
     
+    def generate_knowledge_preamble(self) -> str:
+        """Static background knowledge of the agent, empty if it has none"""
+        if not self.knowledge_base:
+            return ""
+        lines = ["BACKGROUND KNOWLEDGE:"]
+        for topic in sorted(self.knowledge_base):
+            lines.append(f"- {topic}: {'; '.join(self.knowledge_base[topic])}")
+        return "\n".join(lines)
+
     def generate_prompt(self) -> str:
         return f"""You are {self.name}, a {self.age}-year-old {self.gender} living in {self.world_context.setting}.
 
@@ -0,0 +1,97 @@
+"""Benchmark KnowledgeMemory._chunk_text against the previous per-token implementation.
+
+Usage:
+    python scripts/benchmark_chunker.py --size-mb 4 --repeat 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.knowledge_memory import KnowledgeMemory
+
+def legacy_chunk_text(memory: KnowledgeMemory, text: str) -> List[Dict[str, Any]]:
+    """The original chunker, which decodes every token of every overlap window"""
+    tokens = memory.tokenizer.encode(text)
+    chunks = []
+
+    i = 0
+    while i < len(tokens):
+        chunk_end = min(i + memory.max_tokens, len(tokens))
+        chunk_tokens = tokens[i:chunk_end]
+
+        if chunk_end < len(tokens) and len(chunk_tokens) > memory.overlap_tokens:
+            break_chars = {'.', '?', '!', '\n'}
+            search_range = range(len(chunk_tokens) - memory.overlap_tokens, len(chunk_tokens))
+
+            for j in reversed(search_range):
+                if memory.tokenizer.decode([chunk_tokens[j]]).strip() in break_chars:
+                    chunk_tokens = chunk_tokens[:j + 1]
+                    break
+
+        chunk_text = memory.tokenizer.decode(chunk_tokens).strip()
+
+        if chunk_text:
+            chunks.append({
+                "text": chunk_text,
+                "token_count": len(chunk_tokens),
+                "start_pos": i,
+                "end_pos": i + len(chunk_tokens)
+            })
+
+        i += max(1, len(chunk_tokens) - memory.overlap_tokens)
+
+    return chunks
+
+def build_corpus(size_mb: float, seed: int = 0) -> str:
+    """Build a large document out of the sample knowledge base sentences"""
+    path = os.path.join(os.path.dirname(__file__), "..", "personality", "sample_knowledge.json")
+    with open(path, encoding="utf-8") as f:
+        sentences = [entry["text"] for entry in json.load(f)]
+
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        sentence = rng.choice(sentences)
+        separator = "\n\n" if rng.random() < 0.1 else " "
+        parts.append(sentence + separator)
+        size += len(sentence) + len(separator)
+    return "".join(parts)
+
+def timed(func, *args, repeat: int = 1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge base chunker")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Corpus size in megabytes")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation, best is reported")
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    memory = KnowledgeMemory("benchmark", max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+    corpus = build_corpus(args.size_mb)
+
+    legacy_time, legacy_chunks = timed(legacy_chunk_text, memory, corpus, repeat=args.repeat)
+    memory._break_tokens.clear()
+    fast_time, fast_chunks = timed(memory._chunk_text, corpus, repeat=args.repeat)
+
+    print(f"Corpus: {len(corpus) / 1024 / 1024:.1f} MB, {len(fast_chunks)} chunks")
+    print(f"Legacy chunker: {legacy_time:.3f}s")
+    print(f"Fast chunker:   {fast_time:.3f}s ({legacy_time / fast_time:.1f}x)")
+    print(f"Identical output: {legacy_chunks == fast_chunks}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Move per-session conversation collections into sharded tenant collections.
+
+Every ``conversation_{user}_{session}_{agent}`` collection is copied, with its
+stored embeddings, into ``conversation_{agent}_shard_NNN``. Turns get the
+user_id, session_id and agent_id metadata the sharded layout filters on, and
+the numeric created_at the recent history window filters on. Re-running is
+safe because turns are upserted under stable ids.
+
+``--backfill-created-at`` instead adds created_at, taken from the stored ISO
+timestamp, to every turn of every conversation collection that lacks it.
+
+Usage:
+    python scripts/migrate_conversations.py --dry-run
+    python scripts/migrate_conversations.py --shards 16 --delete-legacy
+    python scripts/migrate_conversations.py --backfill-created-at
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import Any, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+from memory.chroma_client import get_chroma_manager
+from memory.conversation_memory import SHARD_COLLECTION_PATTERN, shard_collection_name, shard_index, turn_created_at
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def parse_legacy_name(name: str, turn_id: str) -> Optional[Tuple[str, str, str]]:
+    """Recover (user_id, session_id, agent_id) from a legacy collection name.
+
+    Ids may contain underscores, so the session id is taken from a stored turn
+    id (``{session_id}_{timestamp}``) and used to split the name.
+    """
+    if not name.startswith("conversation_") or "_" not in turn_id:
+        return None
+    session_id = turn_id.rsplit("_", 1)[0]
+    user_id, sep, agent_id = name[len("conversation_"):].partition(f"_{session_id}_")
+    if not sep or not user_id or not agent_id:
+        return None
+    return user_id, session_id, agent_id
+
+def migrate_collection(client: Any, name: str, shards: int, page_size: int, dry_run: bool, delete_legacy: bool) -> int:
+    """Copy one legacy collection into its shard, returning the number of turns moved"""
+    legacy = client.get_collection(name)
+    first = legacy.get(limit=1, include=[])
+    if not first["ids"]:
+        logger.info(f"{name}: empty")
+        if delete_legacy and not dry_run:
+            client.delete_collection(name)
+        return 0
+
+    parsed = parse_legacy_name(name, first["ids"][0])
+    if parsed is None:
+        logger.warning(f"{name}: cannot recover user and session ids, skipping")
+        return 0
+    user_id, session_id, agent_id = parsed
+    target_name = shard_collection_name(agent_id, shard_index(user_id, shards))
+    logger.info(f"{name}: user={user_id} session={session_id} agent={agent_id} -> {target_name}")
+    if dry_run:
+        return legacy.count()
+
+    target = client.get_or_create_collection(name=target_name, metadata={"hnsw:space": "cosine"})
+    moved = 0
+    offset = 0
+    while True:
+        page = legacy.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not len(page["ids"]):
+            break
+        metadatas = []
+        for metadata in page["metadatas"]:
+            metadata = dict(metadata or {})
+            metadata.update({"user_id": user_id, "session_id": session_id, "agent_id": agent_id})
+            created_at = turn_created_at(metadata)
+            if created_at:
+                metadata["created_at"] = created_at
+            metadatas.append(metadata)
+        target.upsert(
+            ids=[f"{user_id}_{turn_id}" for turn_id in page["ids"]],
+            embeddings=page["embeddings"],
+            documents=page["documents"],
+            metadatas=metadatas
+        )
+        moved += len(page["ids"])
+        offset += page_size
+
+    if delete_legacy:
+        client.delete_collection(name)
+        get_chroma_manager().forget_collection(name)
+    return moved
+
+def backfill_created_at(client: Any, name: str, page_size: int, dry_run: bool) -> int:
+    """Add created_at to the turns of one collection that lack it, returning how many were updated"""
+    collection = client.get_collection(name)
+    updated = 0
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["metadatas"])
+        if not len(page["ids"]):
+            break
+        ids = []
+        metadatas = []
+        for turn_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = dict(metadata or {})
+            created_at = turn_created_at(metadata)
+            if "created_at" in metadata or not created_at:
+                continue
+            metadata["created_at"] = created_at
+            ids.append(turn_id)
+            metadatas.append(metadata)
+        if ids and not dry_run:
+            collection.update(ids=ids, metadatas=metadatas)
+        updated += len(ids)
+        offset += page_size
+    return updated
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Migrate per-session conversation collections to sharded collections")
+    parser.add_argument("--shards", type=int, default=settings.CONVERSATION_SHARDS, help="Shards per agent, must match CONVERSATION_SHARDS")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    parser.add_argument("--delete-legacy", action="store_true", help="Delete each legacy collection after copying it")
+    parser.add_argument("--backfill-created-at", action="store_true", help="Only add created_at to stored turns that lack it")
+    args = parser.parse_args()
+
+    client = get_chroma_manager().get_client()
+    if args.backfill_created_at:
+        total = 0
+        for collection in client.list_collections():
+            if not collection.name.startswith("conversation_"):
+                continue
+            try:
+                total += backfill_created_at(client, collection.name, args.page_size, args.dry_run)
+            except Exception as e:
+                logger.error(f"Failed to backfill {collection.name}: {str(e)}")
+        logger.info(f"{'Would update' if args.dry_run else 'Updated'} created_at of {total} turns")
+        return
+
+    legacy_names = [
+        collection.name for collection in client.list_collections()
+        if collection.name.startswith("conversation_") and not SHARD_COLLECTION_PATTERN.match(collection.name)
+    ]
+    logger.info(f"Found {len(legacy_names)} per-session conversation collections")
+
+    total = 0
+    for name in legacy_names:
+        try:
+            total += migrate_collection(client, name, args.shards, args.page_size, args.dry_run, args.delete_legacy)
+        except Exception as e:
+            logger.error(f"Failed to migrate {name}: {str(e)}")
+    logger.info(f"{'Would move' if args.dry_run else 'Moved'} {total} turns")
+
+if __name__ == "__main__":
+    main()
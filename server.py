@@ -11,6 +11,9 @@ import logging
 from config.settings import get_settings
 from services.vector_store.vector_store_service_pb2_grpc import add_VectorStoreServiceServicer_to_server
 from services.vector_store_service_impl import VectorStoreServiceImpl
+from memory.vector_store import get_vector_store
+from memory.conversation_writer import get_conversation_writer
+from memory.summary_memory import get_summary_memory
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -21,6 +24,9 @@ class GrpcServer:
         self.port = port
         self.max_workers = max_workers
         self.server = None
+        self.chat_service = None
+        self.vector_store_service = None
+        self._stats_task = None
         self._shutdown_event = asyncio.Event()
 
     async def start(self):
@@ -34,12 +40,15 @@ class GrpcServer:
         )
         
         # Add Chat Service
-        service = ChatServiceImpl()
-        add_ChatServiceServicer_to_server(service, self.server)
+        self.chat_service = ChatServiceImpl()
+        add_ChatServiceServicer_to_server(self.chat_service, self.server)
         
         # Add Vector Store Service
-        vector_store_service = VectorStoreServiceImpl()
-        add_VectorStoreServiceServicer_to_server(vector_store_service, self.server)
+        self.vector_store_service = VectorStoreServiceImpl()
+        add_VectorStoreServiceServicer_to_server(self.vector_store_service, self.server)
+
+        # Replay conversation turns that were not persisted before the last stop
+        await get_conversation_writer().start()
         
         # Enable reflection
         SERVICE_NAMES = (
@@ -55,17 +64,34 @@ class GrpcServer:
         logger.info(f"Server started on {server_address}")
         logger.info(f"App Name: {settings.APP_NAME}")
         logger.info(f"Debug Mode: {settings.DEBUG}")
+        if settings.STATS_LOG_INTERVAL:
+            self._stats_task = asyncio.create_task(self.log_stats_periodically())
         
         try:
             await self._shutdown_event.wait()
         finally:
             await self.shutdown()
 
+    async def log_stats_periodically(self):
+        """Log cache and prompt usage counters, which have no other export"""
+        while True:
+            await asyncio.sleep(settings.STATS_LOG_INTERVAL)
+            logger.info(f"Chat service cache stats: {self.chat_service.cache_stats()}")
+            logger.info(f"Vector store cache stats: {self.vector_store_service.cache_stats()}")
+
     async def shutdown(self):
         """Gracefully shutdown the server"""
+        if self._stats_task:
+            self._stats_task.cancel()
         if self.server:
             logger.info("Shutting down server...")
             await self.server.stop(5)  # 5 seconds grace period
+            await self.chat_service.shutdown()
+            await self.vector_store_service.shutdown()
+            await get_conversation_writer().close()
+            if settings.SESSION_SUMMARY_ENABLED:
+                await get_summary_memory().close()
+            get_vector_store().close()
             logger.info("Server shutdown complete")
 
     def signal_handler(self, sig):
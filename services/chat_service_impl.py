@@ -1,16 +1,24 @@
 import grpc
 import asyncio
-from typing import Dict
+from typing import Any, AsyncIterator, Dict, Optional
 from services.chats.chat_service_pb2 import ChatRequest, ChatResponse, Metadata
 from services.chats.chat_service_pb2_grpc import ChatServiceServicer
 from agents.chat_agent import ChatAgent
-from personality.personality_config import PersonalityConfig
+from personality.personality_config import PersonalityConfig, config_version
 from memory.redis_store import RedisStore
+from utils.cache import BoundedCache
+from memory.embedding_cache import get_embedding_cache
+from models.embedding_models import get_embedding_batcher
+from config.settings import get_settings
 import logging
 import json
+import time
 
 logger = logging.getLogger(__name__)
 
+# Counters of OpenAIChat.usage_stats that add up across agents
+USAGE_COUNTERS = ("requests", "prompt_tokens", "cached_tokens", "completion_tokens")
+
 # # Sample knowledge data for different domains
 # sample_knowledge = [
 #     {
@@ -52,75 +60,255 @@ class ChatServiceImpl(ChatServiceServicer):
         # Redis setup
         self.redis_store = RedisStore()
         
-        # Cache for active chat agents
-        self._chat_agents: Dict[str, ChatAgent] = {}
+        # Cache for active chat agents, idle agents are cleaned up on eviction
+        settings = get_settings()
+        self._chat_agents: BoundedCache[ChatAgent] = BoundedCache(
+            "chat_agents",
+            max_size=settings.AGENT_CACHE_SIZE,
+            ttl=settings.SESSION_TIMEOUT,
+            on_evict=self._cleanup_agent
+        )
+        # Unknown agent ids, remembered briefly so repeated lookups skip Redis
+        self._missing_agents: BoundedCache[bool] = BoundedCache(
+            "missing_agents",
+            max_size=10000,
+            ttl=settings.AGENT_NOT_FOUND_TTL,
+            sliding=False
+        )
+        # In-progress agent builds, shared by concurrent callers
+        self._pending_agents: Dict[str, asyncio.Future] = {}
+        # In-progress checks of cached agents against their config in Redis
+        self._config_checks: Dict[str, asyncio.Task] = {}
+        # Counters of evicted agents, so totals cover the whole run
+        self._retired_usage: Dict[str, Dict[str, int]] = {}
+        self._retired_memory_stats = {"hits": 0, "misses": 0, "evictions": 0}
         self._initialized = False
         self._init_lock = asyncio.Lock()
 
+    async def _cleanup_agent(self, agent_id: str, chat_agent: ChatAgent) -> None:
+        chat_agent.retired = True
+        # An agent still serving requests is cleaned up by its last release
+        if chat_agent.active == 0:
+            await self._retire_agent(chat_agent)
+
+    async def _retire_agent(self, chat_agent: ChatAgent) -> None:
+        try:
+            for counter, value in chat_agent.conversation_memories.stats().items():
+                if counter in self._retired_memory_stats:
+                    self._retired_memory_stats[counter] += value
+            usage = self._retired_usage.setdefault(chat_agent.agent_id, dict.fromkeys(USAGE_COUNTERS, 0))
+            for counter, value in chat_agent.openai_chat.usage_stats().items():
+                if counter in usage:
+                    usage[counter] += value
+        finally:
+            await chat_agent.cleanup()
+
+    def prompt_usage(self) -> Dict[str, Dict[str, Any]]:
+        """Prompt and cached token totals per agent since start, evicted agents included"""
+        usage = {agent_id: dict(counters) for agent_id, counters in self._retired_usage.items()}
+        for agent in self._chat_agents.values():
+            counters = usage.setdefault(agent.agent_id, dict.fromkeys(USAGE_COUNTERS, 0))
+            for counter, value in agent.openai_chat.usage_stats().items():
+                if counter in counters:
+                    counters[counter] += value
+        for counters in usage.values():
+            prompt_tokens = counters["prompt_tokens"]
+            counters["cache_hit_ratio"] = round(counters["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+        return usage
+
+    def conversation_memory_stats(self) -> Dict[str, int]:
+        """Session memory cache counters summed over agents, evicted agents included"""
+        memories = dict(self._retired_memory_stats, size=0)
+        for agent in self._chat_agents.values():
+            for counter, value in agent.conversation_memories.stats().items():
+                if counter in memories:
+                    memories[counter] += value
+        return memories
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters of the agent and session memory caches"""
+        return {
+            "chat_agents": self._chat_agents.stats(),
+            "conversation_memories": self.conversation_memory_stats(),
+            "prompt_usage": self.prompt_usage(),
+            "embeddings": get_embedding_cache().stats(),
+            "embedding_batches": get_embedding_batcher().stats()
+        }
+
+    async def shutdown(self) -> None:
+        """Clean up every cached agent"""
+        logger.info(f"Chat service cache stats: {self.cache_stats()}")
+        await self._chat_agents.clear()
+
     async def get_or_create_chat_agent(self, agent_id: str) -> ChatAgent:
-        """Get existing chat agent or create new one"""
-        if agent_id not in self._chat_agents:
-            # Get agent config from Redis
+        """Get existing chat agent or create new one, and mark it in use.
+
+        Concurrent callers for the same cold agent_id await a single build.
+        Every caller hands the agent back with ``release_chat_agent``.
+        """
+        while True:
+            chat_agent = await self._get_or_create_chat_agent(agent_id)
+            # Evicted while this caller waited for the build, so look it up again
+            if not chat_agent.retired:
+                chat_agent.active += 1
+                return chat_agent
+
+    async def release_chat_agent(self, chat_agent: ChatAgent) -> None:
+        """Finish one use of an agent, cleaning it up if it was evicted meanwhile"""
+        chat_agent.active -= 1
+        if chat_agent.retired and chat_agent.active == 0:
+            await self._retire_agent(chat_agent)
+
+    async def _get_or_create_chat_agent(self, agent_id: str) -> ChatAgent:
+        chat_agent = await self._chat_agents.get(agent_id)
+        if chat_agent is not None:
+            self._schedule_config_check(agent_id, chat_agent)
+            return chat_agent
+
+        if await self._missing_agents.get(agent_id):
+            raise ValueError(f"Agent with id {agent_id} not found in Redis")
+
+        async with self._init_lock:
+            # A build may have finished while this caller waited for the lock
+            chat_agent = await self._chat_agents.get(agent_id)
+            if chat_agent is not None:
+                return chat_agent
+            build = self._pending_agents.get(agent_id)
+            if build is None:
+                build = asyncio.ensure_future(self._create_chat_agent(agent_id))
+                self._pending_agents[agent_id] = build
+                build.add_done_callback(lambda _: self._pending_agents.pop(agent_id, None))
+
+        # Shield the shared build so one cancelled caller does not cancel it for all
+        return await asyncio.shield(build)
+
+    async def _create_chat_agent(self, agent_id: str) -> ChatAgent:
+        # Get agent config from Redis
+        config_data = await self.redis_store.get(f"agent:{agent_id}:config")
+        if not config_data:
+            await self._missing_agents.set(agent_id, True)
+            raise ValueError(f"Agent with id {agent_id} not found in Redis")
+
+        # Convert Redis data to PersonalityConfig
+        config = PersonalityConfig(**config_data.get('value', {}))
+
+        # Create new chat agent
+        chat_agent = ChatAgent(agent_id, config, config_version=config_version(config_data.get('value', {})))
+        await chat_agent.initialize()
+        # TODO: load knowledge base func
+        # await chat_agent.knowledge_memory.load_knowledge_base(sample_knowledge)
+        await self._chat_agents.set(agent_id, chat_agent)
+        return chat_agent
+
+    def _schedule_config_check(self, agent_id: str, chat_agent: ChatAgent) -> None:
+        """Compare a cached agent with its Redis config in the background, at most once per interval"""
+        interval = get_settings().AGENT_CONFIG_REFRESH_INTERVAL
+        if not interval or agent_id in self._config_checks:
+            return
+        if time.monotonic() - chat_agent.config_checked_at < interval:
+            return
+        task = asyncio.ensure_future(self._refresh_agent_config(agent_id, chat_agent))
+        self._config_checks[agent_id] = task
+        task.add_done_callback(lambda _: self._config_checks.pop(agent_id, None))
+
+    async def _refresh_agent_config(self, agent_id: str, chat_agent: ChatAgent) -> None:
+        """Apply a changed agent config, so its system prompt is rendered again"""
+        chat_agent.config_checked_at = time.monotonic()
+        try:
             config_data = await self.redis_store.get(f"agent:{agent_id}:config")
             if not config_data:
-                raise ValueError(f"Agent with id {agent_id} not found in Redis")
-            
-            # Convert Redis data to PersonalityConfig
-            config = PersonalityConfig(**config_data.get('value', {}))
+                logger.warning(f"Config of cached agent {agent_id} is no longer in Redis")
+                return
+            version = config_version(config_data.get('value', {}))
+            if version != chat_agent.config_version:
+                chat_agent.update_personality(PersonalityConfig(**config_data.get('value', {})), version)
+                logger.info(f"Reloaded config of agent {agent_id} (version {version})")
+        except Exception as e:
+            logger.error(f"Failed to refresh config of agent {agent_id}: {str(e)}")
 
-            # Create new chat agent
-            chat_agent = ChatAgent(agent_id, config)
-            await chat_agent.initialize()
-            # TODO: load knowledge base func
-            # await chat_agent.knowledge_memory.load_knowledge_base(sample_knowledge)
-            self._chat_agents[agent_id] = chat_agent
+    def _build_context(self, request: ChatRequest) -> Dict[str, Any]:
+        """Parse recent_history JSON string if present"""
+        context_dict = {}
+        if request.recent_history:
+            try:
+                context_dict["recent_conversations"] = json.loads(request.recent_history)
+            except Exception as e:
+                logger.warning(f"Failed to parse recent_history: {e}")
+        return context_dict
 
-        return self._chat_agents[agent_id]
+    @staticmethod
+    def _to_chat_response(result: Dict[str, Any]) -> ChatResponse:
+        """Convert an agent result dict into a ChatResponse message"""
+        # Only use timestamp for metadata
+        metadata = Metadata(timestamp=result["metadata"].get("timestamp", ""))
+
+        return ChatResponse(
+            response=result.get("response", ""),
+            session_id=result.get("session_id", ""),
+            user_id=result.get("user_id", ""),
+            type=result.get("type", "text"),
+            metadata=metadata,
+            audio_content=result.get('audio') or b'',
+            error=""  # Optionally set error
+        )
+
+    @staticmethod
+    def _error_response(error: Exception, request: Optional[ChatRequest] = None) -> ChatResponse:
+        return ChatResponse(
+            response="",
+            session_id=request.session_id if request else "",
+            user_id=request.user_id if request else "",
+            type="error",
+            metadata=Metadata(timestamp=""),
+            audio_content=b"",
+            error=str(error)
+        )
 
     async def ProcessMessage(self, request: ChatRequest, context):
         """Process a single chat message with specified agent"""
         try:
             # Get or create chat agent for the specified agent_id
             chat_agent = await self.get_or_create_chat_agent(request.agent_id)
+            try:
+                result = await chat_agent.process_message(
+                    user_id=request.user_id,
+                    message=request.message,
+                    session_id=request.session_id,
+                    context=self._build_context(request),
+                    tts_settings=request.tts_settings if request.HasField('tts_settings') else None
+                )
+            finally:
+                await self.release_chat_agent(chat_agent)
 
-            # Parse recent_history JSON string if present
-            context_dict = {}
-            if request.recent_history:
-                try:
-                    context_dict["recent_conversations"] = json.loads(request.recent_history)
-                except Exception as e:
-                    logger.warning(f"Failed to parse recent_history: {e}")
-
-            result = await chat_agent.process_message(
-                user_id=request.user_id,
-                message=request.message,
-                session_id=request.session_id,
-                context=context_dict,
-                tts_settings=request.tts_settings if request.HasField('tts_settings') else None
-            )
-
-            # Only use timestamp for metadata
-            metadata = Metadata(timestamp=result["metadata"].get("timestamp", ""))
-
-            return ChatResponse(
-                response=result.get("response", ""),
-                session_id=result.get("session_id", ""),
-                user_id=result.get("user_id", ""),
-                type=result.get("type", "text"),
-                metadata=metadata,
-                audio_content=result.get('audio', b''),
-                error=""  # Optionally set error
-            )
+            return self._to_chat_response(result)
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(f"Internal error: {str(e)}")
-            return ChatResponse(
-                response="",
-                session_id="",
-                user_id="",
-                type="error",
-                metadata=Metadata(timestamp=""),
-                audio_content=b"",
-                error=str(e)
-            )
+            return self._error_response(e)
+
+    async def StreamChat(self, request_iterator: AsyncIterator[ChatRequest], context):
+        """Stream replies for each incoming message as incremental ChatResponse frames.
+
+        Every request produces zero or more frames of type "partial" carrying
+        text deltas, "audio" frames carrying speech chunks when TTS is enabled,
+        and one final frame with the complete response.
+        A failing request yields an "error" frame and the stream continues.
+        """
+        async for request in request_iterator:
+            try:
+                chat_agent = await self.get_or_create_chat_agent(request.agent_id)
+                try:
+                    async for result in chat_agent.stream_message(
+                        user_id=request.user_id,
+                        message=request.message,
+                        session_id=request.session_id,
+                        context=self._build_context(request),
+                        tts_settings=request.tts_settings if request.HasField('tts_settings') else None
+                    ):
+                        yield self._to_chat_response(result)
+                finally:
+                    await self.release_chat_agent(chat_agent)
+            except Exception as e:
+                logger.error(f"Error streaming message: {str(e)}")
+                yield self._error_response(e, request)
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n0services/vector_store/vector_store_service.proto\x12\x15services.vector_store\"\xa7\x01\n\x18StoreConversationRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x10\n\x08\x61gent_id\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\x12\x0f\n\x07message\x18\x04 \x01(\t\x12\x10\n\x08response\x18\x05 \x01(\t\x12\x31\n\x08metadata\x18\x06 \x01(\x0b\x32\x1f.services.vector_store.Metadata\";\n\x19StoreConversationResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"\x1d\n\x08Metadata\x12\x11\n\ttimestamp\x18\x01 \x01(\t2\x8e\x01\n\x12VectorStoreService\x12x\n\x11StoreConversation\x12/.services.vector_store.StoreConversationRequest\x1a\x30.services.vector_store.StoreConversationResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n0services/vector_store/vector_store_service.proto\x12\x15services.vector_store\"\xa7\x01\n\x18StoreConversationRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x10\n\x08\x61gent_id\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\x12\x0f\n\x07message\x18\x04 \x01(\t\x12\x10\n\x08response\x18\x05 \x01(\t\x12\x31\n\x08metadata\x18\x06 \x01(\x0b\x32\x1f.services.vector_store.Metadata\";\n\x19StoreConversationResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"`\n\x1eStoreConversationBatchResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05\x65rror\x18\x02 \x01(\t\x12\x0e\n\x06stored\x18\x03 \x01(\x05\x12\x0e\n\x06\x66\x61iled\x18\x04 \x01(\x05\"\x1d\n\x08Metadata\x12\x11\n\ttimestamp\x18\x01 \x01(\t2\x95\x02\n\x12VectorStoreService\x12x\n\x11StoreConversation\x12/.services.vector_store.StoreConversationRequest\x1a\x30.services.vector_store.StoreConversationResponse\"\x00\x12\x84\x01\n\x16StoreConversationBatch\x12/.services.vector_store.StoreConversationRequest\x1a\x35.services.vector_store.StoreConversationBatchResponse\"\x00(\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,8 +35,10 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_STORECONVERSATIONREQUEST']._serialized_end=243
   _globals['_STORECONVERSATIONRESPONSE']._serialized_start=245
   _globals['_STORECONVERSATIONRESPONSE']._serialized_end=304
-  _globals['_METADATA']._serialized_start=306
-  _globals['_METADATA']._serialized_end=335
-  _globals['_VECTORSTORESERVICE']._serialized_start=338
-  _globals['_VECTORSTORESERVICE']._serialized_end=480
+  _globals['_STORECONVERSATIONBATCHRESPONSE']._serialized_start=306
+  _globals['_STORECONVERSATIONBATCHRESPONSE']._serialized_end=402
+  _globals['_METADATA']._serialized_start=404
+  _globals['_METADATA']._serialized_end=433
+  _globals['_VECTORSTORESERVICE']._serialized_start=436
+  _globals['_VECTORSTORESERVICE']._serialized_end=713
 # @@protoc_insertion_point(module_scope)
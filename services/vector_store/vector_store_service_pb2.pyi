@@ -28,6 +28,18 @@ class StoreConversationResponse(_message.Message):
     error: str
     def __init__(self, success: bool = ..., error: _Optional[str] = ...) -> None: ...
 
+class StoreConversationBatchResponse(_message.Message):
+    __slots__ = ("success", "error", "stored", "failed")
+    SUCCESS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_FIELD_NUMBER: _ClassVar[int]
+    STORED_FIELD_NUMBER: _ClassVar[int]
+    FAILED_FIELD_NUMBER: _ClassVar[int]
+    success: bool
+    error: str
+    stored: int
+    failed: int
+    def __init__(self, success: bool = ..., error: _Optional[str] = ..., stored: _Optional[int] = ..., failed: _Optional[int] = ...) -> None: ...
+
 class Metadata(_message.Message):
     __slots__ = ("timestamp",)
     TIMESTAMP_FIELD_NUMBER: _ClassVar[int]
@@ -39,6 +39,11 @@ class VectorStoreServiceStub(object):
                 request_serializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationRequest.SerializeToString,
                 response_deserializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationResponse.FromString,
                 _registered_method=True)
+        self.StoreConversationBatch = channel.stream_unary(
+                '/services.vector_store.VectorStoreService/StoreConversationBatch',
+                request_serializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationRequest.SerializeToString,
+                response_deserializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationBatchResponse.FromString,
+                _registered_method=True)
 
 
 class VectorStoreServiceServicer(object):
@@ -50,6 +55,12 @@ class VectorStoreServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StoreConversationBatch(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_VectorStoreServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +69,11 @@ def add_VectorStoreServiceServicer_to_server(servicer, server):
                     request_deserializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationRequest.FromString,
                     response_serializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationResponse.SerializeToString,
             ),
+            'StoreConversationBatch': grpc.stream_unary_rpc_method_handler(
+                    servicer.StoreConversationBatch,
+                    request_deserializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationRequest.FromString,
+                    response_serializer=services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationBatchResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'services.vector_store.VectorStoreService', rpc_method_handlers)
@@ -95,3 +111,30 @@ class VectorStoreService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StoreConversationBatch(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/services.vector_store.VectorStoreService/StoreConversationBatch',
+            services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationRequest.SerializeToString,
+            services_dot_vector__store_dot_vector__store__service__pb2.StoreConversationBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,37 +1,47 @@
+from typing import Any, Dict, Tuple
 from services.vector_store.vector_store_service_pb2_grpc import VectorStoreServiceServicer
-from services.vector_store.vector_store_service_pb2 import StoreConversationRequest, StoreConversationResponse
-from memory.conversation_memory import ConversationMemory
+from services.vector_store.vector_store_service_pb2 import (
+    StoreConversationRequest,
+    StoreConversationResponse,
+    StoreConversationBatchResponse
+)
+from memory.conversation_writer import get_conversation_writer
+from config.settings import get_settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 class VectorStoreServiceImpl(VectorStoreServiceServicer):
     def __init__(self):
-        self.memories = {}
+        settings = get_settings()
+        self.writer = get_conversation_writer()
+        self.batch_size = settings.CONVERSATION_WRITE_BATCH_SIZE
+        self.max_in_flight = settings.CONVERSATION_BATCH_MAX_IN_FLIGHT
 
-    async def StoreConversation(self, request: StoreConversationRequest, context):
-        try:
-            memory_key = f"{request.user_id}_{request.session_id}_{request.agent_id}"
-            if memory_key not in self.memories:
-                memory = ConversationMemory(
-                    user_id=request.user_id,
-                    agent_id=request.agent_id,
-                    session_id=request.session_id
-                )
-                await memory.initialize()
-                self.memories[memory_key] = memory
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "write_behind": self.writer.stats()
+        }
 
+    async def shutdown(self) -> None:
+        logger.info(f"Vector store cache stats: {self.cache_stats()}")
+
+    def _turn(self, request: StoreConversationRequest) -> Tuple[str, str, str, str, str, Dict[str, Any]]:
+        return (
+            request.user_id,
+            request.agent_id,
+            request.session_id,
+            request.message,
+            request.response,
             # Only use timestamp from metadata
-            metadata = {
-                "timestamp": request.metadata.timestamp
-            }
-
-            await self.memories[memory_key].store_conversation(
-                message=request.message,
-                response=request.response,
-                metadata=metadata
-            )
+            {"timestamp": request.metadata.timestamp}
+        )
 
+    async def StoreConversation(self, request: StoreConversationRequest, context):
+        try:
+            # Journaled here; the write-behind workers store it in the background
+            await self.writer.submit(*self._turn(request))
             return StoreConversationResponse(success=True)
         except Exception as e:
             logger.error(f"Failed to store conversation: {str(e)}")
@@ -39,3 +49,57 @@ class VectorStoreServiceImpl(VectorStoreServiceServicer):
                 success=False,
                 error=str(e)
             )
+
+    async def StoreConversationBatch(self, request_iterator, context):
+        """Journal a client stream of turns in groups and store them in bulk.
+
+        Turns are journaled ``batch_size`` at a time with one write each and
+        count as stored once journaled. Each group goes straight to the
+        write buffer, so every collection gets full batches. At most
+        ``max_in_flight`` journaled turns are waiting to be written; reading
+        the stream pauses until earlier groups are stored.
+        """
+        in_flight: Dict[asyncio.Task, int] = {}
+        group: list = []
+        stored = 0
+        failed = 0
+        first_error = None
+
+        async def submit_group() -> None:
+            nonlocal stored, failed, first_error
+            turns = group[:]
+            group.clear()
+            try:
+                in_flight[await self.writer.submit_many(turns)] = len(turns)
+                stored += len(turns)
+            except Exception as e:
+                failed += len(turns)
+                first_error = first_error or e
+            while in_flight and sum(in_flight.values()) >= self.max_in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    del in_flight[task]
+
+        try:
+            async for request in request_iterator:
+                group.append(self._turn(request))
+                if len(group) >= self.batch_size:
+                    await submit_group()
+        except Exception as e:
+            logger.error(f"Failed to read conversation batch: {str(e)}")
+            failed += 1
+            first_error = first_error or e
+
+        if group:
+            await submit_group()
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+        if first_error is not None:
+            logger.error(f"Failed to store {failed} turns of conversation batch: {str(first_error)}")
+        return StoreConversationBatchResponse(
+            success=first_error is None,
+            error=str(first_error) if first_error is not None else "",
+            stored=stored,
+            failed=failed
+        )
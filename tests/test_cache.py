@@ -0,0 +1,45 @@
+import asyncio
+from utils.cache import BoundedCache
+
+
+def test_bounded_cache_evicts_lru_and_runs_hook():
+    evicted = []
+
+    async def on_evict(key, value):
+        evicted.append(key)
+
+    async def run():
+        cache = BoundedCache("test", max_size=2, on_evict=on_evict)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        assert await cache.get("a") == 1
+        await cache.set("c", 3)
+        assert await cache.get("b") is None
+        return cache
+
+    cache = asyncio.run(run())
+    assert evicted == ["b"]
+    assert cache.stats() == {
+        "name": "test", "size": 2, "max_size": 2, "hits": 1, "misses": 1, "evictions": 1
+    }
+
+
+def test_bounded_cache_expires_idle_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils.cache.time.monotonic", lambda: now[0])
+    evicted = []
+
+    async def on_evict(key, value):
+        evicted.append(key)
+
+    async def run():
+        cache = BoundedCache("test", max_size=10, ttl=60, on_evict=on_evict)
+        await cache.set("idle", 1)
+        now[0] += 30
+        await cache.set("busy", 2)
+        now[0] += 40
+        assert await cache.get("busy") == 2
+        assert await cache.get("idle") is None
+
+    asyncio.run(run())
+    assert evicted == ["idle"]
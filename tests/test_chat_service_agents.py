@@ -0,0 +1,204 @@
+import asyncio
+import pytest
+import services.chat_service_impl as chat_service_impl
+from services.chat_service_impl import ChatServiceImpl
+
+
+class FakeRedisStore:
+    def __init__(self, configs):
+        self.configs = configs
+        self.calls = 0
+
+    async def get(self, key):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.configs.get(key)
+
+
+class FakeChatAgent:
+    created = 0
+    active = 0
+    retired = False
+
+    def __init__(self, agent_id, config, config_version=None):
+        FakeChatAgent.created += 1
+        self.agent_id = agent_id
+        self.config = config
+        self.config_version = config_version
+        self.config_checked_at = 0.0
+
+    def update_personality(self, config, config_version=None):
+        self.config = config
+        self.config_version = config_version
+
+    async def initialize(self):
+        await asyncio.sleep(0.01)
+
+
+def test_concurrent_callers_share_one_agent_build(monkeypatch):
+    monkeypatch.setattr(chat_service_impl, "ChatAgent", FakeChatAgent)
+    monkeypatch.setattr(chat_service_impl, "PersonalityConfig", lambda **kwargs: kwargs)
+    FakeChatAgent.created = 0
+
+    async def run():
+        service = ChatServiceImpl()
+        service.redis_store = FakeRedisStore({"agent:a1:config": {"value": {}}})
+        agents = await asyncio.gather(*[service.get_or_create_chat_agent("a1") for _ in range(20)])
+        return service, agents
+
+    service, agents = asyncio.run(run())
+    assert FakeChatAgent.created == 1
+    assert service.redis_store.calls == 1
+    assert all(agent is agents[0] for agent in agents)
+
+
+def test_unknown_agent_is_negatively_cached():
+    async def run():
+        service = ChatServiceImpl()
+        service.redis_store = FakeRedisStore({})
+        results = await asyncio.gather(
+            *[service.get_or_create_chat_agent("missing") for _ in range(10)],
+            return_exceptions=True
+        )
+        with pytest.raises(ValueError):
+            await service.get_or_create_chat_agent("missing")
+        return service, results
+
+    service, results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert service.redis_store.calls == 1
+
+
+def test_cached_agent_picks_up_a_changed_config(monkeypatch):
+    monkeypatch.setattr(chat_service_impl, "ChatAgent", FakeChatAgent)
+    monkeypatch.setattr(chat_service_impl, "PersonalityConfig", lambda **kwargs: kwargs)
+
+    async def run():
+        service = ChatServiceImpl()
+        service.redis_store = FakeRedisStore({"agent:a1:config": {"value": {"name": "Luna"}}})
+        agent = await service.get_or_create_chat_agent("a1")
+        first_version = agent.config_version
+
+        service.redis_store.configs["agent:a1:config"] = {"value": {"name": "Nova"}}
+        agent.config_checked_at = 0.0
+        assert await service.get_or_create_chat_agent("a1") is agent
+        await asyncio.gather(*service._config_checks.values())
+        return agent, first_version
+
+    agent, first_version = asyncio.run(run())
+    assert agent.config == {"name": "Nova"}
+    assert agent.config_version != first_version
+
+
+
+def test_conversation_memory_stats_outlive_evicted_agents():
+    from utils.cache import BoundedCache
+
+    class NoUsage:
+        def usage_stats(self):
+            return {}
+
+    class MemoryAgent:
+        active = 0
+        retired = False
+
+        def __init__(self, agent_id):
+            self.agent_id = agent_id
+            self.openai_chat = NoUsage()
+            self.conversation_memories = BoundedCache("conversation_memories", max_size=10)
+            self.conversation_memories.hits = 3
+
+        async def cleanup(self):
+            pass
+
+    async def run():
+        service = ChatServiceImpl()
+        await service._chat_agents.set("a1", MemoryAgent("a1"))
+        # A rebuilt agent replaces, and so evicts, the previous one
+        await service._chat_agents.set("a1", MemoryAgent("a1"))
+        return service.conversation_memory_stats()
+
+    assert asyncio.run(run())["hits"] == 6
+
+
+def test_prompt_usage_outlives_evicted_agents():
+    from utils.cache import BoundedCache
+
+    class Usage:
+        def __init__(self, prompt_tokens, cached_tokens):
+            self.counters = {"requests": 1, "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "completion_tokens": 5}
+
+        def usage_stats(self):
+            return dict(self.counters, cache_hit_ratio=0.0)
+
+    class UsageAgent:
+        active = 0
+        retired = False
+
+        def __init__(self, agent_id, prompt_tokens, cached_tokens):
+            self.agent_id = agent_id
+            self.openai_chat = Usage(prompt_tokens, cached_tokens)
+            self.conversation_memories = BoundedCache("conversation_memories", max_size=10)
+
+        async def cleanup(self):
+            pass
+
+    async def run():
+        service = ChatServiceImpl()
+        await service._chat_agents.set("a1", UsageAgent("a1", 100, 40))
+        # A rebuilt agent replaces, and so evicts, the previous one
+        await service._chat_agents.set("a1", UsageAgent("a1", 100, 60))
+        return service.prompt_usage()
+
+    assert asyncio.run(run())["a1"] == {
+        "requests": 2, "prompt_tokens": 200, "cached_tokens": 100, "completion_tokens": 10, "cache_hit_ratio": 0.5
+    }
+
+
+def test_evicted_agent_is_cleaned_up_after_its_last_request(monkeypatch):
+    monkeypatch.setattr(chat_service_impl, "ChatAgent", FakeChatAgent)
+    monkeypatch.setattr(chat_service_impl, "PersonalityConfig", lambda **kwargs: kwargs)
+    cleaned = []
+
+    async def cleanup(self):
+        cleaned.append(self)
+
+    monkeypatch.setattr(FakeChatAgent, "cleanup", cleanup, raising=False)
+    monkeypatch.setattr(FakeChatAgent, "conversation_memories", chat_service_impl.BoundedCache("m", max_size=1), raising=False)
+    monkeypatch.setattr(FakeChatAgent, "openai_chat", type("NoUsage", (), {"usage_stats": lambda self: {}})(), raising=False)
+
+    async def run():
+        service = ChatServiceImpl()
+        service.redis_store = FakeRedisStore({"agent:a1:config": {"value": {}}})
+        agent = await service.get_or_create_chat_agent("a1")
+        await service._chat_agents.clear()
+        evicted_in_use = list(cleaned)
+        await service.release_chat_agent(agent)
+        rebuilt = await service.get_or_create_chat_agent("a1")
+        return agent, evicted_in_use, rebuilt
+
+    agent, evicted_in_use, rebuilt = asyncio.run(run())
+    assert evicted_in_use == []
+    assert cleaned == [agent]
+    assert rebuilt is not agent
+
+
+def test_agent_cached_while_waiting_for_the_lock_is_not_built_again(monkeypatch):
+    monkeypatch.setattr(chat_service_impl, "ChatAgent", FakeChatAgent)
+    monkeypatch.setattr(chat_service_impl, "PersonalityConfig", lambda **kwargs: kwargs)
+    FakeChatAgent.created = 0
+
+    async def run():
+        service = ChatServiceImpl()
+        service.redis_store = FakeRedisStore({"agent:a1:config": {"value": {}}})
+        async with service._init_lock:
+            waiting = asyncio.ensure_future(service.get_or_create_chat_agent("a1"))
+            await asyncio.sleep(0)
+            # Finished by an earlier build while the caller waited for the lock
+            cached = FakeChatAgent("a1", {})
+            await service._chat_agents.set("a1", cached)
+        return cached, await waiting
+
+    cached, agent = asyncio.run(run())
+    assert agent is cached
+    assert FakeChatAgent.created == 1
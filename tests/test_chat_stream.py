@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+import graphs.prompt_assembler as prompt_assembler
+from config.settings import get_settings
+from graphs.chat_graph import ChatWorkflow
+from models.openai_models import OpenAIChat
+from tests.test_knowledge_chunker import WordTokenizer
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    # Keeps prompt budgeting independent of tiktoken downloads
+    monkeypatch.setattr(prompt_assembler, "get_encoder", lambda: WordTokenizer())
+
+
+class FakePersonality:
+    def generate_prompt(self) -> str:
+        return "You are Luna."
+
+
+class FakeOpenAIChat:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def generate_response_stream(self, messages, temperature=0.7, max_tokens=None):
+        self.calls.append(messages)
+        for delta in self.replies.pop(0):
+            yield delta
+
+
+class FakeSearchModel:
+    async def search(self, query):
+        return {"content": "Hanoi is sunny tomorrow"}
+
+
+class FakeKnowledgeMemory:
+    def __init__(self):
+        self.query_embeddings = []
+
+    async def query_knowledge(self, query, n_results=5, query_embedding=None):
+        self.query_embeddings.append(query_embedding)
+        return []
+
+
+def collect(workflow, message):
+    async def run():
+        return [event async for event in workflow.stream_chat({
+            "messages": [{"role": "user", "content": message}],
+            "context": {},
+            "query_embedding": [0.1, 0.2]
+        })]
+    return asyncio.run(run())
+
+
+def make_workflow(replies):
+    workflow = ChatWorkflow(FakeOpenAIChat(replies), FakePersonality(), FakeKnowledgeMemory())
+    workflow.search_model = FakeSearchModel()
+    return workflow
+
+
+def test_stream_chat_yields_deltas():
+    workflow = make_workflow([["Hello", " there", "!"]])
+    events = collect(workflow, "hi")
+
+    deltas = [e["content"] for e in events if e["type"] == "delta"]
+    assert deltas == ["Hello", " there", "!"]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["response"]["response"] == "Hello there!"
+    assert events[-1]["searched"] is False
+
+
+def test_stream_chat_falls_back_to_search():
+    workflow = make_workflow([["i ", "don't", " know"], ["It is", " sunny."]])
+    events = collect(workflow, "weather tomorrow?")
+
+    deltas = [e["content"] for e in events if e["type"] == "delta"]
+    assert "".join(deltas) == "It is sunny."
+    assert events[-1]["searched"] is True
+    assert events[-1]["search_results"]["content"] == "Hanoi is sunny tomorrow"
+    assert "Hanoi is sunny tomorrow" in workflow.openai_chat.calls[1][-1]["content"]
+    # The turn's precomputed embedding is reused for the knowledge base lookup
+    assert workflow.knowledge_memory.query_embeddings == [[0.1, 0.2]]
+
+
+def test_persona_prompt_is_rendered_once_per_config_version():
+    workflow = make_workflow([["Hi"], ["Hi"], ["Hi"]])
+    renders = []
+    workflow.personality.generate_prompt = lambda: renders.append(1) or "You are Luna."
+    collect(workflow, "hello")
+    collect(workflow, "hello again")
+    assert len(renders) == 1
+    assert workflow.openai_chat.calls[0][0] == workflow.openai_chat.calls[1][0]
+
+    workflow.set_personality(FakePersonality(), "v2")
+    collect(workflow, "hello")
+    assert workflow.persona_prompt.version == "v2"
+
+
+def test_prefix_stable_layout_keeps_context_after_the_persona(monkeypatch):
+    monkeypatch.setattr(get_settings(), "PROMPT_LAYOUT", "prefix_stable")
+    workflow = make_workflow([["i don't know"], ["It is sunny."]])
+    workflow.personality.generate_knowledge_preamble = lambda: "BACKGROUND KNOWLEDGE:\n- city: Hanoi"
+    collect(workflow, "weather tomorrow?")
+
+    first, second = workflow.openai_chat.calls
+    assert first[0] == second[0]
+    assert first[0]["content"].endswith("- city: Hanoi")
+    # Search results join the context message in front of the user's message
+    assert [message["role"] for message in second] == ["system", "system", "user"]
+    assert "Hanoi is sunny tomorrow" in second[1]["content"]
+
+
+def test_openai_chat_records_cached_prompt_tokens():
+    usage = SimpleNamespace(
+        prompt_tokens=1200, completion_tokens=20,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1024)
+    )
+
+    async def create(**kwargs):
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=SimpleNamespace(content="Hi"))])
+
+    chat = OpenAIChat()
+    chat.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    asyncio.run(chat.generate_response([{"role": "user", "content": "hi"}]))
+    asyncio.run(chat.generate_response([{"role": "user", "content": "hi"}]))
+    stats = chat.usage_stats()
+    assert stats["requests"] == 2 and stats["cached_tokens"] == 2048
+    assert stats["cache_hit_ratio"] == round(1024 / 1200, 3)
+
+
+def test_streaming_and_blocking_paths_share_the_fallback_predicate():
+    assert ChatWorkflow._needs_search("I don't know.")
+    assert not ChatWorkflow._needs_search("Sure, I don't know everything, but Hanoi is sunny.")
+    assert ChatWorkflow._could_be_fallback("i don")
+    assert not ChatWorkflow._could_be_fallback("Sure, I don't")
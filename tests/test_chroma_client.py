@@ -0,0 +1,58 @@
+import httpx
+import memory.chroma_client as chroma_client
+from memory.chroma_client import ChromaClientManager
+
+
+class FakeServer:
+    def __init__(self):
+        self._session = httpx.Client(headers={"User-Agent": "chroma"})
+
+
+class FakeClient:
+    def __init__(self, host, port):
+        self._server = FakeServer()
+        self.created = []
+
+    def get_or_create_collection(self, name, metadata=None):
+        self.created.append(name)
+        return {"name": name}
+
+
+def test_manager_shares_client_and_caches_collections(monkeypatch):
+    monkeypatch.setattr(chroma_client.chromadb, "HttpClient", FakeClient)
+    manager = ChromaClientManager("localhost", 8000, max_connections=7, collection_cache_size=2)
+
+    assert manager.get_client() is manager.get_client()
+    session = manager.get_client()._server._session
+    assert session.headers["User-Agent"] == "chroma"
+    assert session._transport._pool._max_connections == 7
+
+    manager.get_collection("a")
+    manager.get_collection("a")
+    manager.get_collection("b")
+    manager.get_collection("c")
+    manager.get_collection("a")
+    assert manager.get_client().created == ["a", "b", "c", "a"]
+
+
+def test_async_collection_runs_calls_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    monkeypatch.setattr(chroma_client.chromadb, "HttpClient", FakeClient)
+    manager = ChromaClientManager("localhost", 8000, max_workers=2)
+    threads = []
+
+    class Collection:
+        name = "c"
+
+        def query(self, **kwargs):
+            threads.append(threading.current_thread().name)
+            return kwargs
+
+    async def run():
+        collection = chroma_client.AsyncCollection(Collection(), manager)
+        return await collection.query(n_results=3)
+
+    assert asyncio.run(run()) == {"n_results": 3}
+    assert threads[0].startswith("chromadb")
@@ -0,0 +1,106 @@
+import asyncio
+import time
+import pytest
+import memory.conversation_memory as conversation_memory
+from memory.conversation_memory import SHARDED, ConversationMemory, SHARD_COLLECTION_PATTERN
+from scripts.migrate_conversations import parse_legacy_name
+
+
+class FakeCollection:
+    def __init__(self):
+        self.query_kwargs = None
+
+    async def query(self, **kwargs):
+        self.query_kwargs = kwargs
+        return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+
+def test_sessions_of_a_user_share_a_shard_and_are_filtered_by_metadata():
+    first = ConversationMemory("user_1", "agent-1", "s1", storage_mode=SHARDED)
+    second = ConversationMemory("user_1", "agent-1", "s2", storage_mode=SHARDED)
+    assert first.collection_name == second.collection_name
+    assert SHARD_COLLECTION_PATTERN.match(first.collection_name).group("agent_id") == "agent-1"
+
+    turn_id, _, metadata = first.build_turn("hi", "hello", {"timestamp": "t0"})
+    assert turn_id == "user_1_s1_t0"
+    assert metadata == {"timestamp": "t0", "user_id": "user_1", "session_id": "s1", "agent_id": "agent-1"}
+
+    first.collection = FakeCollection()
+    asyncio.run(first.get_relevant_history("hi", query_embedding=[0.1]))
+    assert first.collection.query_kwargs["where"] == {"$and": [{"user_id": "user_1"}, {"session_id": "s1"}]}
+
+
+def test_legacy_names_are_parsed_with_underscored_ids():
+    legacy = ConversationMemory("user_1", "agent_x", "sess_9", storage_mode="per_session")
+    turn_id, _, _ = legacy.build_turn("hi", "hello", {"timestamp": "2025-01-01T00:00:00+00:00"})
+    assert parse_legacy_name(legacy.collection_name, turn_id) == ("user_1", "sess_9", "agent_x")
+
+
+class ScoredCollection:
+    def __init__(self, turns):
+        self.turns = turns
+        self.query_kwargs = None
+
+    async def query(self, **kwargs):
+        self.query_kwargs = kwargs
+        return {
+            "documents": [[document for document, _, _ in self.turns]],
+            "metadatas": [[metadata for _, metadata, _ in self.turns]],
+            "distances": [[distance for _, _, distance in self.turns]]
+        }
+
+
+def test_recent_history_decays_old_turns_and_fits_the_token_budget(monkeypatch):
+    monkeypatch.setattr(conversation_memory, "count_tokens", lambda text: len(text.split()))
+    memory = ConversationMemory("user_1", "agent-1", "s1", storage_mode=SHARDED)
+    now = time.time()
+    memory.collection = ScoredCollection([
+        ("old but similar turn", {"created_at": now - 10 * 3600}, 0.05),
+        ("recent related turn", {"created_at": now - 60}, 0.3),
+        ("another recent related turn", {"created_at": now - 120}, 0.35),
+        ("recent unrelated turn", {"created_at": now - 10}, 0.7),
+    ])
+
+    history = asyncio.run(memory.get_recent_relevant_history(
+        "hi", token_budget=7, query_embedding=[0.1], window=3600 * 24, half_life=3600
+    ))
+
+    # The old turn decays below both recent ones, which fill the budget, and the unrelated one is dropped
+    assert [turn["conversation"] for turn in history] == ["another recent related turn", "recent related turn"]
+    where = memory.collection.query_kwargs["where"]["$and"]
+    assert where[:2] == [{"user_id": "user_1"}, {"session_id": "s1"}]
+    assert where[2]["created_at"]["$gte"] == pytest.approx(now - 3600 * 24, abs=5)
+
+
+class WindowedCollection:
+    """Turns stored before created_at was recorded, so only an unfiltered query finds them"""
+
+    def __init__(self, turns):
+        self.turns = turns
+        self.queries = []
+
+    async def query(self, **kwargs):
+        self.queries.append(kwargs)
+        turns = [] if "created_at" in str(kwargs.get("where")) else self.turns
+        return {
+            "documents": [[document for document, _ in turns]],
+            "metadatas": [[metadata for _, metadata in turns]],
+            "distances": [[0.2 for _ in turns]]
+        }
+
+
+def test_recent_history_falls_back_to_turns_without_created_at(monkeypatch):
+    monkeypatch.setattr(conversation_memory, "count_tokens", lambda text: len(text.split()))
+    memory = ConversationMemory("user_1", "agent-1", "s1", storage_mode=SHARDED)
+    memory.collection = WindowedCollection([
+        ("later turn", {"timestamp": "2025-01-01T00:05:00+00:00"}),
+        ("earlier turn", {"timestamp": "2025-01-01T00:00:00+00:00"}),
+    ])
+
+    history = asyncio.run(memory.get_recent_relevant_history(
+        "hi", token_budget=100, query_embedding=[0.1], window=3600, half_life=3600
+    ))
+
+    assert len(memory.collection.queries) == 2
+    assert memory.collection.queries[1]["where"] == {"$and": [{"user_id": "user_1"}, {"session_id": "s1"}]}
+    assert [turn["conversation"] for turn in history] == ["earlier turn", "later turn"]
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from memory.conversation_memory import ConversationMemory
+from memory.conversation_write_buffer import ConversationWriteBuffer
+
+
+class FakeMemory(ConversationMemory):
+    def __init__(self, session_id, fail=False):
+        super().__init__("user", "agent", session_id)
+        self.writes = []
+        self.fail = fail
+
+    async def store_turns(self, turns):
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("chroma down")
+        self.writes.append([turn_id for turn_id, _, _ in turns])
+
+
+def test_turns_are_grouped_per_collection_and_flushed_on_size_and_time():
+    async def run():
+        buffer = ConversationWriteBuffer(max_batch_size=3, max_wait=0.01)
+        first, second = FakeMemory("s1"), FakeMemory("s2")
+        futures = [buffer.submit(first, f"m{i}", "r", {"timestamp": f"t{i}"}) for i in range(4)]
+        futures.append(buffer.submit(second, "m", "r", {"timestamp": "t"}))
+        await asyncio.gather(*futures)
+        return buffer, first, second
+
+    buffer, first, second = asyncio.run(run())
+    assert first.writes == [["s1_t0", "s1_t1", "s1_t2"], ["s1_t3"]]
+    assert second.writes == [["s2_t"]]
+    assert buffer.stats()["batches"] == 3
+
+
+def test_flush_writes_pending_turns_and_failures_reach_callers():
+    async def run():
+        buffer = ConversationWriteBuffer(max_batch_size=100, max_wait=60)
+        memory, broken = FakeMemory("s1"), FakeMemory("s2", fail=True)
+        ok = buffer.submit(memory, "m", "r", {"timestamp": "t"})
+        failed = buffer.submit(broken, "m", "r", {"timestamp": "t"})
+        await buffer.close()
+        await ok
+        with pytest.raises(RuntimeError):
+            await failed
+        return buffer, memory
+
+    buffer, memory = asyncio.run(run())
+    assert memory.writes == [["s1_t"]]
+    assert buffer.stats()["turns_failed"] == 1
+
+
+def test_immediate_turn_skips_the_flush_window():
+    async def run():
+        buffer = ConversationWriteBuffer(max_batch_size=100, max_wait=60)
+        memory = FakeMemory("s1")
+        await asyncio.wait_for(buffer.submit(memory, "m", "r", {"timestamp": "t"}, immediate=True), 1)
+        return memory
+
+    assert asyncio.run(run()).writes == [["s1_t"]]
+
+
+def test_batch_rpc_journals_turns_in_groups():
+    from services.vector_store_service_impl import VectorStoreServiceImpl
+
+    class FakeWriter:
+        def __init__(self):
+            self.groups = []
+
+        async def submit_many(self, turns):
+            messages = [turn[3] for turn in turns]
+            if "bad" in messages:
+                raise RuntimeError("spool full")
+            self.groups.append(messages)
+            return asyncio.ensure_future(asyncio.sleep(0))
+
+    class Request:
+        def __init__(self, message):
+            self.user_id, self.agent_id, self.session_id = "user", "agent", "s1"
+            self.message, self.response = message, "r"
+            self.metadata = type("Metadata", (), {"timestamp": "t"})()
+
+    async def run():
+        service = VectorStoreServiceImpl()
+        service.writer = FakeWriter()
+        service.batch_size = 2
+        service.max_in_flight = 2
+
+        async def requests():
+            for message in ["m0", "m1", "bad", "m2", "m3"]:
+                yield Request(message)
+
+        response = await service.StoreConversationBatch(requests(), None)
+        return response, service.writer
+
+    response, writer = asyncio.run(run())
+    assert not response.success and response.stored == 3 and response.failed == 2
+    assert writer.groups == [["m0", "m1"], ["m3"]]
@@ -0,0 +1,135 @@
+import asyncio
+import json
+from memory.conversation_writer import ConversationWriteBehind, SpoolJournal
+
+
+class FakeBuffer:
+    max_batch_size = 256
+
+    def __init__(self, fail=False):
+        self.stored = []
+        self.flushes = 0
+        self.fail = fail
+
+    def submit(self, memory, message, response, metadata, immediate=False):
+        self.flushes += immediate
+        future = asyncio.get_running_loop().create_future()
+        if self.fail:
+            future.set_exception(RuntimeError("chroma down"))
+        else:
+            self.stored.append((memory.session_id, message, metadata["timestamp"]))
+            future.set_result(None)
+        return future
+
+    async def close(self):
+        pass
+
+
+def make_writer(path, buffer):
+    return ConversationWriteBehind(SpoolJournal(str(path)), buffer=buffer, max_pending=2, workers=2, max_retries=0)
+
+
+def test_close_drains_queue_and_empties_spool(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    buffer = FakeBuffer()
+
+    async def run():
+        writer = make_writer(spool, buffer)
+        for i in range(5):
+            await writer.submit("user", "agent", "s1", f"m{i}", "r", {"timestamp": f"t{i}"})
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert sorted(message for _, message, _ in buffer.stored) == [f"m{i}" for i in range(5)]
+    assert writer.stats()["persisted"] == 5
+    assert spool.read_text() == ""
+
+
+def test_failed_turns_are_dead_lettered_and_acknowledged(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+
+    async def run():
+        writer = make_writer(spool, FakeBuffer(fail=True))
+        await writer.submit("user", "agent", "s1", "m0", "r", {"timestamp": "t0"})
+        await writer.submit("user", "agent", "s1", "m1", "r", {"timestamp": "t1"})
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.stats()["dead_lettered"] == 2
+    assert spool.read_text() == ""
+    dead = [json.loads(line) for line in (tmp_path / "spool.jsonl.dead").read_text().splitlines()]
+    assert [entry["record"]["message"] for entry in dead] == ["m0", "m1"]
+    assert dead[0]["error"] == "chroma down"
+
+
+def test_unpersisted_turns_are_replayed_on_start(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+
+    async def crash_then_replay():
+        # Journaled but never persisted, as after a crash
+        crashed = SpoolJournal(str(spool))
+        await crashed.recover()
+        await crashed.append_many([{
+            "user_id": "user", "agent_id": "agent", "session_id": "s1",
+            "message": "m0", "response": "r", "metadata": {"timestamp": "t0"}
+        }])
+        await crashed.close()
+
+        buffer = FakeBuffer()
+        writer = make_writer(spool, buffer)
+        await writer.start()
+        await writer.close()
+        return writer, buffer
+
+    writer, buffer = asyncio.run(crash_then_replay())
+    assert writer.stats()["replayed"] == 1
+    assert buffer.stored == [("s1", "m0", "t0")]
+    assert json.loads((tmp_path / "spool.jsonl.offset").read_text()) == 1
+
+
+def test_bulk_submit_journals_once_and_writes_each_collection_together(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    buffer = FakeBuffer()
+
+    async def run():
+        writer = make_writer(spool, buffer)
+        turns = [("user", "agent", f"s{i % 2}", f"m{i}", "r", {"timestamp": f"t{i}"}) for i in range(6)]
+        task = await writer.submit_many(turns)
+        journaled = len(spool.read_text().splitlines())
+        await task
+        await writer.close()
+        return writer, journaled
+
+    writer, journaled = asyncio.run(run())
+    assert journaled == 6
+    assert sorted(message for _, message, _ in buffer.stored) == [f"m{i}" for i in range(6)]
+    # One flush per session collection, not one per turn
+    assert buffer.flushes == 2
+    assert writer.stats()["persisted"] == 6
+    assert spool.read_text() == ""
+
+
+def test_spool_offset_is_written_once_per_commit_interval(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    offset = tmp_path / "spool.jsonl.offset"
+
+    async def run():
+        journal = SpoolJournal(str(spool), commit_interval=0.05)
+        await journal.recover()
+        seqs = await journal.append_many([{"n": i} for i in range(3)])
+        for seq in seqs[:2]:
+            await journal.ack_many([seq])
+        written_early = offset.exists()
+        await asyncio.sleep(0.1)
+        committed = offset.read_text()
+        await journal.ack_many(seqs[2:])
+        await journal.close()
+        return written_early, committed
+
+    written_early, committed = asyncio.run(run())
+    assert not written_early
+    assert committed == "2"
+    assert offset.read_text() == "3"
+    assert spool.read_text() == ""
@@ -0,0 +1,112 @@
+import asyncio
+import httpx
+import pytest
+from openai import BadRequestError
+from types import SimpleNamespace
+import models.embedding_models as embedding_models
+from models.embedding_models import EmbeddingBatcher
+from memory.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture(autouse=True)
+def char_tokenizer(monkeypatch):
+    # One token per character keeps the tests independent of tiktoken downloads
+    tokenizer = SimpleNamespace(encode=lambda text: list(text), decode=lambda tokens: "".join(tokens))
+    monkeypatch.setattr(embedding_models.tiktoken, "get_encoding", lambda name: tokenizer)
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, model, input):
+        self.requests.append(list(input))
+        await asyncio.sleep(0)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+
+def make_batcher(**kwargs):
+    embeddings = FakeEmbeddings()
+    client = SimpleNamespace(embeddings=embeddings)
+    return EmbeddingBatcher(client=client, cache=EmbeddingCache(max_size=100), **kwargs), embeddings
+
+
+def test_concurrent_calls_are_coalesced_into_one_request():
+    async def run():
+        batcher, embeddings = make_batcher(max_wait=0.01)
+        results = await asyncio.gather(
+            batcher.embed(["a"]),
+            batcher.embed(["bb", "ccc"]),
+            batcher.embed(["a"]),
+        )
+        return batcher, embeddings, results
+
+    batcher, embeddings, results = asyncio.run(run())
+    assert results == [[[1.0]], [[2.0], [3.0]], [[1.0]]]
+    assert embeddings.requests == [["a", "bb", "ccc"]]
+    assert batcher.stats()["requests"] == 1
+
+
+def test_batches_are_split_by_size_and_cached_texts_skip_the_api():
+    async def run():
+        batcher, embeddings = make_batcher(max_batch_size=2, max_wait=0.01)
+        first = await batcher.embed(["one", "two", "three"])
+        second = await batcher.embed(["two", "four"])
+        return embeddings, first, second
+
+    embeddings, first, second = asyncio.run(run())
+    assert first == [[3.0], [3.0], [5.0]]
+    assert second == [[3.0], [4.0]]
+    assert embeddings.requests == [["one", "two"], ["three"], ["four"]]
+
+
+def test_batches_are_split_by_token_budget():
+    async def run():
+        batcher, embeddings = make_batcher(max_batch_tokens=5, max_wait=0.01)
+        await asyncio.gather(batcher.embed(["abc"]), batcher.embed(["de"]), batcher.embed(["fgh"]))
+        return embeddings
+
+    embeddings = asyncio.run(run())
+    assert embeddings.requests == [["abc", "de"], ["fgh"]]
+
+
+def test_batch_failure_is_raised_to_every_caller():
+    class FailingEmbeddings:
+        async def create(self, model, input):
+            raise RuntimeError("rate limited")
+
+    async def run():
+        batcher = EmbeddingBatcher(client=SimpleNamespace(embeddings=FailingEmbeddings()))
+        return await asyncio.gather(batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all("rate limited" in str(result) for result in results)
+
+
+def test_rejected_input_fails_only_its_caller_and_long_inputs_are_cut(monkeypatch):
+    monkeypatch.setattr(embedding_models, "MAX_INPUT_TOKENS", 4)
+
+    class StrictEmbeddings(FakeEmbeddings):
+        async def create(self, model, input):
+            if "bad" in input:
+                response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+                raise BadRequestError("invalid input", response=response, body=None)
+            return await super().create(model, input)
+
+    async def run():
+        embeddings = StrictEmbeddings()
+        batcher = EmbeddingBatcher(client=SimpleNamespace(embeddings=embeddings), max_wait=0.01)
+        results = await asyncio.gather(
+            batcher.embed(["a"]), batcher.embed(["bad"]), batcher.embed(["cc"]), batcher.embed(["longtext"]),
+            batcher.embed([""]), return_exceptions=True
+        )
+        return embeddings, results
+
+    embeddings, results = asyncio.run(run())
+    assert results[0] == [[1.0]] and results[2] == [[2.0]]
+    assert "invalid input" in str(results[1])
+    assert "empty" in str(results[4])
+    # Cut to the token limit before it is sent
+    assert results[3] == [[4.0]]
+    assert any("long" in request for request in embeddings.requests)
+    assert not any("longtext" in request for request in embeddings.requests)
@@ -0,0 +1,58 @@
+import asyncio
+import numpy as np
+from memory.embedding_cache import EmbeddingCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        self.redis.data.update(self.ops)
+
+
+def test_embedding_cache_normalizes_and_uses_both_tiers():
+    fake_redis = FakeRedis()
+
+    async def run():
+        writer = EmbeddingCache(max_size=10, redis_client=fake_redis)
+        await writer.set("m", "xin  chào\n", [0.5, 0.25])
+        assert await writer.get("m", "xin chào") == [0.5, 0.25]
+        assert await writer.get("other-model", "xin chào") is None
+
+        # A fresh process only has the Redis tier
+        reader = EmbeddingCache(max_size=10, redis_client=fake_redis)
+        first = await reader.get_many("m", ["xin chào", "tạm biệt"])
+        second = await reader.get("m", "xin chào")
+        return writer, reader, first, second
+
+    writer, reader, first, second = asyncio.run(run())
+    assert first == [[0.5, 0.25], None]
+    assert second == [0.5, 0.25]
+    stored = next(iter(fake_redis.data.values()))
+    assert np.frombuffer(stored, dtype=np.float32).tolist() == [0.5, 0.25]
+    assert writer.stats()["memory_hits"] == 1
+    assert reader.stats() == {
+        "size": 1, "memory_hits": 1, "redis_hits": 1, "misses": 1, "hit_rate": 2 / 3
+    }
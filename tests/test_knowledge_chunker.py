@@ -0,0 +1,48 @@
+import random
+import re
+import memory.knowledge_memory as knowledge_memory
+from memory.knowledge_memory import KnowledgeMemory
+from scripts.benchmark_chunker import legacy_chunk_text
+
+
+class WordTokenizer:
+    """Word/punctuation tokenizer standing in for tiktoken in tests"""
+
+    def __init__(self):
+        self.vocab = {}
+        self.pieces = []
+
+    def encode(self, text):
+        tokens = []
+        for piece in re.findall(r"\s*\w+|\s*[^\w\s]|\s+", text):
+            if piece not in self.vocab:
+                self.vocab[piece] = len(self.pieces)
+                self.pieces.append(piece)
+            tokens.append(self.vocab[piece])
+        return tokens
+
+    def decode(self, tokens):
+        return "".join(self.pieces[token] for token in tokens)
+
+
+def make_memory(monkeypatch, **kwargs):
+    monkeypatch.setattr(knowledge_memory.tiktoken, "get_encoding", lambda name: WordTokenizer())
+    return KnowledgeMemory("test", **kwargs)
+
+
+def test_fast_chunker_matches_legacy_chunker(monkeypatch):
+    rng = random.Random(1)
+    words = ["robot", "cat", "Nobita", "gadget", "future", "friend", "Doraemon"]
+    text = "".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(3, 15))) + rng.choice([". ", "? ", "! ", "\n", ", "])
+        for _ in range(400)
+    )
+
+    for max_tokens, overlap_tokens in [(50, 10), (20, 0), (30, 29), (500, 50)]:
+        memory = make_memory(monkeypatch, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        assert memory._chunk_text(text) == legacy_chunk_text(memory, text)
+
+
+def test_fast_chunker_handles_empty_text(monkeypatch):
+    memory = make_memory(monkeypatch)
+    assert memory._chunk_text("") == []
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import pytest
+import memory.knowledge_memory as knowledge_memory
+from memory.knowledge_memory import KnowledgeMemory
+from tests.test_knowledge_chunker import WordTokenizer
+
+
+class FakeCollection:
+    def __init__(self, fail_after=None):
+        self.records = {}
+        self.calls = 0
+        self.fail_after = fail_after
+
+    async def upsert(self, ids, embeddings, documents, metadatas):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("upsert failed")
+        for id_, document, metadata in zip(ids, documents, metadatas):
+            self.records[id_] = (document, metadata)
+
+    async def get(self, include, limit, offset):
+        ids = sorted(self.records)[offset:offset + limit]
+        return {"ids": ids, "metadatas": [self.records[id_][1] for id_ in ids]}
+
+    async def delete(self, ids):
+        for id_ in ids:
+            del self.records[id_]
+
+    async def count(self):
+        return len(self.records)
+
+
+def make_memory(monkeypatch, collection):
+    monkeypatch.setattr(knowledge_memory.tiktoken, "get_encoding", lambda name: WordTokenizer())
+    memory = KnowledgeMemory("test", max_tokens=8, overlap_tokens=2)
+    memory.collection = collection
+
+    async def generate_embeddings(texts):
+        return [[float(len(text))] for text in texts]
+
+    memory.generate_embeddings = generate_embeddings
+    return memory
+
+
+def make_entries(count):
+    return [
+        {"id": f"doc{i}", "text": f"Entry {i} talks about robots. It has a second sentence too.", "metadata": {"tags": ["a", "b"]}}
+        for i in range(count)
+    ]
+
+
+def test_ingest_streams_pages_and_reports_stats(monkeypatch, tmp_path):
+    collection = FakeCollection()
+    memory = make_memory(monkeypatch, collection)
+    source = tmp_path / "knowledge.jsonl"
+    source.write_text("\n".join(json.dumps(entry) for entry in make_entries(20)))
+
+    stats = asyncio.run(memory.load_knowledge_base(str(source), chunk_workers=0))
+
+    expected = sum(len(memory.build_chunk_records(entry)) for entry in make_entries(20))
+    assert stats["entries"] == 20
+    assert stats["chunks"] == expected == len(collection.records)
+    assert collection.records["doc3_chunk_0"][1]["tags"] == "a,b"
+
+
+def test_ingest_resumes_from_checkpoint(monkeypatch, tmp_path):
+    checkpoint = tmp_path / "ingest.json"
+    failing = FakeCollection(fail_after=1)
+    memory = make_memory(monkeypatch, failing)
+    with pytest.raises(Exception):
+        asyncio.run(memory.load_knowledge_base(make_entries(200), checkpoint_path=str(checkpoint), chunk_workers=0))
+
+    done = json.loads(checkpoint.read_text())["entries_done"]
+    assert 0 < done < 200
+
+    collection = FakeCollection()
+    memory.collection = collection
+    stats = asyncio.run(memory.load_knowledge_base(make_entries(200), checkpoint_path=str(checkpoint), chunk_workers=0))
+
+    assert stats["skipped_entries"] == done
+    assert stats["entries"] == 200 - done
+    assert f"doc{done}_chunk_0" in collection.records
+    assert json.loads(checkpoint.read_text())["entries_done"] == 200
+
+
+def test_sync_only_embeds_changed_entries_and_deletes_orphans(monkeypatch):
+    collection = FakeCollection()
+    memory = make_memory(monkeypatch, collection)
+    entries = make_entries(5)
+    asyncio.run(memory.sync_knowledge_base(entries, chunk_workers=0))
+    before = dict(collection.records)
+
+    embedded = []
+    original_embed = memory.generate_embeddings
+
+    async def tracking_embeddings(texts):
+        embedded.extend(texts)
+        return await original_embed(texts)
+
+    memory.generate_embeddings = tracking_embeddings
+    entries[1]["text"] = "Short now."
+    del entries[4]
+    stats = asyncio.run(memory.sync_knowledge_base(entries, chunk_workers=0))
+
+    assert stats["unchanged_entries"] == 3
+    assert stats["changed_entries"] == 1
+    assert stats["removed_entries"] == 1
+    new_chunks = memory.build_chunk_records(entries[1])
+    assert embedded == [record["document"] for record in new_chunks]
+    assert sorted(id_ for id_ in collection.records if id_.startswith("doc1_")) == sorted(record["id"] for record in new_chunks)
+    assert not any(id_.startswith("doc4_") for id_ in collection.records)
+    assert collection.records["doc0_chunk_0"] == before["doc0_chunk_0"]
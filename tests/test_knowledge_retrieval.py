@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import numpy as np
+import memory.knowledge_memory as knowledge_memory
+from memory.knowledge_memory import KnowledgeMemory
+from memory.local_vector_store import LocalVectorStore
+from memory.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from tests.test_knowledge_chunker import WordTokenizer
+
+
+def noise_embedding(text):
+    """Embeddings unrelated to meaning, so only the lexical index can find exact terms"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "big")
+    return np.random.default_rng(seed).normal(size=8).tolist()
+
+
+class FakeRedisStore:
+    """Knowledge versions shared by every KnowledgeMemory of a test"""
+
+    def __init__(self):
+        self.values = {}
+        self.redis = self
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+def make_memory(monkeypatch, redis_store=None):
+    monkeypatch.setattr(knowledge_memory.tiktoken, "get_encoding", lambda name: WordTokenizer())
+    redis_store = redis_store or FakeRedisStore()
+    monkeypatch.setattr(knowledge_memory, "get_redis_store", lambda: redis_store)
+    memory = KnowledgeMemory("kb", max_tokens=50, overlap_tokens=5)
+
+    async def generate_embeddings(texts):
+        return [noise_embedding(text) for text in texts]
+
+    memory.generate_embeddings = generate_embeddings
+    return memory
+
+
+def test_lexical_index_folds_vietnamese_accents_and_keeps_codes_whole():
+    index = LexicalIndex()
+    index.add("a", "Giá phở bò tại Hà Nội")
+    index.add("b", "Mã sản phẩm SKU-12.5 còn hàng")
+    index.add("c", "Mã SKU-13 đã hết")
+    assert index.search("pho bo ha noi", 1)[0][0] == "a"
+    assert index.search("pho bo ha noi", 1)[0][2] == 1.0
+    doc_id, _, coverage = index.search("SKU-12.5", 1)[0]
+    assert doc_id == "b" and coverage == 1.0
+
+
+def test_equal_scores_rank_by_id_whatever_the_insertion_order():
+    ids = ["c", "a", "d", "b"]
+    index, reversed_index = LexicalIndex(), LexicalIndex()
+    for doc_id in ids:
+        index.add(doc_id, "same words here")
+    for doc_id in reversed(ids):
+        reversed_index.add(doc_id, "same words here")
+    assert [hit[0] for hit in index.search("same words", 4)] == ["a", "b", "c", "d"]
+    assert index.search("same words", 4) == reversed_index.search("same words", 4)
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([["b", "a"], ["a", "b"]])] == ["a", "b"]
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c", "d"], ["d", "b"]])
+    assert [doc_id for doc_id, _ in fused] == ["b", "d", "a", "c"]
+
+
+def test_query_knowledge_fuses_exact_matches_into_dense_results(monkeypatch):
+    memory = make_memory(monkeypatch)
+    entries = [
+        {"id": f"doc{i}", "text": f"General note number {i} about gadgets and robots.", "metadata": {}}
+        for i in range(30)
+    ]
+    entries.append({"id": "code", "text": "The Anywhere Door has product code DX-4471.", "metadata": {"kind": "product"}})
+
+    async def run():
+        memory.collection = await LocalVectorStore().collection("kb", {"hnsw:space": "cosine"})
+        await memory.load_knowledge_base(entries, chunk_workers=0)
+        return await memory.query_knowledge("What is DX-4471?", n_results=3)
+
+    results = asyncio.run(run())
+    exact = [result for result in results if "DX-4471" in result["content"]]
+    assert len(exact) == 1
+    assert exact[0]["metadata"]["kind"] == "product"
+    assert exact[0]["lexical_score"] == 1.0
+    assert isinstance(exact[0]["relevance_score"], float)
+    assert all(result["lexical_score"] == 0.0 for result in results if result is not exact[0])
+
+
+def test_query_knowledge_fetches_until_distinct_entries_and_merges_chunks(monkeypatch):
+    memory = make_memory(monkeypatch)
+    monkeypatch.setattr(knowledge_memory.settings, "KNOWLEDGE_FETCH_FACTOR", 1)
+    monkeypatch.setattr(knowledge_memory.settings, "KNOWLEDGE_PASSAGE_MAX_TOKENS", 100)
+    # "comet" in the middle makes one chunk the clear best hit, dense and lexical
+    words = " ".join(f"zephyr{i % 7} w{i}." if i != 60 else "comet w60." for i in range(120))
+    entries = [{"id": "long", "text": words, "metadata": {}}]
+    entries += [
+        {"id": f"doc{i}", "text": f"Zephyr{i} short note {i} about kites.", "metadata": {}}
+        for i in range(5)
+    ]
+
+    async def run():
+        memory.collection = await LocalVectorStore().collection("kb", {"hnsw:space": "cosine"})
+        await memory.load_knowledge_base(entries, chunk_workers=0)
+        return await memory.query_knowledge("comet zephyr0 zephyr1 zephyr2 zephyr3 zephyr4", n_results=3)
+
+    async def generate_embeddings(texts):
+        return [[10.0 * ("comet" in text)] + noise_embedding(text) for text in texts]
+
+    memory.generate_embeddings = generate_embeddings
+
+    results = asyncio.run(run())
+    assert len(results) == 3
+    long = [result for result in results if "zephyr" in result["content"]]
+    assert len(long) == 1
+    passage = long[0]
+    assert "comet" in passage["content"]
+    assert 50 < passage["metadata"]["token_count"] <= 100
+    assert passage["metadata"]["end_pos"] - passage["metadata"]["start_pos"] == passage["metadata"]["token_count"]
+    # Overlapping text is joined once, so the passage reads as one run of the document
+    assert passage["content"] in words
+
+
+def test_lexical_index_follows_changes_made_by_other_processes(monkeypatch):
+    monkeypatch.setattr(knowledge_memory.settings, "KNOWLEDGE_LEXICAL_CHECK_INTERVAL", 0)
+    redis_store = FakeRedisStore()
+    reader = make_memory(monkeypatch, redis_store)
+    writer = make_memory(monkeypatch, redis_store)
+    notes = [{"id": f"doc{i}", "text": f"General note number {i} about kites.", "metadata": {}} for i in range(10)]
+
+    async def codes(memory):
+        results = await memory.query_knowledge("DX-4471 ZQ-9", n_results=3)
+        return [result["content"] for result in results if result["lexical_score"] > 0]
+
+    async def run():
+        collection = await LocalVectorStore().collection("kb", {"hnsw:space": "cosine"})
+        reader.collection = writer.collection = collection
+        await writer.load_knowledge_base(
+            notes + [{"id": "old", "text": "Retired product code DX-4471.", "metadata": {}}],
+            chunk_workers=0
+        )
+        await reader._refresh_lexical_index()
+        before = await codes(reader)
+        # Same chunk count, different content: only the version shows the change
+        await writer.sync_knowledge_base(
+            notes + [{"id": "new", "text": "Current product code ZQ-9.", "metadata": {}}],
+            chunk_workers=0
+        )
+        await reader._refresh_lexical_index()
+        after = await codes(reader)
+        return before, after
+
+    before, after = asyncio.run(run())
+    assert before == ["Retired product code DX-4471."]
+    assert after == ["Current product code ZQ-9."]
+
+
+def test_queries_use_dense_hits_until_the_lexical_index_is_built(monkeypatch):
+    writer = make_memory(monkeypatch)
+    reader = make_memory(monkeypatch)
+    entries = [{"id": f"doc{i}", "text": f"General note number {i} about kites.", "metadata": {}} for i in range(30)]
+    entries.append({"id": "code", "text": "Product code DX-4471.", "metadata": {}})
+
+    async def run():
+        collection = await LocalVectorStore().collection("kb", {"hnsw:space": "cosine"})
+        reader.collection = writer.collection = collection
+        await writer.load_knowledge_base(entries, chunk_workers=0)
+        first = await reader.query_knowledge("DX-4471", n_results=3)
+        await reader._lexical_task
+        second = await reader.query_knowledge("DX-4471", n_results=3)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert all(result["lexical_score"] == 0.0 for result in first)
+    assert any(result["lexical_score"] > 0 and "DX-4471" in result["content"] for result in second)
+
+
+def test_lexical_hits_deleted_from_the_collection_are_dropped(monkeypatch):
+    memory = make_memory(monkeypatch)
+    entries = [{"id": f"doc{i}", "text": f"General note number {i} about kites.", "metadata": {}} for i in range(10)]
+    entries.append({"id": "code", "text": "Product code DX-4471.", "metadata": {}})
+
+    async def run():
+        memory.collection = await LocalVectorStore().collection("kb", {"hnsw:space": "cosine"})
+        await memory.load_knowledge_base(entries, chunk_workers=0)
+        await memory.query_knowledge("DX-4471", n_results=3)
+        # Deleted behind the index's back, as by another process
+        await memory.collection.delete(where={"original_id": "code"})
+        return await memory.query_knowledge("DX-4471", n_results=3)
+
+    results = asyncio.run(run())
+    assert all("DX-4471" not in result["content"] for result in results)
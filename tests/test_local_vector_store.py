@@ -0,0 +1,93 @@
+import asyncio
+import numpy as np
+from memory.local_vector_store import LocalVectorStore
+
+
+def test_query_matches_brute_force_and_honours_where():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+    query = rng.normal(size=16).astype(np.float32)
+
+    async def run():
+        collection = await LocalVectorStore().collection("c", {"hnsw:space": "cosine"})
+        await collection.add(
+            ids=[f"id{i}" for i in range(200)],
+            embeddings=vectors.tolist(),
+            documents=[f"doc{i}" for i in range(200)],
+            metadatas=[{"user_id": f"u{i % 4}"} for i in range(200)]
+        )
+        plain = await collection.query(query_embeddings=[query.tolist()], n_results=5)
+        filtered = await collection.query(query_embeddings=[query.tolist()], n_results=5, where={"user_id": "u1"})
+        return plain, filtered
+
+    plain, filtered = asyncio.run(run())
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    distances = 1 - normalized @ (query / np.linalg.norm(query))
+    assert plain["ids"][0] == [f"id{i}" for i in np.argsort(distances)[:5]]
+    assert np.allclose(plain["distances"][0], np.sort(distances)[:5], atol=1e-5)
+    assert filtered["ids"][0] == [f"id{i}" for i in np.argsort(distances) if i % 4 == 1][:5]
+    assert all(metadata["user_id"] == "u1" for metadata in filtered["metadatas"][0])
+
+
+def test_collections_persist_and_reload_memory_mapped(tmp_path):
+    async def write():
+        store = LocalVectorStore(path=str(tmp_path), save_interval=None)
+        collection = await store.collection("c", {"hnsw:space": "l2"})
+        await collection.upsert(ids=["a", "b", "c"], embeddings=[[0, 0], [1, 0], [5, 5]], documents=["A", "B", "C"], metadatas=[{"n": 1}, {"n": 2}, {"n": 3}])
+        await collection.delete(ids=["b"])
+        await collection.upsert(ids=["a"], embeddings=[[0, 1]], documents=["A2"], metadatas=[{"n": 4}])
+        store.close()
+
+    async def read():
+        collection = await LocalVectorStore(path=str(tmp_path)).collection("c")
+        loaded = collection._vectors
+        result = await collection.query(query_embeddings=[[0, 1]], n_results=2)
+        page = await collection.get(include=["metadatas"], limit=1, offset=1)
+        return loaded, result, page, await collection.count()
+
+    asyncio.run(write())
+    loaded, result, page, count = asyncio.run(read())
+    assert isinstance(loaded, np.memmap)
+    assert count == 2
+    assert result["ids"][0] == ["a", "c"]
+    assert result["documents"][0] == ["A2", "C"]
+    assert result["distances"][0][0] == 0
+    assert page["ids"] == ["c"] and page["metadatas"] == [{"n": 3}]
+
+
+def test_saves_during_writes_run_in_the_executor_on_a_copy(tmp_path):
+    async def write():
+        collection = await LocalVectorStore(path=str(tmp_path), save_interval=0).collection("c", {"hnsw:space": "l2"})
+        await collection.upsert(ids=["a"], embeddings=[[1, 0]], documents=["A"])
+        task = collection._save_task
+        # Changes made while the copy is written wait for the next save
+        await collection.upsert(ids=["b"], embeddings=[[0, 1]], documents=["B"])
+        await task
+        return collection._dirty
+
+    async def read():
+        collection = await LocalVectorStore(path=str(tmp_path)).collection("c")
+        return await collection.get(include=["documents"])
+
+    dirty = asyncio.run(write())
+    assert dirty
+    assert asyncio.run(read())["documents"] == ["A"]
+
+
+def test_least_recently_used_collections_are_saved_and_dropped(tmp_path):
+    async def run():
+        store = LocalVectorStore(path=str(tmp_path), save_interval=None, max_collections=1)
+        first = await store.collection("first")
+        await first.upsert(ids=["a"], embeddings=[[1, 0]], documents=["A"])
+        await store.collection("second")
+        evicted = "first" not in store._collections
+        # Still held here, so asking again returns the same object
+        same = await store.collection("first") is first
+        await store.collection("second")
+        del first
+        reloaded = await store.collection("first")
+        return evicted, same, await reloaded.get(include=["documents"])
+
+    evicted, same, result = asyncio.run(run())
+    assert evicted and same
+    assert result["documents"] == ["A"]
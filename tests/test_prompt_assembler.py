@@ -0,0 +1,64 @@
+from graphs.prompt_assembler import PromptAssembler, PromptSection
+from tests.test_knowledge_chunker import WordTokenizer
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_sections_are_funded_by_priority_and_keep_their_order():
+    assembler = PromptAssembler(40, encoder=WordTokenizer())
+    sections = [
+        PromptSection("persona", words("p", 10), priority=0, required=True),
+        PromptSection("recent_history", words("r", 20), priority=3, keep="tail"),
+        PromptSection("relevant_history", words("h", 10), priority=4),
+        PromptSection("search_results", words("s", 30), priority=1, max_tokens=15),
+    ]
+
+    messages, report = assembler.assemble(sections, reserved_tokens=5)
+
+    statuses = {section["name"]: (section["status"], section["tokens"]) for section in report["sections"]}
+    assert statuses == {
+        "persona": ("kept", 10),
+        "search_results": ("truncated", 15),
+        "recent_history": ("truncated", 10),
+        "relevant_history": ("dropped", 0),
+    }
+    assert report["total_tokens"] == 40
+    assert [message["content"].split()[0] for message in messages] == ["p0", "r10", "s0"]
+    assert messages[1]["content"].split()[-1] == "r19"
+    assert messages[2]["content"].split()[-1] == "s14"
+
+
+def test_untruncatable_section_that_does_not_fit_is_dropped():
+    assembler = PromptAssembler(5, encoder=WordTokenizer())
+    messages, report = assembler.assemble([PromptSection("persona", words("p", 10), priority=0, truncatable=False)])
+    assert messages == [] and report["sections"][0]["status"] == "dropped"
+
+
+def test_required_section_is_kept_and_others_give_way():
+    assembler = PromptAssembler(20, encoder=WordTokenizer())
+    sections = [
+        PromptSection("persona", words("p", 10), priority=0, required=True),
+        PromptSection("search_results", words("s", 10), priority=1),
+        PromptSection("recent_history", words("r", 10), priority=3),
+    ]
+
+    # The user's message alone takes most of the budget
+    messages, report = assembler.assemble(sections, reserved_tokens=15)
+
+    assert [section["status"] for section in report["sections"]] == ["kept", "dropped", "dropped"]
+    assert messages == [{"role": "system", "content": words("p", 10)}]
+    assert report["total_tokens"] == 25
+
+
+def test_units_are_truncated_at_their_boundaries():
+    assembler = PromptAssembler(17, encoder=WordTokenizer())
+    turns = [f"User: m{i} Assistant: r{i} " for i in range(4)]
+    section = PromptSection("recent_history", "".join(turns), priority=3, keep="tail", units=turns)
+
+    messages, report = assembler.assemble([section])
+
+    # Two whole turns of seven tokens fit; part of a third one is not kept
+    assert messages[0]["content"] == "".join(turns[-2:])
+    assert report["sections"][0] == {"name": "recent_history", "tokens": 14, "original_tokens": 28, "status": "truncated"}
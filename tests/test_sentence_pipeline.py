@@ -0,0 +1,48 @@
+import asyncio
+from utils.text_utils import SentenceSplitter
+from models.tts_models import SentenceTTSPipeline
+
+
+class FakeTTSModel:
+    def __init__(self):
+        self.started = []
+
+    async def generate_speech(self, text, **kwargs):
+        self.started.append(text)
+        # The first sentence is the slowest, later ones must still come out after it
+        await asyncio.sleep(0.05 if len(self.started) == 1 else 0.0)
+        return text.encode()
+
+
+def test_sentence_splitter_handles_partial_deltas():
+    splitter = SentenceSplitter(min_chars=5)
+    assert splitter.feed("Xin chào bạn") == []
+    assert splitter.feed(". Hôm nay trời ") == ["Xin chào bạn."]
+    assert splitter.feed("đẹp quá! Pi is 3.14") == ["Hôm nay trời đẹp quá!"]
+    assert splitter.flush() == "Pi is 3.14"
+    assert splitter.flush() is None
+
+
+def test_sentence_splitter_merges_short_sentences():
+    splitter = SentenceSplitter(min_chars=10)
+    assert splitter.feed("Hi! How are you today? ") == ["Hi! How are you today?"]
+
+
+def test_pipeline_starts_tts_before_stream_ends_and_keeps_order():
+    async def run():
+        tts = FakeTTSModel()
+        pipeline = SentenceTTSPipeline(tts, max_concurrency=2)
+        pipeline.feed("The first sentence is here. The second one")
+        await asyncio.sleep(0)
+        assert tts.started == ["The first sentence is here."]
+
+        pipeline.feed(" follows now. And a tail")
+        pipeline.close()
+        return [segment async for segment in pipeline.remaining_segments()]
+
+    segments = asyncio.run(run())
+    assert segments == [
+        b"The first sentence is here.",
+        b"The second one follows now.",
+        b"And a tail",
+    ]
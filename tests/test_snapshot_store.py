@@ -0,0 +1,133 @@
+import asyncio
+import numpy as np
+from memory.local_vector_store import LocalVectorStore
+from memory.snapshot_store import SnapshotStore
+
+
+async def synced(store):
+    await asyncio.gather(*store._sync_tasks.values())
+
+
+class FakeVersions:
+    """RedisStore stand-in holding the shared version counters"""
+
+    def __init__(self):
+        self.values = {}
+        self.redis = self
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+def test_hot_collections_are_snapshotted_and_caught_up_after_restart(tmp_path):
+    metadata = {"hnsw:space": "cosine"}
+    remote_path, snapshot_path = str(tmp_path / "remote"), str(tmp_path / "snapshots")
+    versions = FakeVersions()
+
+    async def first_run():
+        store = SnapshotStore(LocalVectorStore(path=remote_path), snapshot_path, versions=versions)
+        collection = await store.collection("conv", metadata)
+        await collection.upsert(ids=["a", "b"], embeddings=[[1, 0], [0, 1]], documents=["A", "B"], metadatas=[{"k": 1}, {"k": 2}])
+        remote_result = await collection.query(query_embeddings=[[1, 0.1]], n_results=1)
+        await synced(store)
+        # Written after seeding, so it must reach the replica by write-through
+        await collection.upsert(ids=["c"], embeddings=[[1, 1]], documents=["C"], metadatas=[{"k": 3}])
+        replica_result = await collection.query(query_embeddings=[[1, 1]], n_results=1)
+        store.close()
+        return remote_result, replica_result, collection.replica
+
+    async def other_process_writes():
+        remote = LocalVectorStore(path=remote_path)
+        collection = await remote.collection("conv")
+        await collection.upsert(ids=["d"], embeddings=[[0, 1]], documents=["D"], metadatas=[{"k": 4}])
+        await collection.upsert(ids=["b"], embeddings=[[-1, 0]], documents=["B2"], metadatas=[{"k": 5}])
+        await collection.delete(ids=["a"])
+        # As a write through another process's snapshot store does
+        await versions.incr("vector_version:conv")
+        remote.close()
+
+    async def second_run():
+        store = SnapshotStore(LocalVectorStore(path=remote_path), snapshot_path, versions=versions)
+        collection = await store.collection("conv", metadata)
+        mapped = isinstance(collection.replica._vectors, np.memmap)
+        # Changed since it was saved, so not read until it has caught up
+        served_before = collection._reader() is collection.replica
+        await synced(store)
+        served_after = collection._reader() is collection.replica
+        result = await collection.get(include=["documents"])
+        store.close()
+        return mapped, served_before, served_after, result
+
+    remote_result, replica_result, replica = asyncio.run(first_run())
+    assert remote_result["ids"] == [["a"]]
+    assert replica is not None and replica_result["ids"] == [["c"]]
+
+    asyncio.run(other_process_writes())
+    mapped, served_before, served_after, result = asyncio.run(second_run())
+    assert mapped and not served_before and served_after
+    assert dict(zip(result["ids"], result["documents"])) == {"b": "B2", "c": "C", "d": "D"}
+
+
+def test_cold_collections_keep_one_object_per_name(tmp_path):
+    async def run():
+        store = SnapshotStore(LocalVectorStore(), str(tmp_path), max_collections=1)
+        first = await store.collection("first")
+        await first.upsert(ids=["a"], embeddings=[[1, 0]], documents=["A"])
+        await first.query(query_embeddings=[[1, 0]], n_results=1)
+        await synced(store)
+        second = await store.collection("second")
+        await second.query(query_embeddings=[[1, 0]], n_results=1)
+        released = first.replica
+        again = await store.collection("first")
+        await again.query(query_embeddings=[[1, 0]], n_results=1)
+        await synced(store)
+        await asyncio.gather(*store._save_tasks)
+        store.close()
+        return first, again, released
+
+    first, again, released = asyncio.run(run())
+    assert again is first
+    assert released is None and first.replica is not None
+
+
+def test_unchanged_snapshots_are_served_at_once_after_restart(tmp_path):
+    remote_path, snapshot_path = str(tmp_path / "remote"), str(tmp_path / "snapshots")
+    versions = FakeVersions()
+
+    async def first_run():
+        store = SnapshotStore(LocalVectorStore(path=remote_path), snapshot_path, versions=versions)
+        collection = await store.collection("conv")
+        await collection.upsert(ids=["a"], embeddings=[[1, 0]], documents=["A"])
+        await collection.query(query_embeddings=[[1, 0]], n_results=1)
+        await synced(store)
+        # Written through this store, so the replica still matches afterwards
+        await collection.upsert(ids=["b"], embeddings=[[0, 1]], documents=["B"])
+        store.close()
+
+    async def second_run():
+        remote = LocalVectorStore(path=remote_path)
+        store = SnapshotStore(remote, snapshot_path, versions=versions)
+        collection = await store.collection("conv")
+        pages = []
+        get = collection.remote.get
+
+        async def counting_get(**kwargs):
+            pages.append(kwargs)
+            return await get(**kwargs)
+
+        collection.remote.get = counting_get
+        served = collection._reader() is collection.replica
+        result = await collection.query(query_embeddings=[[0, 1]], n_results=1)
+        await synced(store)
+        store.close()
+        return served, result, pages
+
+    asyncio.run(first_run())
+    served, result, pages = asyncio.run(second_run())
+    assert served
+    assert result["ids"] == [["b"]]
+    assert pages == []
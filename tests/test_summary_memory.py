@@ -0,0 +1,98 @@
+import asyncio
+import memory.summary_memory as summary_memory
+from memory.summary_memory import SessionSummaryMemory, fit_recent_turns
+
+
+class ListStore:
+    """In-memory RedisSummaryStore"""
+
+    def __init__(self):
+        self.states = {}
+        self.pending = {}
+
+    async def load(self, key):
+        return self.states.get(key), list(self.pending.get(key, []))
+
+    async def append(self, key, turn, max_pending):
+        pending = self.pending.setdefault(key, [])
+        pending.append(turn)
+        del pending[:-max_pending]
+        return len(pending)
+
+    async def fold(self, key, summarized_turns, turns, state):
+        if (self.states.get(key) or {}).get("summarized_turns", 0) != summarized_turns:
+            return False
+        pending = self.pending.get(key, [])
+        drop = next(len(turns) - skip for skip in range(len(turns) + 1) if pending[:len(turns) - skip] == turns[skip:])
+        del pending[:drop]
+        self.states[key] = state
+        return True
+
+
+class FakeChat:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_response(self, messages, temperature=0.7, max_tokens=None):
+        self.calls.append(messages[-1]["content"])
+        return f"summary {len(self.calls)}"
+
+
+def test_turns_are_folded_into_the_summary_every_n_turns(monkeypatch):
+    monkeypatch.setattr(summary_memory, "count_tokens", lambda text: len(text.split()))
+    chat = FakeChat()
+    memory = SessionSummaryMemory(ListStore(), chat=chat, summarize_every=2)
+
+    async def run():
+        first = await memory.get("u", "a", "s")
+        for i in range(5):
+            await memory.record_turn("u", "a", "s", f"m{i}", f"r{i}")
+            await asyncio.sleep(0)
+        await memory.close()
+        return first, await memory.get("u", "a", "s")
+
+    first, summary = asyncio.run(run())
+    assert first is None
+    assert summary == {"summary": "summary 2", "token_count": 2, "summarized_turns": 4, "pending_turns": 1}
+    assert memory.store.pending["summary:a:u:s"] == [{"message": "m4", "response": "r4"}]
+    # The second call builds on the first summary
+    assert "summary 1" in chat.calls[1] and "m2" in chat.calls[1] and "m0" not in chat.calls[1]
+
+
+def test_fit_recent_turns_keeps_the_newest_turns_within_budget(monkeypatch):
+    monkeypatch.setattr(summary_memory, "count_tokens", lambda text: len(text.split()))
+    turns = [{"message": f"m{i}", "response": f"r{i}"} for i in range(5)]
+    assert fit_recent_turns(turns, 9) == turns[-2:]
+
+
+def test_fit_recent_turns_keeps_turns_the_summary_does_not_cover(monkeypatch):
+    monkeypatch.setattr(summary_memory, "count_tokens", lambda text: len(text.split()))
+    turns = [{"message": f"m{i}", "response": f"r{i}"} for i in range(5)]
+    assert fit_recent_turns(turns, 9, keep_last=3) == turns[-3:]
+    assert fit_recent_turns(turns, 17, keep_last=3) == turns[-4:]
+
+
+def test_a_fold_loses_to_one_from_another_process(monkeypatch):
+    monkeypatch.setattr(summary_memory, "count_tokens", lambda text: len(text.split()))
+    store = ListStore()
+
+    class RacingChat(FakeChat):
+        async def generate_response(self, messages, temperature=0.7, max_tokens=None):
+            # Another process folds the same turns while this one waits for the LLM
+            await store.fold("summary:a:u:s", 0, store.pending["summary:a:u:s"][:2], {
+                "summary": "other", "token_count": 1, "summarized_turns": 2
+            })
+            await store.append("summary:a:u:s", {"message": "m2", "response": "r2"}, 8)
+            return await super().generate_response(messages, temperature, max_tokens)
+
+    memory = SessionSummaryMemory(store, chat=RacingChat(), summarize_every=2)
+
+    async def run():
+        await memory.record_turn("u", "a", "s", "m0", "r0")
+        await memory.record_turn("u", "a", "s", "m1", "r1")
+        await memory.close()
+        return await memory.get("u", "a", "s")
+
+    summary = asyncio.run(run())
+    assert summary["summary"] == "other" and summary["summarized_turns"] == 2
+    assert summary["pending_turns"] == 1 and memory.summaries == 0
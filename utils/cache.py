@@ -0,0 +1,121 @@
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+from collections import OrderedDict
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar('V')
+
+class BoundedCache(Generic[V]):
+    """LRU cache bounded by size and idle time, with an async eviction hook.
+
+    Entries are kept in least-recently-used order, so both overflow and idle
+    expiry only ever remove entries from the front. The ``on_evict`` hook is
+    awaited for every entry that leaves the cache, letting owners release
+    clients and connections held by the value. With ``sliding=False`` reads do
+    not extend an entry's lifetime, so ``ttl`` counts from insertion.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, V], Awaitable[None]]] = None,
+        sliding: bool = True
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.sliding = sliding
+        self._entries: "OrderedDict[Hashable, List[Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl is not None and now - last_access > self.ttl
+
+    async def _evict(self, key: Hashable, value: V) -> None:
+        self.evictions += 1
+        logger.debug(f"Evicting {key} from {self.name} cache")
+        if self.on_evict:
+            try:
+                await self.on_evict(key, value)
+            except Exception as e:
+                logger.error(f"Eviction hook failed for {key} in {self.name} cache: {str(e)}")
+
+    async def _evict_expired(self, now: float) -> None:
+        while self._entries:
+            key, (value, last_access) = next(iter(self._entries.items()))
+            if not self._expired(last_access, now):
+                break
+            del self._entries[key]
+            await self._evict(key, value)
+
+    async def get(self, key: Hashable) -> Optional[V]:
+        """Return the cached value and mark it as recently used"""
+        now = time.monotonic()
+        await self._evict_expired(now)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self.sliding:
+            entry[1] = now
+            self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: Hashable, value: V) -> None:
+        """Insert or replace a value, evicting the least recently used overflow"""
+        now = time.monotonic()
+        await self._evict_expired(now)
+
+        previous = self._entries.pop(key, None)
+        self._entries[key] = [value, now]
+        if previous is not None and previous[0] is not value:
+            await self._evict(key, previous[0])
+
+        while len(self._entries) > self.max_size:
+            old_key, (old_value, _) = self._entries.popitem(last=False)
+            await self._evict(old_key, old_value)
+
+    async def pop(self, key: Hashable) -> Optional[V]:
+        """Remove a value without running the eviction hook"""
+        return self.discard(key)
+
+    def discard(self, key: Hashable) -> Optional[V]:
+        """Like ``pop``, for callers that are not coroutines"""
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+
+    async def clear(self) -> None:
+        """Evict every entry, running the eviction hook for each"""
+        while self._entries:
+            key, (value, _) = self._entries.popitem(last=False)
+            await self._evict(key, value)
+
+    def values(self) -> List[V]:
+        return [entry[0] for entry in self._entries.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for monitoring"""
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
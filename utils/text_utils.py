@@ -0,0 +1,44 @@
+from typing import List, Optional
+from functools import lru_cache
+import re
+import tiktoken
+
+# Sentence terminators followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r'[.!?…。！？]+["\'”’)\]]*\s+|\n+')
+
+class SentenceSplitter:
+    """Incrementally split streamed text into complete sentences"""
+
+    def __init__(self, min_chars: int = 20):
+        # Shorter sentences are merged with the next one to avoid choppy audio
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add a text delta and return the sentences it completed"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.end()].strip()
+            if len(sentence) < self.min_chars:
+                continue
+            sentences.append(sentence)
+            start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left once the stream has ended"""
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return remainder or None
+
+@lru_cache()
+def get_encoder() -> "tiktoken.Encoding":
+    """Shared tokenizer for prompt budgets, loaded once per process"""
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text))